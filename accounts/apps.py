@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import post_delete, post_save
+        from .tokens import forget_user_status
+
+        post_save.connect(forget_user_status, sender=User, dispatch_uid='accounts_forget_user_status_save')
+        post_delete.connect(forget_user_status, sender=User, dispatch_uid='accounts_forget_user_status_delete')
+
+    def warm_up(self):
+        """
+        載入驗證相關模組與密碼雜湊器，見 backend/warmup.py
+        """
+        from django.contrib.auth.hashers import get_hashers
+        from . import authentication, tokens  # noqa: F401
+
+        get_hashers()
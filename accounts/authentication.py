@@ -1,11 +1,45 @@
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
 from .models import ExpiringToken
+from .tokens import InvalidToken, read_access_token
+
+def token_queryset(key):
+    """
+    與 DRF TokenAuthentication 相同的查詢（連同 user 一次取得），query_plans 也檢查這個查詢
+    """
+    return ExpiringToken.objects.select_related('user').filter(key=key)
 
 class ExpiringTokenAuthentication(TokenAuthentication):
     def authenticate_credentials(self, key):
-        token = ExpiringToken.objects.get(key=key)
+        token = token_queryset(key).get()
         if token.is_expired():
             token.delete()  # 删除过期 token
             raise AuthenticationFailed('Token has expired')
         return (token.user, token)
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authorization: Bearer <access token>，驗證簽章與帳號狀態（見 tokens.read_access_token）；request.auth 為 token 的 claims
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header')
+        try:
+            return read_access_token(auth[1].decode())
+        except (InvalidToken, UnicodeError) as e:
+            raise AuthenticationFailed(str(e))
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+def auth_enabled(auth_class):
+    """
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] 中是否啟用了 auth_class（含子類別）
+    """
+    return any(issubclass(cls, auth_class) for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES)
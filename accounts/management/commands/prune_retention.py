@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.purge import prune_expired
+
+
+class Command(BaseCommand):
+    help = '依資料保留期限刪除過舊的訓練日誌、token、同步刪除紀錄與已結束的背景工作'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal-days', type=int, default=settings.RETENTION_JOURNAL_DAYS)
+        parser.add_argument('--token-days', type=int, default=settings.RETENTION_TOKEN_DAYS)
+        parser.add_argument('--tombstone-days', type=int, default=settings.SYNC_TOMBSTONE_DAYS)
+        parser.add_argument('--job-days', type=int, default=settings.RETENTION_JOB_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.PURGE_SLEEP)
+
+    def handle(self, *args, **options):
+        counts = prune_expired(
+            options['journal_days'], options['token_days'], options['batch_size'], options['sleep'],
+            tombstone_days=options['tombstone_days'], job_days=options['job_days'],
+        )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: 已刪除 {count} 筆')
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from accounts.purge import purge_steps, purge_user
+
+
+class Command(BaseCommand):
+    help = '由下往上分批刪除帳號及其所有資料，可中斷後重新執行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.PURGE_SLEEP, help='每批之間暫停的秒數')
+        parser.add_argument('--dry-run', action='store_true', help='只列出各步驟要刪除的筆數')
+
+    def handle(self, *args, **options):
+        for user_id in options['user_ids']:
+            if not User.objects.filter(pk=user_id).exists() and not options['dry_run']:
+                # User 已刪除但仍可能留有中斷前未刪完的資料，照常執行剩下的步驟
+                self.stdout.write(self.style.WARNING(f'使用者 {user_id} 不存在，清理殘留資料'))
+
+            if options['dry_run']:
+                for name, queryset in purge_steps(user_id):
+                    self.stdout.write(f'{user_id} {name}: {queryset.count()}')
+                continue
+
+            counts = purge_user(
+                user_id, options['batch_size'], options['sleep'],
+                progress=lambda name, count: self.stdout.write(f'{user_id} {name}: 已刪除 {count} 筆'),
+            )
+            self.stdout.write(self.style.SUCCESS(f'使用者 {user_id} 刪除完成（共 {sum(counts.values())} 筆）'))
@@ -1,3 +1,5 @@
+import hashlib
+import secrets
 from django.db import models
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
@@ -12,3 +14,40 @@ class ExpiringToken(Token):
         expiration_time = self.created + settings.TOKEN_EXPIRATION_TIME
         return timezone.now() > expiration_time
 
+
+
+class RefreshToken(models.Model):
+    """
+    配合簽章式 access token 使用的 refresh token；資料庫只保存 SHA-256，原始值只在發行時返回一次
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='refresh_tokens')
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """
+        建立新的 refresh token 並返回原始值
+        """
+        key = secrets.token_urlsafe(32)
+        cls.objects.create(user=user, key_hash=cls.hash_key(key), expires_at=timezone.now() + settings.REFRESH_TOKEN_LIFETIME)
+        return key
+
+    @classmethod
+    def revoke_all(cls, user_id):
+        return cls.objects.filter(user_id=user_id, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+    def revoke(self):
+        """
+        撤銷此 token；已被撤銷（例如同時有兩個請求使用同一個 token）時返回 False
+        """
+        return bool(RefreshToken.objects.filter(pk=self.pk, revoked_at__isnull=True).update(revoked_at=timezone.now()))
+
+    def is_expired(self):
+        return timezone.now() >= self.expires_at
@@ -0,0 +1,158 @@
+"""
+批次刪除帳號資料與資料保留期限清理
+
+直接 user.delete() 時，Django 的 Collector 會先把所有關聯資料載入記憶體，再一層一層刪除，
+資料量大的帳號會長時間鎖住資料表。這裡改為由下往上 (details -> sets -> M2M -> exercises -> ...)
+每次只取 batch_size 個主鍵，以 DELETE ... WHERE id IN (...) 刪除，每批各自提交，並可在批次間暫停。
+每個步驟都是「刪除剩下的資料」，中斷後重新執行即可從中斷處繼續。
+"""
+import time
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+
+from accounts.models import RefreshToken
+from exercise.models import (
+    BodyComposition, Exercise, ExerciseArchive, ExerciseSet, IdempotencyRecord, SetDetail, SyncTombstone, Template,
+    WeeklyRollup,
+)
+from jobs.models import Job
+from workout_journal.media import delete_image_files
+from workout_journal.models import JournalImage
+from workout_journal.queries import expired_entries
+
+
+def delete_in_batches(queryset, batch_size=1000, sleep=0):
+    """
+    依主鍵分批刪除 queryset 的資料，返回刪除筆數。
+    _raw_delete 直接執行 DELETE，不經過 Collector（呼叫前必須已刪除所有參照這些資料的子資料）
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += model._base_manager.filter(pk__in=ids)._raw_delete(using=DEFAULT_DB_ALIAS)
+        if sleep:
+            time.sleep(sleep)
+
+
+def delete_journal_images(queryset, batch_size=1000, sleep=0):
+    """
+    與 delete_in_batches 相同，但先刪除每批圖片的原圖與縮小版本檔案
+    """
+    deleted = 0
+    while True:
+        images = list(queryset.using(DEFAULT_DB_ALIAS).order_by('pk')[:batch_size])
+        if not images:
+            return deleted
+        delete_image_files(images)
+        deleted += JournalImage._base_manager.filter(pk__in=[image.pk for image in images])._raw_delete(using=DEFAULT_DB_ALIAS)
+        if sleep:
+            time.sleep(sleep)
+
+
+def delete_finished_jobs(queryset, batch_size=1000, sleep=0):
+    """
+    與 delete_in_batches 相同，但先刪除工作結果中匯出到 media 的檔案（result['url']）
+    """
+    media_prefix = default_storage.url('')
+    deleted = 0
+    while True:
+        jobs = list(queryset.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', 'result')[:batch_size])
+        if not jobs:
+            return deleted
+        for _, result in jobs:
+            url = result.get('url') if isinstance(result, dict) else None
+            if isinstance(url, str) and url.startswith(media_prefix):
+                default_storage.delete(unquote(url[len(media_prefix):]))
+        deleted += Job.objects.filter(pk__in=[pk for pk, _ in jobs])._raw_delete(using=DEFAULT_DB_ALIAS)
+        if sleep:
+            time.sleep(sleep)
+
+
+def purge_steps(user_id):
+    """
+    由下往上的刪除順序，每個步驟返回 (名稱, queryset)。
+    Template 沒有 user 欄位，只包含此帳號計劃的模板視為此帳號的模板；模板與計劃的關聯會先被刪除，
+    因此模板的 id 在這裡先查出來
+    """
+    template_ids = list(
+        Template.objects.filter(exercises__user_id=user_id)
+        .exclude(exercises__in=Exercise.objects.exclude(user_id=user_id))
+        .values_list('pk', flat=True).distinct()
+    )
+    return [
+        ('set_details', SetDetail.objects.filter(exercise_set__exercise__user_id=user_id)),
+        ('exercise_sets', ExerciseSet.objects.filter(exercise__user_id=user_id)),
+        ('exercise_types', Exercise.exercise_type.through.objects.filter(exercise__user_id=user_id)),
+        ('template_exercises', Template.exercises.through.objects.filter(exercise__user_id=user_id)),
+        ('templates', Template.objects.filter(pk__in=template_ids)),
+        ('exercise_archives', ExerciseArchive.objects.filter(exercise__user_id=user_id)),
+        ('exercises', Exercise.objects.filter(user_id=user_id)),
+        ('body_compositions', BodyComposition.objects.filter(user_id=user_id)),
+        ('sync_tombstones', SyncTombstone.objects.filter(user_id=user_id)),
+        ('weekly_rollups', WeeklyRollup.objects.filter(user_id=user_id)),
+        ('idempotency_records', IdempotencyRecord.objects.filter(user_id=user_id)),
+        ('jobs', Job.objects.filter(user_id=user_id)),
+        ('tokens', Token.objects.filter(user_id=user_id)),
+        ('refresh_tokens', RefreshToken.objects.filter(user_id=user_id)),
+    ]
+
+
+def purge_user(user_id, batch_size=1000, sleep=0, progress=None):
+    """
+    刪除帳號的所有資料，最後才刪除 User 本身（剩下的群組、權限等少量關聯交給 Django 處理）。
+    返回 {步驟名稱: 刪除筆數}
+    """
+    counts = {}
+    for name, queryset in purge_steps(user_id):
+        counts[name] = delete_in_batches(queryset, batch_size, sleep)
+        if progress:
+            progress(name, counts[name])
+    counts['user'], _ = User.objects.filter(pk=user_id).delete()
+    return counts
+
+
+def deactivate_user(user):
+    """
+    停用帳號並撤銷所有 token，之後再由背景工作刪除資料
+    """
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    Token.objects.filter(user=user).delete()
+    RefreshToken.revoke_all(user.pk)
+
+
+def prune_expired(journal_days=None, token_days=None, batch_size=1000, sleep=0, tombstone_days=None, job_days=None):
+    """
+    資料保留期限：刪除超過天數的日誌、token、同步刪除紀錄與已結束的背景工作，None 表示不清理該項目。
+    tombstone_days 應與 SYNC_TOMBSTONE_DAYS 相同，更舊的 cursor 由 SyncView 改為完整同步；
+    job_days 以最後更新時間計算，只刪除成功或失敗的工作
+    """
+    counts = {}
+    if journal_days is not None:
+        cutoff = now() - timedelta(days=journal_days)
+        counts['journal_images'] = delete_journal_images(
+            JournalImage.objects.filter(entry__created_at__lt=cutoff), batch_size, sleep
+        )
+        counts['journal_entries'] = delete_in_batches(expired_entries(cutoff), batch_size, sleep)
+    if token_days is not None:
+        cutoff = now() - timedelta(days=token_days)
+        counts['tokens'] = delete_in_batches(Token.objects.filter(created__lt=cutoff), batch_size, sleep)
+        counts['refresh_tokens'] = delete_in_batches(RefreshToken.objects.filter(expires_at__lt=cutoff), batch_size, sleep)
+    if tombstone_days is not None:
+        cutoff = now() - timedelta(days=tombstone_days)
+        counts['sync_tombstones'] = delete_in_batches(SyncTombstone.objects.filter(deleted_at__lt=cutoff), batch_size, sleep)
+    if job_days is not None:
+        cutoff = now() - timedelta(days=job_days)
+        counts['jobs'] = delete_finished_jobs(
+            Job.objects.filter(status__in=[Job.SUCCEEDED, Job.FAILED], updated_at__lt=cutoff), batch_size, sleep
+        )
+    return counts
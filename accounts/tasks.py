@@ -0,0 +1,14 @@
+"""
+accounts 的背景工作
+"""
+from django.conf import settings
+from jobs.registry import job
+from .purge import purge_user
+
+
+@job('accounts.purge_user', max_attempts=5)
+def purge_account(job):
+    """
+    刪除已停用帳號的資料；Job 不屬於該使用者，避免刪除 User 時一併刪掉正在執行的 Job
+    """
+    return purge_user(job.payload['user_id'], batch_size=settings.PURGE_BATCH_SIZE, sleep=settings.PURGE_SLEEP)
@@ -1,3 +1,203 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from backend.throttling import LocalBucketStore, TokenBucketThrottle, _local_store
+from exercise.models import (
+    BodyComposition, Exercise, ExerciseSet, IdempotencyRecord, SetDetail, SyncTombstone, Template, WeeklyRollup,
+    save_as_template,
+)
+from jobs.models import Job
+from workout_journal.models import WorkoutJournalEntry
+from .models import RefreshToken
+from .purge import deactivate_user, prune_expired, purge_user
+from .tokens import InvalidToken, read_access_token
+
+SIGNED_ONLY = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['accounts.authentication.SignedTokenAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+}
+
+
+class LoginTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', password='secret-pass')
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/fitness_api/accounts/login/', {'username': 'runner', 'password': 'secret-pass'})
+
+    def test_default_issues_only_authtoken(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.data)
+        self.assertNotIn('access', response.data)
+        self.assertFalse(RefreshToken.objects.exists())
+
+    @override_settings(REST_FRAMEWORK=SIGNED_ONLY)
+    def test_signed_issues_only_token_pair(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('token', response.data)
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(RefreshToken.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(REST_FRAMEWORK=SIGNED_ONLY)
+    def test_deactivated_user_access_token_rejected(self):
+        access = self.login().data['access']
+        self.assertEqual(read_access_token(access)[0].pk, self.user.pk)
+
+        deactivate_user(self.user)
+        with self.assertRaises(InvalidToken):
+            read_access_token(access)
+
+
+class PurgeTests(TestCase):
+    MODELS = [Exercise, ExerciseSet, SetDetail, BodyComposition, Token, RefreshToken, IdempotencyRecord, Job, Template,
+              SyncTombstone, WeeklyRollup]
+
+    def create_account(self, username):
+        user = User.objects.create_user(username=username)
+        for day in (19, 20):
+            exercise = Exercise.objects.create(user=user, name=f'{username} {day}', scheduled_date=date(2026, 10, day))
+            exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Squat', sets=0)
+            SetDetail.objects.create(exercise_set=exercise_set, reps=5, weight=100, actual_duration=30, rest_time=90)
+        ExerciseSet.objects.filter(exercise__user=user).first().delete()  # 產生 SyncTombstone
+        save_as_template(Exercise.objects.filter(user=user).values_list('pk', flat=True), f'{username} template', user)
+        BodyComposition.objects.create(user=user, height=170, weight=70)
+        WeeklyRollup.objects.create(user=user, week_start=date(2026, 10, 19))
+        Token.objects.create(user=user)
+        RefreshToken.issue(user)
+        IdempotencyRecord.objects.create(user=user, key='k', fingerprint='f', expires_at=now() + timedelta(days=1))
+        Job.objects.create(name='exercise.export_calendar', user=user)
+        return user
+
+    def counts(self, user):
+        filters = {
+            ExerciseSet: 'exercise__user', SetDetail: 'exercise_set__exercise__user', Template: 'exercises__user',
+        }
+        return {model.__name__: model.objects.filter(**{filters.get(model, 'user'): user}).count() for model in self.MODELS}
+
+    def test_purge_removes_only_the_users_rows(self):
+        doomed, kept = self.create_account('doomed'), self.create_account('kept')
+        kept_counts = self.counts(kept)
+        template_ids = list(Template.objects.filter(exercises__user=doomed).values_list('pk', flat=True).distinct())
+
+        purge_user(doomed.pk, batch_size=1)
+
+        self.assertFalse(User.objects.filter(pk=doomed.pk).exists())
+        self.assertEqual(set(self.counts(doomed).values()), {0})
+        self.assertFalse(Template.objects.filter(pk__in=template_ids).exists())
+        self.assertEqual(self.counts(kept), kept_counts)
+        self.assertNotIn(0, kept_counts.values())
+
+
+class RetentionTests(TestCase):
+    def test_prune_expired_keeps_recent_rows(self):
+        user = User.objects.create_user(username='retention')
+        old_entry, new_entry = (WorkoutJournalEntry.objects.create(title=title, content='<p>x</p>') for title in ('old', 'new'))
+        WorkoutJournalEntry.objects.filter(pk=old_entry.pk).update(created_at=now() - timedelta(days=40))
+        old_token = Token.objects.create(user=user)
+        Token.objects.filter(pk=old_token.pk).update(created=now() - timedelta(days=40))
+        RefreshToken.issue(user)
+        RefreshToken.objects.create(user=user, key_hash='expired', expires_at=now() - timedelta(days=40))
+
+        counts = prune_expired(journal_days=30, token_days=30)
+
+        self.assertEqual(counts, {'journal_images': 0, 'journal_entries': 1, 'tokens': 1, 'refresh_tokens': 1})
+        self.assertEqual(list(WorkoutJournalEntry.objects.values_list('pk', flat=True)), [new_entry.pk])
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(RefreshToken.objects.count(), 1)
+        self.assertEqual(prune_expired(), {})
+
+    def test_prune_expired_finished_jobs(self):
+        import os
+        import tempfile
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            name = default_storage.save('exports/plan 1.ics', ContentFile(b'BEGIN:VCALENDAR'))
+            old = now() - timedelta(days=40)
+            exported, failed, pending, recent = (
+                Job.objects.create(name='exercise.export_calendar', status=status, result=result)
+                for status, result in ((Job.SUCCEEDED, {'url': default_storage.url(name)}), (Job.FAILED, None),
+                                       (Job.PENDING, None), (Job.SUCCEEDED, {'url': 'https://cdn.example.com/x.ics'}))
+            )
+            Job.objects.exclude(pk=recent.pk).update(updated_at=old)
+
+            self.assertEqual(prune_expired(job_days=30), {'jobs': 2})
+            self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {pending.pk, recent.pk})
+            self.assertFalse(os.path.exists(os.path.join(root, name)))
+
+    def test_prune_expired_sync_tombstones(self):
+        user = User.objects.create_user(username='tombstones')
+        exercise = Exercise.objects.create(user=user, name='Old', scheduled_date=date(2026, 7, 1))
+        old_exercise = Exercise.objects.create(user=user, name='Older', scheduled_date=date(2026, 6, 1))
+        exercise_id, old_id = exercise.pk, old_exercise.pk
+        exercise.delete()
+        old_exercise.delete()
+        SyncTombstone.objects.filter(object_id=old_id).update(deleted_at=now() - timedelta(days=100))
+
+        self.assertEqual(prune_expired(tombstone_days=90), {'sync_tombstones': 1})
+        self.assertEqual(list(SyncTombstone.objects.values_list('model', 'object_id')), [('exercise', exercise_id)])
+
+
+@override_settings(THROTTLE_BUCKETS={'login': '2/min', 'register': '2/min'}, THROTTLE_STORE='local')
+class ThrottleTests(TestCase):
+    def setUp(self):
+        self.reset_buckets()
+        self.addCleanup(self.reset_buckets)
+        User.objects.create_user(username='runner', password='secret-pass')
+
+    def reset_buckets(self):
+        TokenBucketThrottle.buckets = None
+        _local_store.clear()
+
+    def login(self, ip='10.0.0.1'):
+        return APIClient().post(
+            '/fitness_api/accounts/login/', {'username': 'runner', 'password': 'secret-pass'}, REMOTE_ADDR=ip
+        )
+
+    def test_rejects_before_authenticating(self):
+        from django.contrib.auth import authenticate
+
+        with mock.patch('rest_framework.authtoken.serializers.authenticate', wraps=authenticate) as authenticate_mock:
+            self.assertEqual([self.login().status_code for _ in range(2)], [200, 200])
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # 第三次請求沒有執行 serializer 與密碼雜湊
+        self.assertEqual(authenticate_mock.call_count, 2)
+
+    def test_buckets_are_per_url_name_and_ip(self):
+        self.login()
+        self.login()
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 200)
+        response = APIClient().post('/fitness_api/accounts/register/', {}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cache_key_uses_user_when_authenticated(self):
+        throttle = TokenBucketThrottle()
+        request = Request(APIRequestFactory().post('/', REMOTE_ADDR='10.0.0.1'))
+        request.user = AnonymousUser()
+        self.assertEqual(throttle.get_cache_key(request, 'login'), 'login:ip:10.0.0.1')
+
+        request.user = user = User.objects.get(username='runner')
+        self.assertEqual(throttle.get_cache_key(request, 'create-exercise-plan'), f'create-exercise-plan:user:{user.pk}')
+
+    def test_local_store_evicts_least_recently_used(self):
+        store = LocalBucketStore(max_keys=2)
+        self.assertEqual(store.take('a', 1, 1 / 60), 0)
+        store.take('b', 1, 1 / 60)
+        self.assertGreater(store.take('a', 1, 1 / 60), 0)  # a 移到最後
+        store.take('c', 1, 1 / 60)
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+        self.assertEqual(store.take('b', 1, 1 / 60), 0)  # b 已被移除，重新以滿的桶子開始
@@ -0,0 +1,87 @@
+"""
+簽章式 access token 與 refresh token
+
+access token 是以 SECRET_KEY 做 HMAC 簽章的 user id / username / is_staff（django.core.signing，
+內含簽發時間）；有效期限短 (ACCESS_TOKEN_LIFETIME)，到期後以 refresh token 換發。
+refresh token 存在資料庫，每次換發都會撤銷舊的並發行新的 (rotation)，登出或刪除帳號時撤銷。
+
+驗證 access token 時會確認帳號仍為啟用狀態，結果快取 ACCESS_TOKEN_ACTIVE_CACHE_SECONDS 秒，
+大部分請求不需要查詢資料庫；帳號停用或刪除時由 forget_user_status 清除快取。
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from .models import RefreshToken
+
+ACCESS_TOKEN_SALT = 'accounts.access-token'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def issue_access_token(user):
+    return signing.dumps({'uid': user.pk, 'usr': user.get_username(), 'stf': user.is_staff}, salt=ACCESS_TOKEN_SALT)
+
+
+def _user_status_key(user_id):
+    return f'accounts:user-active:{user_id}'
+
+
+def is_user_active(user_id):
+    return cache.get_or_set(
+        _user_status_key(user_id),
+        lambda: User.objects.filter(pk=user_id, is_active=True).exists(),
+        settings.ACCESS_TOKEN_ACTIVE_CACHE_SECONDS,
+    )
+
+
+def forget_user_status(sender, instance, **kwargs):
+    """
+    User 的 post_save / post_delete：清除 is_user_active 的快取
+    """
+    cache.delete(_user_status_key(instance.pk))
+
+
+def read_access_token(token):
+    """
+    驗證簽章、有效期限與帳號狀態，返回不經資料庫建立的 User 物件與 claims
+    """
+    try:
+        claims = signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+    except signing.SignatureExpired:
+        raise InvalidToken('Token has expired')
+    except signing.BadSignature:
+        raise InvalidToken('Invalid token')
+    if not is_user_active(claims['uid']):
+        raise InvalidToken('User inactive or deleted')
+    user = User(pk=claims['uid'], username=claims['usr'], is_staff=claims['stf'], is_active=True)
+    return user, claims
+
+
+def issue_token_pair(user):
+    return {
+        'access': issue_access_token(user),
+        'access_expires_in': settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+        'refresh': RefreshToken.issue(user),
+        'refresh_expires_in': settings.REFRESH_TOKEN_LIFETIME.total_seconds(),
+    }
+
+
+def refresh_token_queryset(key):
+    return RefreshToken.objects.select_related('user').filter(key_hash=RefreshToken.hash_key(key))
+
+
+def rotate_refresh_token(key):
+    """
+    以 refresh token 換發新的 access / refresh token。
+    已撤銷的 token 再次被使用時視為外洩，撤銷該使用者所有的 refresh token
+    """
+    token = refresh_token_queryset(key).first()
+    if token is None or token.is_expired() or not token.user.is_active:
+        raise InvalidToken('Invalid refresh token')
+    if token.revoked_at is not None or not token.revoke():
+        RefreshToken.revoke_all(token.user_id)
+        raise InvalidToken('Refresh token has been revoked')
+    return issue_token_pair(token.user)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import register, CustomAuthToken, logout
+from .views import register, CustomAuthToken, logout, delete_account, token_refresh
 
 urlpatterns = [
     path('register/', register, name='register'),
     path('login/', CustomAuthToken.as_view(), name='login'),
+    path('token/refresh/', token_refresh, name='token-refresh'),
     path('logout/', logout, name='logout'),
+    path('delete_account/', delete_account, name='delete-account'),
 ]
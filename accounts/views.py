@@ -7,16 +7,20 @@ from django.contrib.auth.models import User
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import AllowAny
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.views import APIView
-from .authentication import ExpiringToken
+from rest_framework.settings import api_settings
+from .authentication import ExpiringToken, SignedTokenAuthentication, auth_enabled
+from .models import RefreshToken
+from .tokens import InvalidToken, issue_token_pair, rotate_refresh_token
+from .purge import deactivate_user
+from jobs.registry import enqueue
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
 from django.utils import timezone
 
 class ProtectedView(APIView):
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -31,19 +35,36 @@ def register(request):
     password = request.data.get('password')
     if username and password:
         user = User.objects.create_user(username=username, password=password)
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({"token": token.key}, status=status.HTTP_201_CREATED)
+        data = {}
+        if auth_enabled(TokenAuthentication):
+            token, created = Token.objects.get_or_create(user=user)
+            data['token'] = token.key
+        if auth_enabled(SignedTokenAuthentication):
+            data.update(issue_token_pair(user))
+        return Response(data, status=status.HTTP_201_CREATED)
     return Response({"error": "Invalid data"}, status=status.HTTP_400_BAD_REQUEST)
 
 
 # 登入獲取 Token
 class CustomAuthToken(ObtainAuthToken):
+    # ObtainAuthToken 預設停用 throttle，這裡改回使用全域設定
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
     def post(self, request, *args, **kwargs):
         # 驗證使用者
         serializer = self.serializer_class(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
 
+        data = {}
+        if auth_enabled(TokenAuthentication):
+            data.update(self.issue_expiring_token(user))
+        if auth_enabled(SignedTokenAuthentication):
+            # 簽章式 access token 不寫入 authtoken 資料表，只新增一筆 refresh token
+            data.update(issue_token_pair(user))
+        return Response(data)
+
+    def issue_expiring_token(self, user):
         # 查找現有 token 或創建一個新的 token
         token, created = ExpiringToken.objects.get_or_create(user=user)
 
@@ -60,7 +81,7 @@ class CustomAuthToken(ObtainAuthToken):
 
         # 返回 token 和過期時間
         expires_in = settings.TOKEN_EXPIRATION_TIME.total_seconds()
-        return Response({'token': token.key, 'expires_in': expires_in})
+        return {'token': token.key, 'expires_in': expires_in}
 
 
 # 登出 API
@@ -68,6 +89,16 @@ class CustomAuthToken(ObtainAuthToken):
 def logout(request):
     # 獲取請求中的 Token
     token_key = request.auth
+    if isinstance(token_key, dict):
+        # 簽章式 access token 無法撤銷，改為撤銷 refresh token（未指定時撤銷該使用者全部的 refresh token）
+        refresh = request.data.get('refresh')
+        if refresh:
+            RefreshToken.objects.filter(
+                user_id=request.user.pk, key_hash=RefreshToken.hash_key(refresh), revoked_at__isnull=True
+            ).update(revoked_at=timezone.now())
+        else:
+            RefreshToken.revoke_all(request.user.pk)
+        return Response({"message": "登出成功"}, status=status.HTTP_200_OK)
     if token_key:
         try:
             # 找到對應的 Token 並删除
@@ -80,3 +111,34 @@ def logout(request):
         return Response({"error": "未提供 Token"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+
+
+# 刪除帳號 API
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def delete_account(request):
+    """
+    確認密碼後立即停用帳號並撤銷 token，資料由背景工作分批刪除
+    """
+    # 簽章式 token 的 request.user 不是從資料庫載入的，需要重新讀取才有密碼
+    user = User.objects.get(pk=request.user.pk)
+    if not user.check_password(request.data.get('password', '')):
+        return Response({"error": "密碼錯誤"}, status=status.HTTP_400_BAD_REQUEST)
+
+    deactivate_user(user)
+    enqueue('accounts.purge_user', user_id=user.pk)
+    return Response({"message": "帳號已停用，資料將於稍後刪除"}, status=status.HTTP_202_ACCEPTED)
+
+
+# 以 refresh token 換發 access token
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    refresh = request.data.get('refresh')
+    if not refresh:
+        return Response({"error": "未提供 refresh token"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response(rotate_refresh_token(refresh))
+    except InvalidToken as e:
+        return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
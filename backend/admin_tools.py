@@ -0,0 +1,53 @@
+"""
+大型資料表的 admin 共用元件
+
+- EstimatedCountPaginator：PostgreSQL 上以 pg_class.reltuples（未篩選）或 EXPLAIN 的估計列數（有篩選）
+  取代 COUNT(*)，估計值小於 EXACT_COUNT_THRESHOLD 時才精確計算
+- LargeTableAdmin：使用上述分頁器，並關閉 changelist 額外的全表 COUNT (show_full_result_count)
+- BoundedInlineFormSet：inline 最多只載入 max_rows 筆，避免一個父物件帶出數萬筆子資料
+"""
+import json
+
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+
+EXACT_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        if queryset.query.where:
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = plan[0]['Plan']['Plan Rows']
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # 尚未 ANALYZE 的資料表 reltuples 為 -1
+            estimate = row[0] if row else -1
+        if estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return int(estimate)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class BoundedInlineFormSet(BaseInlineFormSet):
+    max_rows = 50
+
+    def get_queryset(self):
+        if not hasattr(self, '_bounded_queryset'):
+            self._bounded_queryset = super().get_queryset()[:self.max_rows]
+        return self._bounded_queryset
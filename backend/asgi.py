@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# 在接受請求前預熱 URL、翻譯、serializer 與各 app 的快取，見 backend/warmup.py
+from backend.warmup import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1,146 @@
+"""
+MEDIA_URL 的檔案服務，取代整個檔案經過 Django 讀取的 static()。
+MediaView 只提供給已登入、且擁有該檔案的使用者：各 app 以 AppConfig.media_prefix 與
+AppConfig.can_access_media(user, path) 宣告自己的檔案與權限（例如匯出檔只給建立該背景工作的使用者），
+不屬於任何 app 或沒有權限的檔案一律返回 404。DEBUG 或設定 MEDIA_SENDFILE 時掛載（見 backend/urls.py）；
+使用 sendfile 時 MEDIA_ROOT 只能由 web server 的 internal location 存取，不能直接公開。
+
+MEDIA_SENDFILE 決定實際傳送檔案的方式：
+  'x-accel-redirect'：nginx，回應 X-Accel-Redirect: MEDIA_ACCEL_PREFIX + 路徑（需設定 internal location）
+  'x-sendfile'：Apache mod_xsendfile / lighttpd，回應 X-Sendfile: 絕對路徑
+  None：由 Django 直接傳送，支援單一區段的 Range 請求
+不論哪一種方式，ETag / Last-Modified 與 304 都在這裡處理。
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    返回 (start, end)（含）；沒有 Range 或不支援的格式（例如多個區段）返回 None，
+    超出檔案大小時拋出 ValueError
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N：最後 N 個位元組
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def can_access_media(user, path):
+    """
+    由宣告 media_prefix 的 app 判斷使用者能否讀取該檔案；staff 可以讀取所有檔案
+    """
+    for app_config in apps.get_app_configs():
+        prefix = getattr(app_config, 'media_prefix', None)
+        if prefix and path.startswith(prefix):
+            return user.is_staff or app_config.can_access_media(user, path)
+    return False
+
+
+def serve_media(request, path):
+    """
+    傳送 MEDIA_ROOT 中的檔案，不檢查權限（由 MediaView 檢查）
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404(path)
+    if not os.path.isfile(full_path):
+        raise Http404(path)
+
+    etag = file_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f'max-age={settings.MEDIA_CACHE_SECONDS}',
+    }
+    if_none_match = request.headers.get('If-None-Match')
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if (if_none_match and etag in [value.strip() for value in if_none_match.split(',')]) or (
+        not if_none_match and if_modified_since and int(stat.st_mtime) <= if_modified_since
+    ):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        # Range、檔案讀取都交給 nginx；這裡的回應本體會被忽略
+        response = HttpResponse(content_type=content_type, headers=headers)
+        # header 只能是 latin-1，nginx 會先解碼 URI 再對應到 internal location
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path.lstrip('/'))
+        return response
+    if settings.MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Sendfile'] = full_path
+        return response
+
+    headers['Accept-Ranges'] = 'bytes'
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = None if if_range and if_range != etag else parse_range(request.headers.get('Range'), stat.st_size)
+    except ValueError:
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{stat.st_size}'})
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(full_path, start, end - start + 1), status=206, content_type=content_type, headers=headers
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class MediaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, path):
+        # 沒有權限與不存在的檔案相同，不透露檔案是否存在
+        if not can_access_media(request.user, path):
+            raise Http404(path)
+        return serve_media(request, path)
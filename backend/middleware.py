@@ -0,0 +1,83 @@
+import random
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .profiling import StackSampler, write_collapsed
+from .routers import enable_replica_reads, reset_replica_reads, pin_primary
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaReadMiddleware:
+    """
+    settings.REPLICA_READ_VIEWS 中的 GET / HEAD 請求改由唯讀副本讀取；
+    寫入成功後將該使用者 pin 在主庫一段時間
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replica_views = set(settings.REPLICA_READ_VIEWS)
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, '_replica_token', None)
+            if token is not None:
+                reset_replica_reads(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # DRF 驗證後會把使用者寫回 request.user
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_primary(user.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and request.resolver_match.url_name in self.replica_views:
+            request._replica_token = enable_replica_reads(request)
+
+
+class ProfilingMiddleware:
+    """
+    以取樣分析器包住整個請求，輸出 collapsed stack 檔案。兩種觸發方式：
+    - 依 settings.PROFILING_SAMPLE_RATE 隨機取樣（不返回檔名）
+    - 請求帶有 X-Profile: 1 header 或 ?profile=1，且使用者是 staff（回應帶有 X-Profile-File）
+
+    DRF 的 token 驗證在 view 中才執行，因此帶有觸發參數時先以 DRF 的驗證方式確認使用者，
+    非 staff 的請求不會啟動取樣
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        try:
+            user = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]).user
+        except APIException:
+            return False
+        return user.is_staff
+
+    def __call__(self, request):
+        requested = (request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1') and self.is_staff(request)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not (requested or sampled):
+            return self.get_response(request)
+
+        sampler = StackSampler(self.interval).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+
+        if stacks:
+            match = request.resolver_match
+            tag = (match.url_name if match else None) or 'unknown'
+            path = write_collapsed(stacks, tag)
+            if requested:
+                response['X-Profile-File'] = path.rsplit('/', 1)[-1]
+        return response
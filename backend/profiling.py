@@ -0,0 +1,87 @@
+"""
+請求層級的取樣分析器 (sampling profiler)
+
+背景執行緒每隔 interval 秒讀取一次目標執行緒的呼叫堆疊 (sys._current_frames)，
+累計成 collapsed stack 格式（每行 "frame;frame;frame 次數"），可直接交給 flamegraph.pl
+或 speedscope 繪製火焰圖。和 cProfile 不同，取樣不會攔截每次函式呼叫，開銷與請求內容無關。
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils.crypto import get_random_string
+
+
+class StackSampler:
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._frame_names = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_name(self, code):
+        name = self._frame_names.get(code)
+        if name is None:
+            module = os.path.splitext(os.path.relpath(code.co_filename, settings.BASE_DIR))[0]
+            if module.startswith('..'):
+                # 專案以外的檔案（標準庫、套件）只保留路徑最後兩段
+                module = '/'.join(module.split(os.sep)[-2:])
+            name = self._frame_names[code] = f'{module}:{code.co_qualname}'.replace(';', ':').replace(' ', '_')
+        return name
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def write_collapsed(stacks, tag, directory=None, max_files=None):
+    """
+    將 collapsed stacks 寫入 PROFILING_DIR，檔名帶有時間與 URL name；超過 max_files 時刪除最舊的檔案
+    """
+    directory = directory or settings.PROFILING_DIR
+    max_files = max_files or settings.PROFILING_MAX_FILES
+    os.makedirs(directory, exist_ok=True)
+    filename = f'{time.strftime("%Y%m%dT%H%M%S")}-{tag}-{os.getpid()}-{get_random_string(6)}.collapsed'
+    path = os.path.join(directory, filename)
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            # 以 URL name 作為根節點，合併多個檔案時仍能依端點區分
+            f.write(f'{tag};{stack} {count}\n')
+    rotate(directory, max_files)
+    return path
+
+
+def rotate(directory, max_files):
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.collapsed')),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in entries[:max(len(entries) - max_files, 0)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
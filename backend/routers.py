@@ -0,0 +1,124 @@
+"""
+資料庫路由：寫入一律走主庫 (default)，只有在明確允許的請求中，
+exercise / workout_journal 的讀取才會導向唯讀副本 (replica)
+
+使用者寫入成功後的 REPLICA_PIN_SECONDS 秒內，該使用者的讀取固定走主庫 (read-your-writes)，
+避免剛寫入的資料因副本延遲而讀不到。pin 紀錄存放在 Django cache，各 process 獨立的 cache
+無法讓其他 worker 看到 pin，設定副本時 check_replica_cache 會提醒改用共用的 cache backend
+（本機以兩個 SQLite 檔案測試時只有單一 process，可以忽略這個警告）。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import models
+
+REPLICA_ALIAS = 'replica'
+REPLICA_APP_LABELS = {'exercise', 'workout_journal'}
+# 只存在單一 process 內的 cache backend
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# None：不使用副本；True：無條件使用副本；HttpRequest：依該請求的使用者是否被 pin 決定
+_replica_context = ContextVar('replica_context', default=None)
+
+
+def replica_available():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def enable_replica_reads(request=None):
+    """
+    允許目前的請求（或程式區塊）從副本讀取，返回的 token 用於 reset_replica_reads
+    """
+    return _replica_context.set(True if request is None else request)
+
+
+def reset_replica_reads(token):
+    _replica_context.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """
+    在請求以外的地方（management command、背景工作）允許可容忍延遲的讀取走副本
+    """
+    token = enable_replica_reads()
+    try:
+        yield
+    finally:
+        reset_replica_reads(token)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_primary(user_id):
+    cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    pinned = getattr(request, '_replica_pinned', None)
+    if pinned is None:
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return False
+        pinned = request._replica_pinned = cache.get(_pin_key(user.pk)) is not None
+    return pinned
+
+
+def check_replica_cache(app_configs=None, **kwargs):
+    """
+    系統檢查：設定副本時 pin 紀錄應存放在各 worker 共用的 cache
+    """
+    if not replica_available():
+        return []
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        f'已設定唯讀副本，但 default cache ({backend}) 不是共用的 cache，寫入後的 pin 無法讓其他 worker 看到',
+        hint='設定 REDIS_URL，或將 CACHES["default"] 改為 Redis / Memcached / 資料庫等共用的 backend',
+        id='backend.W001',
+    )]
+
+
+def use_replica():
+    context = _replica_context.get()
+    if context is None or not replica_available():
+        return False
+    return context is True or not is_pinned(context)
+
+
+def read_alias():
+    return REPLICA_ALIAS if use_replica() else 'default'
+
+
+class ReplicaQuerySet(models.QuerySet):
+    def replica(self):
+        """
+        明確指定從副本讀取（沒有設定副本時維持主庫），適用於可容忍延遲的統計與匯出
+        """
+        return self.using(REPLICA_ALIAS) if replica_available() else self
+
+    def primary(self):
+        return self.using('default')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APP_LABELS and use_replica():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # 從副本讀出的物件在儲存時也必須寫回主庫
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本與主庫是同一份資料
+        return True
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 from datetime import timedelta
 
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'tinymce',
     'workout_journal',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -58,18 +60,42 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    
+    'backend.middleware.ReplicaReadMiddleware',
+    'backend.middleware.ProfilingMiddleware',
 ]
 
+# 驗證方式：登入 / 註冊 API 只為有啟用的方式發行對應的 token
+#   TokenAuthentication / ExpiringTokenAuthentication（預設）：Authorization: Token <key>，每次請求查詢 authtoken
+#   SignedTokenAuthentication（SIGNED_ACCESS_TOKENS=1）：Authorization: Bearer <access token>，以 refresh token 換發；
+#   啟用後原本的 Token key 不再被接受，客戶端需要重新登入
+SIGNED_ACCESS_TOKENS = os.environ.get('SIGNED_ACCESS_TOKENS', '0') == '1'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.SignedTokenAuthentication',
+    ] if SIGNED_ACCESS_TOKENS else [
         'rest_framework.authentication.TokenAuthentication',
         'accounts.authentication.ExpiringTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'backend.throttling.TokenBucketThrottle',
+    ],
+}
+
+# 令牌桶限流：URL name -> '次數/期間'（可連續請求的次數，並以相同平均速率補充），見 backend/throttling.py
+THROTTLE_BUCKETS = {
+    'login': '10/min',
+    'register': '5/hour',
+    'token-refresh': '30/min',
+    'create-exercise-plan': '60/min',
+    'body-composition-batch': '30/min',
+    'generate-plan': '10/min',
 }
+# 'local'：各 process 的記憶體；'cache'：共用 Django cache
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'local')
+THROTTLE_CACHE_ALIAS = os.environ.get('THROTTLE_CACHE_ALIAS', 'default')
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -95,21 +121,101 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# 以環境變數設定資料庫；DB_ENGINE=sqlite 時改用本機 SQLite，測試與 benchmark 不需要外部服務
 
-DATABASES = {
-    # 'default': {
-    #     'ENGINE': 'django.db.backends.sqlite3',
-    #     'NAME': BASE_DIR / 'db.sqlite3',
-    # }
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',  # 使用 PostgreSQL 資料庫
-        'NAME': 'fitness_project',               # 替換為你在 PostgreSQL 中建立的資料庫名稱
-        'USER': 'postgres',                    # 替換為你建立的 PostgreSQL 使用者名稱
-        'PASSWORD': 'fitwendy0727',                # 替換為你建立的 PostgreSQL 使用者的密碼(新:fitness_wendy)
-        'HOST': 'localhost',                        # 如果資料庫在本地運行，可以使用 'localhost'
-        'PORT': '5432',                             # PostgreSQL 的預設端口是 5432
+DB_ENGINE = os.environ.get('DB_ENGINE', 'postgresql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    # 本機以第二個 SQLite 檔案模擬唯讀副本，用來驗證路由行為（DB_REPLICA_NAME=/tmp/replica.sqlite3 manage.py test 會執行路由測試）
+    if os.environ.get('DB_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ['DB_REPLICA_NAME'],
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',  # 使用 PostgreSQL 資料庫
+            'NAME': os.environ.get('DB_NAME', 'fitness_project'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'fitwendy0727'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # 持久連線：同一個 worker 重複使用連線，並在每個請求開始前檢查連線是否仍可用
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # requirements.txt 安裝 psycopg 3 與 psycopg_pool，預設使用內建連線池（連線池與持久連線不能同時使用）；
+    # 仍使用 psycopg2 的環境沒有 psycopg_pool，會維持上面的持久連線，DB_POOL=0 也可以關閉連線池
+    if (os.environ.get('DB_POOL', '1') == '1'
+            and importlib.util.find_spec('psycopg') and importlib.util.find_spec('psycopg_pool')):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+    # 唯讀副本：設定 DB_REPLICA_HOST 後，REPLICA_READ_VIEWS 的查詢改由副本提供
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# 可以讀取唯讀副本的 GET 端點（URL name）；增量同步依賴 cursor 的一致性，必須留在主庫
+REPLICA_READ_VIEWS = [
+    'monthly-plans',
+    'weekly-plans',
+    'body-composition',
+    'template_detail',
+    'calendar',
+    'calendar-ics',
+    'leaderboard',
+    'workoutjournal-list',
+    'workoutjournal-detail',
+]
+
+# 共用 cache：設定 REDIS_URL（需安裝 redis 套件）後 replica pin、限流 (THROTTLE_STORE='cache') 與帳號狀態快取由所有 worker 共用；
+# 未設定時使用各 process 的記憶體，設定唯讀副本時 manage.py check 會發出警告（見 backend/routers.py）
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
     }
-}
+
+# 使用者寫入後固定讀主庫的秒數 (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '10'))
+
+# 超過此天數的運動計劃可由 archive_exercises 封存到 ExerciseArchive
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+
+# Idempotency-Key 的保留時間，以及處理中的請求超過多久視為中斷
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_HOURS', '24')))
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=60)
+
+# 排行榜快取秒數（排行榜由 WeeklyRollup 提供，計劃寫入後最多延遲這麼久才反映在排名上）
+LEADERBOARD_CACHE_SECONDS = int(os.environ.get('LEADERBOARD_CACHE_SECONDS', '60'))
+
+# 請求取樣分析：隨機取樣比例 (0 ~ 1)、取樣間隔秒數、輸出目錄與保留的檔案數量
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', '0.005'))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '500'))
 
 
 # Password validation
@@ -159,6 +265,17 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 媒體檔案的傳送方式：None（Django 直接傳送）、'x-accel-redirect'（nginx）或 'x-sendfile'，見 backend/media.py
+# （media 路由在 DEBUG 或設定 MEDIA_SENDFILE 時掛載，只提供給已登入的檔案擁有者）
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+# nginx 中對應 MEDIA_ROOT 的 internal location
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_SECONDS = int(os.environ.get('MEDIA_CACHE_SECONDS', '86400'))
+
+# 日誌圖片：縮小版本的寬度與上傳大小上限
+JOURNAL_IMAGE_WIDTHS = (320, 800, 1600)
+JOURNAL_IMAGE_MAX_BYTES = int(os.environ.get('JOURNAL_IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -174,8 +291,30 @@ LOCALE_PATHS = (
 # Token 過期時間設定（hours, minutes, seconds）
 TOKEN_EXPIRATION_TIME = timedelta(hours=2)
 
+# 簽章式 access token 與 refresh token 的有效期限
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=int(os.environ.get('ACCESS_TOKEN_MINUTES', '15')))
+REFRESH_TOKEN_LIFETIME = timedelta(days=int(os.environ.get('REFRESH_TOKEN_DAYS', '30')))
+# 驗證 access token 時快取帳號是否啟用的秒數；停用 / 刪除帳號時會清除快取，
+# 快取不是共用的 backend 時，其他 process 最多在這段時間內仍接受該帳號的 access token
+ACCESS_TOKEN_ACTIVE_CACHE_SECONDS = int(os.environ.get('ACCESS_TOKEN_ACTIVE_CACHE_SECONDS', '60'))
+
+# 帳號刪除與資料保留：每批刪除筆數、批次間暫停秒數，以及日誌 / token 的保留天數（未設定則不清理）
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', '1000'))
+PURGE_SLEEP = float(os.environ.get('PURGE_SLEEP', '0.05'))
+RETENTION_JOURNAL_DAYS = int(os.environ['RETENTION_JOURNAL_DAYS']) if os.environ.get('RETENTION_JOURNAL_DAYS') else None
+RETENTION_TOKEN_DAYS = int(os.environ['RETENTION_TOKEN_DAYS']) if os.environ.get('RETENTION_TOKEN_DAYS') else None
+# 已完成 / 失敗的背景工作 (Job) 保留的天數，之後連同匯出的檔案一起刪除
+RETENTION_JOB_DAYS = int(os.environ.get('RETENTION_JOB_DAYS', '30'))
+# 同步刪除紀錄 (SyncTombstone) 保留的天數：prune_retention 刪除更舊的紀錄，
+# cursor 早於這個期限的客戶端會收到完整同步 (full_sync)，必須以回應取代本地資料
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
+
 CORS_ALLOW_ALL_ORIGINS = True
 
+# 瀏覽器客戶端需要送出 Idempotency-Key（見 exercise/idempotency.py）
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
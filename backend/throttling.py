@@ -0,0 +1,129 @@
+"""
+令牌桶 (token bucket) 限流
+
+settings.THROTTLE_BUCKETS 以 URL name 設定 '次數/期間'：桶子容量為「次數」，並以「次數/期間」的速率補充，
+允許短時間的連續請求，但長期平均不會超過設定值。已登入的請求以 user id 計算，其他以 IP 計算。
+DRF 在執行 view（序列化器、密碼雜湊）之前檢查 throttle，超過時直接返回 429 與 Retry-After。
+
+THROTTLE_STORE：
+    'local'：每個 process 各自的記憶體 LRU，不需要任何 I/O；多個 worker 時實際上限為 worker 數量倍
+    'cache'：存在 Django cache (THROTTLE_CACHE_ALIAS)，多個 worker 共用；讀寫不是原子操作，高併發時為近似值（見 CacheBucketStore）
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_bucket(rate):
+    """
+    '10/min' -> (容量 10, 每秒補充 10 / 60)
+    """
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+class LocalBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [剩餘令牌, 上次更新時間]
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        """
+        取出一個令牌；成功返回 0，否則返回需要等待的秒數
+        """
+        current = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, current]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (current - bucket[1]) * refill_rate)
+                bucket[1] = current
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    桶子存放在 Django cache，所有 worker 共用。
+    讀取、計算、寫回不是原子操作（Django cache 沒有 compare-and-set）：多個 worker 同時取同一個桶子時
+    可能讀到相同的剩餘令牌，每次競爭最多多放行同時請求的數量，限制只是近似值。
+    需要嚴格上限的端點應改用 Redis script 或資料庫鎖
+    """
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def take(self, key, capacity, refill_rate):
+        cache = caches[self.alias]
+        current = time.time()
+        cache_key = f'throttle:{key}'
+        tokens, updated = cache.get(cache_key, (capacity, current))
+        tokens = min(capacity, tokens + (current - updated) * refill_rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+        if not wait:
+            tokens -= 1
+        # 桶子補滿所需的時間之後資料就沒有意義，讓 cache 自動過期
+        cache.set(cache_key, (tokens, current), timeout=int(capacity / refill_rate) + 1)
+        return wait
+
+    def clear(self):
+        pass
+
+
+_local_store = LocalBucketStore(getattr(settings, 'THROTTLE_LOCAL_MAX_KEYS', 100000))
+
+
+def get_store():
+    if settings.THROTTLE_STORE == 'cache':
+        return CacheBucketStore(settings.THROTTLE_CACHE_ALIAS)
+    return _local_store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    依 URL name 套用 settings.THROTTLE_BUCKETS；沒有設定的端點不限流
+    """
+    buckets = None
+
+    def __init__(self):
+        self._wait = None
+
+    @classmethod
+    def get_buckets(cls):
+        if cls.buckets is None:
+            cls.buckets = {name: parse_bucket(rate) for name, rate in settings.THROTTLE_BUCKETS.items()}
+        return cls.buckets
+
+    def get_cache_key(self, request, url_name):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'{url_name}:user:{user.pk}'
+        return f'{url_name}:ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        match = request.resolver_match
+        bucket = self.get_buckets().get(match.url_name) if match else None
+        if bucket is None:
+            return True
+        self._wait = get_store().take(self.get_cache_key(request, match.url_name), *bucket)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
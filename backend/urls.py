@@ -15,13 +15,21 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from backend.media import MediaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('fitness_api/exercise/', include('exercise.urls')),
     path('fitness_api/accounts/', include('accounts.urls')),
     path('fitness_api/workout_journal/', include('workout_journal.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('fitness_api/jobs/', include('jobs.urls')),
+]
+
+if settings.DEBUG or settings.MEDIA_SENDFILE:
+    # 上傳的檔案（日誌圖片、匯出的 .ics），檢查登入與擁有者後傳送，支援 ETag / Range；
+    # 正式環境設定 MEDIA_SENDFILE，由 web server 從 internal location 傳送檔案內容
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', MediaView.as_view(), name='media'),
+    ]
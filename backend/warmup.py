@@ -0,0 +1,81 @@
+"""
+worker 預熱：在接受請求前建立第一次請求才會建立的資料
+
+共用的部分（URL resolver、各語言的翻譯 catalog）在這裡處理，各 app 的部分寫在
+AppConfig.warm_up()（例如 serializer 欄位、運動項目目錄索引）。wsgi / asgi 載入後呼叫 warm_up()，
+也可以用 manage.py warm_up 查看各步驟與模組載入的耗時。
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    # reverse_dict 會觸發整個 URLconf 的載入與解析
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def warm_translations():
+    """
+    載入每個語言的翻譯 catalog（activate 時才會讀取 .mo 檔）
+    """
+    for code, _ in settings.LANGUAGES:
+        with translation.override(code):
+            translation.get_language()
+    return len(settings.LANGUAGES)
+
+
+def warm_labels(*labels):
+    """
+    在每個語言下各產生一次 lazy 翻譯標籤（例如 model 的 choices），各 app 在 warm_up() 中呼叫
+    """
+    for code, _ in settings.LANGUAGES:
+        with translation.override(code):
+            for label in labels:
+                str(label)
+    return len(labels)
+
+
+def warm_serializers(*serializer_classes):
+    """
+    建立 serializer 的欄位；ModelSerializer 第一次建立欄位時需要分析模型
+    """
+    for serializer_class in serializer_classes:
+        serializer_class().fields
+    return len(serializer_classes)
+
+
+def warm_up():
+    """
+    依序執行共用步驟與各 app 的 warm_up()，返回 [(步驟, 秒數), ...]。
+    資料表尚未建立（例如尚未 migrate）等資料庫錯誤只記錄下來，不影響 worker 啟動
+    """
+    steps = [('urls', warm_urls), ('translations', warm_translations)]
+    steps += [
+        (app_config.label, app_config.warm_up)
+        for app_config in apps.get_app_configs()
+        if callable(getattr(app_config, 'warm_up', None))
+    ]
+
+    timings = []
+    try:
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except DatabaseError as e:
+                logger.warning('warm-up step %s skipped: %s', name, e)
+            timings.append((name, time.perf_counter() - started))
+    finally:
+        # 不把預熱用的連線留給 fork 出來的 worker
+        connections.close_all()
+    return timings
@@ -1,7 +1,63 @@
 from django.contrib import admin
-from .models import Exercise
+from backend.admin_tools import BoundedInlineFormSet, LargeTableAdmin
+from .models import BodyComposition, Exercise, ExerciseCatalog, ExerciseSet, SetDetail, normalize_exercise_name
+
+class ExerciseSetInline(admin.TabularInline):
+    model = ExerciseSet
+    formset = BoundedInlineFormSet
+    fields = ('exercise_name', 'catalog', 'body_part', 'joint_type', 'sets')
+    raw_id_fields = ('catalog',)
+    extra = 0
+    show_change_link = True  # details 在 ExerciseSet 的頁面編輯
+
+class SetDetailInline(admin.TabularInline):
+    model = SetDetail
+    formset = BoundedInlineFormSet
+    fields = ('reps', 'weight', 'actual_duration', 'rest_time')
+    extra = 0
 
 # 註冊 Exercise 模型
 @admin.register(Exercise)
-class ExerciseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'total_duration', 'goal')  # 設定管理界面中顯示的字段
+class ExerciseAdmin(LargeTableAdmin):
+    list_display = ('name', 'user', 'goal', 'scheduled_date', 'total_duration', 'is_archived')  # 設定管理界面中顯示的字段
+    list_select_related = ('user',)
+    list_filter = ('goal', 'is_archived')
+    date_hierarchy = 'scheduled_date'
+    # 以使用者名稱精確比對，不對 name 做 LIKE 全表掃描
+    search_fields = ('=user__username',)
+    raw_id_fields = ('user',)
+    inlines = [ExerciseSetInline]
+
+@admin.register(ExerciseSet)
+class ExerciseSetAdmin(LargeTableAdmin):
+    list_display = ('exercise_name', 'exercise', 'body_part', 'joint_type', 'sets', 'updated_at')
+    list_select_related = ('exercise',)
+    list_filter = ('body_part', 'joint_type')
+    raw_id_fields = ('exercise', 'catalog')
+    inlines = [SetDetailInline]
+
+@admin.register(SetDetail)
+class SetDetailAdmin(LargeTableAdmin):
+    list_display = ('id', 'exercise_set', 'reps', 'weight', 'actual_duration', 'rest_time')
+    list_select_related = ('exercise_set',)
+    raw_id_fields = ('exercise_set',)
+
+@admin.register(BodyComposition)
+class BodyCompositionAdmin(LargeTableAdmin):
+    list_display = ('user', 'measured_at', 'weight', 'body_fat_percentage', 'bmi')
+    list_select_related = ('user',)
+    search_fields = ('=user__username',)
+    raw_id_fields = ('user',)
+
+@admin.register(ExerciseCatalog)
+class ExerciseCatalogAdmin(admin.ModelAdmin):
+    list_display = ('name', 'normalized_name', 'created_at')
+    # 以 normalized_name 的前綴索引搜尋
+    search_fields = ('normalized_name__startswith',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # 整個輸入當成一個前綴比對；預設會依空白拆成多個字，各自要求 normalized_name 以該字開頭
+        key = normalize_exercise_name(search_term)
+        if not key:
+            return queryset, False
+        return queryset.filter(normalized_name__startswith=key), False
@@ -1,6 +1,64 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ExerciseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exercise'
+    # 背景工作匯出的 .ics，見 tasks.export_calendar 與 backend/media.py
+    media_prefix = 'exports/'
+
+    def can_access_media(self, user, path):
+        """
+        匯出檔只提供給建立該背景工作的使用者
+        """
+        from django.core.files.storage import default_storage
+        from jobs.models import Job
+
+        return Job.objects.filter(user=user, result__url=default_storage.url(path)).exists()
+
+    def ready(self):
+        from django.core import checks
+        from backend.routers import check_replica_cache
+        from .catalog import catalog_index
+        from .models import ExerciseCatalog
+
+        # 目錄項目被修改或刪除時重建記憶體索引（新增項目由 ExerciseCatalog.resolve 增量載入）
+        post_save.connect(catalog_index.invalidate, sender=ExerciseCatalog, dispatch_uid='catalog_index_invalidate_save')
+        post_delete.connect(catalog_index.invalidate, sender=ExerciseCatalog, dispatch_uid='catalog_index_invalidate_delete')
+
+        # 增量同步的刪除紀錄，見 sync.record_deletion
+        from .models import BodyComposition, Exercise, ExerciseSet, SetDetail
+        from .sync import record_deletion
+        for model in (Exercise, ExerciseSet, SetDetail, BodyComposition):
+            post_delete.connect(record_deletion, sender=model, dispatch_uid=f'sync_tombstone_{model._meta.model_name}')
+
+        # 刪除計劃資料與單筆修改 SetDetail 後重新計算每週彙總，見 rollups.py
+        from .rollups import refresh_on_delete, refresh_on_detail_save
+        for model in (Exercise, ExerciseSet, SetDetail):
+            post_delete.connect(refresh_on_delete, sender=model, dispatch_uid=f'rollup_refresh_{model._meta.model_name}')
+        post_save.connect(refresh_on_detail_save, sender=SetDetail, dispatch_uid='rollup_refresh_setdetail_save')
+
+        checks.register(check_replica_cache, checks.Tags.caches)
+
+    def warm_up(self):
+        """
+        worker 接受請求前呼叫，見 backend/warmup.py
+        """
+        from django.utils.translation import gettext_lazy as _
+        from backend.warmup import warm_labels, warm_serializers
+        from .catalog import catalog_index
+        from .models import Exercise, ExerciseSet, ExerciseType
+        from .serializers import BodyCompositionSerializer, ExerciseSerializer, TemplateSerializer
+
+        warm_serializers(ExerciseSerializer, BodyCompositionSerializer, TemplateSerializer)
+        # serializer 與欄位式格式輸出的 choices 標籤，'Unknown' 是對應不到 choices 時的標籤
+        warm_labels(
+            *Exercise.GOAL_CHOICES.values(),
+            *ExerciseSet.BODY_PART_CHOICES.values(),
+            *ExerciseSet.JOINT_TYPE_CHOICES.values(),
+            _('Unknown'),
+        )
+        # 建立連線並先執行一次 exercise_type 的查詢（PrimaryKeyRelatedField 驗證時使用）
+        list(ExerciseType.objects.values_list('id', 'name'))
+        catalog_index.warm()
@@ -0,0 +1,158 @@
+"""
+舊運動計劃的封存 (cold storage)
+
+超過 ARCHIVE_AFTER_DAYS 的計劃，其 ExerciseSet / SetDetail 會被壓縮成一個 zlib JSON，
+存進 ExerciseArchive，並從熱資料表刪除，SetDetail 因此維持在較小的大小。
+payload 的格式：
+    {"set_fields": [...], "detail_fields": [...], "sets": [[set 欄位..., [[detail 欄位...], ...]], ...]}
+讀取時 attach_archived_sets 會把 payload 還原成未存檔的 ExerciseSet / SetDetail 物件並放進
+prefetch 快取，序列化器與 create_from_template 等使用 exercise.sets.all() 的程式不需要區分。
+更新已封存計劃的 sets 前先以 restore_exercise 還原到熱資料表（保留原本的 id）。
+封存與還原都會更新 Exercise.updated_at，增量同步據此重新送出該計劃與 payload 中的 sets / details（見 sync.py），
+id 不變，客戶端 upsert 後資料不會消失。
+"""
+import json
+import zlib
+
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils.timezone import now
+
+from .models import Exercise, ExerciseArchive, ExerciseCatalog, ExerciseSet, SetDetail
+
+ARCHIVE_SET_FIELDS = ('id', 'exercise_name', 'catalog_id', 'body_part', 'joint_type', 'sets')
+ARCHIVE_DETAIL_FIELDS = ('id', 'reps', 'weight', 'actual_duration', 'rest_time')
+
+
+def pack(set_rows, details_by_set):
+    """
+    set_rows 為 ARCHIVE_SET_FIELDS 的 tuple；details_by_set 為 {set_id: [ARCHIVE_DETAIL_FIELDS 的 tuple]}
+    """
+    payload = {
+        'set_fields': ARCHIVE_SET_FIELDS,
+        'detail_fields': ARCHIVE_DETAIL_FIELDS,
+        'sets': [[*row, details_by_set.get(row[0], [])] for row in set_rows],
+    }
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def unpack(payload):
+    """
+    返回 [(set 欄位 dict, [detail 欄位 dict, ...]), ...]
+    """
+    data = json.loads(zlib.decompress(bytes(payload)))
+    set_fields, detail_fields = data['set_fields'], data['detail_fields']
+    return [
+        (dict(zip(set_fields, row[:-1])), [dict(zip(detail_fields, detail)) for detail in row[-1]])
+        for row in data['sets']
+    ]
+
+
+def _set_prefetched(instance, name, objects):
+    # 與 prefetch_related 的做法相同：讓 instance.<name>.all() 直接返回 objects
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+def attach_archived_sets(exercises):
+    """
+    以一次查詢載入已封存計劃的 payload，還原成 sets / details 並放進 prefetch 快取
+    """
+    archived = {
+        exercise.pk: exercise for exercise in exercises
+        if exercise.is_archived and not getattr(exercise, '_archive_attached', False)
+    }
+    if not archived:
+        return
+    rows = ExerciseArchive.objects.filter(exercise_id__in=archived).values_list('exercise_id', 'payload')
+    for exercise_id, payload in rows:
+        exercise = archived[exercise_id]
+        exercise_sets = []
+        for set_data, details_data in unpack(payload):
+            exercise_set = ExerciseSet(exercise_id=exercise_id, **set_data)
+            _set_prefetched(exercise_set, 'details', [SetDetail(exercise_set_id=exercise_set.id, **data) for data in details_data])
+            exercise_sets.append(exercise_set)
+        _set_prefetched(exercise, 'sets', exercise_sets)
+        exercise._archive_attached = True
+
+
+def archive_exercises(exercise_ids):
+    """
+    封存一批計劃：寫入 ExerciseArchive、標記 is_archived，再直接刪除熱資料表中的 details 與 sets
+    """
+    with transaction.atomic():
+        exercises = Exercise.objects.filter(id__in=exercise_ids, is_archived=False)
+        if connection.features.has_select_for_update:
+            # 避免封存時同一計劃正被更新
+            exercises = exercises.select_for_update()
+        exercise_ids = list(exercises.values_list('id', flat=True))
+        if not exercise_ids:
+            return 0
+
+        set_rows = ExerciseSet.objects.filter(exercise_id__in=exercise_ids).order_by('id').values_list('exercise_id', *ARCHIVE_SET_FIELDS)
+        detail_rows = SetDetail.objects.filter(
+            exercise_set__exercise_id__in=exercise_ids
+        ).order_by('id').values_list('exercise_set_id', *ARCHIVE_DETAIL_FIELDS)
+
+        sets_by_exercise, details_by_set = {}, {}
+        for row in set_rows:
+            sets_by_exercise.setdefault(row[0], []).append(row[1:])
+        for row in detail_rows:
+            details_by_set.setdefault(row[0], []).append(row[1:])
+
+        archives = []
+        for exercise_id in exercise_ids:
+            exercise_sets = sets_by_exercise.get(exercise_id, [])
+            details = [detail for row in exercise_sets for detail in details_by_set.get(row[0], [])]
+            archives.append(ExerciseArchive(
+                exercise_id=exercise_id,
+                payload=pack(exercise_sets, details_by_set),
+                set_count=len(exercise_sets),
+                detail_count=len(details),
+                # 與 SetDetail.calculate_volume 相同的規則
+                total_volume=sum(reps * weight for _, reps, weight, _, _ in details if 3 <= reps <= 15),
+            ))
+        ExerciseArchive.objects.bulk_create(archives)
+        # updated_at 讓增量同步重新送出這些計劃（sets / details 改由 payload 提供）
+        Exercise.objects.filter(id__in=exercise_ids).update(is_archived=True, updated_at=now())
+
+        # 子資料已整批複製到 payload，不經過 Collector 直接刪除
+        SetDetail.objects.filter(exercise_set__exercise_id__in=exercise_ids)._raw_delete(using=DEFAULT_DB_ALIAS)
+        ExerciseSet.objects.filter(exercise_id__in=exercise_ids)._raw_delete(using=DEFAULT_DB_ALIAS)
+    return len(exercise_ids)
+
+
+@transaction.atomic
+def restore_exercise(exercise):
+    """
+    將已封存計劃的 sets / details 以原本的 id 寫回熱資料表
+    """
+    archive = ExerciseArchive.objects.select_for_update().filter(exercise=exercise).first()
+    if archive is None:
+        return
+    rows = unpack(archive.payload)
+    catalog_ids = set(ExerciseCatalog.objects.primary().filter(
+        id__in={set_data['catalog_id'] for set_data, _ in rows}
+    ).values_list('id', flat=True))
+
+    exercise_sets, details = [], []
+    for set_data, details_data in rows:
+        if set_data['catalog_id'] not in catalog_ids:
+            # 封存後目錄項目已被刪除
+            set_data['catalog_id'] = None
+        exercise_sets.append(ExerciseSet(exercise=exercise, **set_data))
+        details.extend(SetDetail(exercise_set_id=set_data['id'], **data) for data in details_data)
+    unmatched = [exercise_set for exercise_set in exercise_sets if exercise_set.catalog_id is None]
+    if unmatched:
+        ExerciseCatalog.assign(unmatched)
+    ExerciseSet.objects.bulk_create(exercise_sets)
+    SetDetail.objects.bulk_create(details)
+    archive.delete()
+    Exercise.objects.filter(pk=exercise.pk).update(is_archived=False, updated_at=now())
+
+    exercise.is_archived = False
+    exercise._archive_attached = False
+    getattr(exercise, '_prefetched_objects_cache', {}).pop('sets', None)
@@ -0,0 +1,126 @@
+"""
+運動項目目錄的記憶體前綴索引，供計劃編輯器每次按鍵的自動完成使用
+
+以排序後的 (key, catalog_id) 陣列搭配 bisect 做前綴查詢，效果等同前綴樹 (trie)，
+但在 Python 中記憶體用量與查詢速度都更好。除了完整名稱，也索引每個單字開頭的後綴，
+輸入 "press" 也能找到 "Bench Press"；完整名稱的前綴命中排在前面。
+
+索引在 worker 啟動時預熱，之後每 REFRESH_INTERVAL 秒以 id > max_id 增量載入其他 process 新增的項目；
+目錄被修改或刪除時整份重建。已發布的串列不會再被修改：預熱與增量載入都建立新的串列，
+再以一次指派替換 (names, words, display)，search 取得一次參照後不需要加鎖。
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from .models import ExerciseCatalog, normalize_exercise_name
+
+REFRESH_INTERVAL = 30
+
+
+class CatalogIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._warming = False
+        self.reset()
+
+    def reset(self):
+        # (names, words, display)：names / words 為已排序的 (key, catalog_id)，key 為完整名稱或單字開頭的後綴
+        self._index = ([], [], {})
+        self._max_id = 0
+        self._checked_at = 0.0
+        self.warmed = False
+
+    @staticmethod
+    def _entries(rows):
+        names, words, display = [], [], {}
+        for catalog_id, name, normalized_name in rows:
+            display[catalog_id] = name
+            names.append((normalized_name, catalog_id))
+            parts = normalized_name.split(' ')
+            for position in range(1, len(parts)):
+                words.append((' '.join(parts[position:]), catalog_id))
+        return names, words, display
+
+    def warm(self):
+        """
+        從資料庫載入整份目錄
+        """
+        with self._lock:
+            rows = ExerciseCatalog.objects.values_list('id', 'name', 'normalized_name').iterator(chunk_size=5000)
+            names, words, display = self._entries(rows)
+            names.sort()
+            words.sort()
+            self._index = (names, words, display)
+            self._max_id = max(display, default=0)
+            self._checked_at = time.monotonic()
+            self.warmed = True
+            self._warming = False
+
+    def refresh(self):
+        """
+        增量載入新建立的目錄項目，合併成新的串列後替換
+        """
+        if not self.warmed:
+            return
+        with self._lock:
+            rows = list(
+                ExerciseCatalog.objects.primary().filter(id__gt=self._max_id).values_list('id', 'name', 'normalized_name')
+            )
+            if rows:
+                new_names, new_words, new_display = self._entries(rows)
+                names, words, display = self._index
+                # 已排序的串列加上少量新項目，sorted 接近線性時間
+                self._index = (sorted(names + new_names), sorted(words + new_words), {**display, **new_display})
+                self._max_id = max(self._max_id, max(new_display))
+            self._checked_at = time.monotonic()
+
+    def invalidate(self, **kwargs):
+        self.warmed = False
+
+    def _warm_in_background(self):
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._warm_and_close, daemon=True).start()
+
+    def _warm_and_close(self):
+        from django.db import connections
+        try:
+            self.warm()
+        finally:
+            self._warming = False
+            connections.close_all()
+
+    def search(self, prefix, limit=10):
+        """
+        返回 [(catalog_id, name)]；索引尚未預熱時改用資料庫的前綴索引查詢，並在背景預熱
+        """
+        key = normalize_exercise_name(prefix)
+        if not key:
+            return []
+        if not self.warmed:
+            self._warm_in_background()
+            rows = ExerciseCatalog.objects.filter(normalized_name__startswith=key).order_by('normalized_name')
+            return list(rows.values_list('id', 'name')[:limit])
+        if time.monotonic() - self._checked_at > REFRESH_INTERVAL:
+            self.refresh()
+
+        # 索引只會整份替換，取得目前的參照後即使同時重建也不受影響
+        names, words, display = self._index
+        results, seen = [], set()
+        for entries in (names, words):
+            position = bisect_left(entries, (key,))
+            while position < len(entries) and len(results) < limit:
+                entry_key, catalog_id = entries[position]
+                if not entry_key.startswith(key):
+                    break
+                if catalog_id not in seen:
+                    seen.add(catalog_id)
+                    results.append((catalog_id, display[catalog_id]))
+                position += 1
+        return results
+
+
+catalog_index = CatalogIndex()
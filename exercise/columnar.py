@@ -0,0 +1,191 @@
+"""
+運動計劃的欄位式 (columnar) 表示法
+
+大量同步時，JSON 物件陣列會在每一列重複 reps / weight / actual_duration / rest_time
+等鍵名。這裡改為每個欄位一個平行陣列，並以 offsets 表示 exercise -> sets -> details
+的邊界（CSR 格式，長度為 n + 1，第 i 筆的子項目為 offsets[i]:offsets[i + 1]）。
+
+二進位格式（ColumnarBinaryRenderer）：
+    b'FPC1' | uint32 header 長度 (little-endian) | header JSON (utf-8) | 補齊到 8 bytes
+    | 各數值欄位的原始陣列（little-endian，每段都補齊到 8 bytes）
+header 中的 "columns" 清單記錄每個數值欄位的路徑、型別 (u8~u64 / i8~i64 / f32 / f64)、
+起始 offset（相對於資料區開頭）與長度，客戶端可以直接建立 TypedArray 讀取。
+"""
+import json
+import struct
+import sys
+from array import array
+
+from .archive import unpack
+from .models import Exercise, ExerciseArchive, ExerciseSet, SetDetail
+
+COLUMNAR_FORMAT = 'columnar/1'
+BINARY_MAGIC = b'FPC1'
+
+EXERCISE_FIELDS = (
+    'id', 'name', 'goal', 'total_duration', 'manual_calories_burned',
+    'calculated_calories_burned', 'scheduled_date', 'created_at',
+)
+SET_FIELDS = ('id', 'exercise_name', 'body_part', 'joint_type', 'sets')
+DETAIL_FIELDS = ('id', 'reps', 'weight', 'actual_duration', 'rest_time')
+
+# 會被打包成二進位陣列的數值欄位（可為 null 的欄位留在 header JSON 中）
+NUMERIC_COLUMNS = {
+    'exercises': ('id', 'goal', 'total_duration', 'calculated_calories_burned', 'set_offsets', 'type_offsets'),
+    'exercise_types': ('id',),
+    'sets': ('id', 'body_part', 'joint_type', 'sets', 'detail_offsets'),
+    'details': ('id', 'reps', 'weight', 'actual_duration', 'rest_time'),
+}
+
+_UNSIGNED_TYPES = (
+    ('u8', 'B', 0xFF),
+    ('u16', 'H', 0xFFFF),
+    ('u32', 'I', 0xFFFFFFFF),
+    ('u64', 'Q', 0xFFFFFFFFFFFFFFFF),
+)
+_SIGNED_TYPES = (
+    ('i8', 'b', 0x7F),
+    ('i16', 'h', 0x7FFF),
+    ('i32', 'i', 0x7FFFFFFF),
+    ('i64', 'q', 0x7FFFFFFFFFFFFFFF),
+)
+
+
+def _labels(choices):
+    return {key: str(label) for key, label in choices.items()}
+
+
+def build_plan_columns(exercises):
+    """
+    將 Exercise queryset 轉換為欄位式資料，固定 5 次查詢，不經過巢狀序列化器
+    """
+    exercises = exercises.prefetch_related(None)
+    exercise_rows = list(exercises.values_list(*EXERCISE_FIELDS))
+    exercise_ids = exercises.values('id')
+
+    type_rows = Exercise.exercise_type.through.objects.filter(
+        exercise_id__in=exercise_ids
+    ).values_list('exercise_id', 'exercisetype_id').order_by('exercise_id', 'exercisetype_id')
+    set_rows = ExerciseSet.objects.filter(
+        exercise_id__in=exercise_ids
+    ).values_list('exercise_id', *SET_FIELDS).order_by('exercise_id', 'id')
+    detail_rows = SetDetail.objects.filter(
+        exercise_set__exercise_id__in=exercise_ids
+    ).values_list('exercise_set_id', *DETAIL_FIELDS).order_by('exercise_set_id', 'id')
+
+    types_by_exercise = {}
+    for exercise_id, type_id in type_rows:
+        types_by_exercise.setdefault(exercise_id, []).append(type_id)
+    sets_by_exercise = {}
+    for row in set_rows:
+        sets_by_exercise.setdefault(row[0], []).append(row[1:])
+    details_by_set = {}
+    for row in detail_rows:
+        details_by_set.setdefault(row[0], []).append(row[1:])
+    # 已封存計劃的 sets / details 從 ExerciseArchive 的 payload 還原
+    archive_rows = ExerciseArchive.objects.filter(exercise_id__in=exercise_ids).values_list('exercise_id', 'payload')
+    for exercise_id, payload in archive_rows:
+        for set_data, details_data in unpack(payload):
+            sets_by_exercise.setdefault(exercise_id, []).append(tuple(set_data[field] for field in SET_FIELDS))
+            details_by_set[set_data['id']] = [tuple(detail[field] for field in DETAIL_FIELDS) for detail in details_data]
+
+    columns = {
+        'exercises': {field: [] for field in EXERCISE_FIELDS},
+        'exercise_types': {'id': []},
+        'sets': {field: [] for field in SET_FIELDS},
+        'details': {field: [] for field in DETAIL_FIELDS},
+    }
+    exercise_columns = columns['exercises']
+    set_columns = columns['sets']
+    detail_columns = columns['details']
+    set_offsets = exercise_columns['set_offsets'] = [0]
+    type_offsets = exercise_columns['type_offsets'] = [0]
+    detail_offsets = set_columns['detail_offsets'] = [0]
+
+    for row in exercise_rows:
+        for field, value in zip(EXERCISE_FIELDS, row):
+            exercise_columns[field].append(value)
+        exercise_id = row[0]
+
+        type_ids = types_by_exercise.get(exercise_id, ())
+        columns['exercise_types']['id'].extend(type_ids)
+        type_offsets.append(type_offsets[-1] + len(type_ids))
+
+        exercise_sets = sets_by_exercise.get(exercise_id, ())
+        for set_row in exercise_sets:
+            for field, value in zip(SET_FIELDS, set_row):
+                set_columns[field].append(value)
+            details = details_by_set.get(set_row[0], ())
+            for detail_row in details:
+                for field, value in zip(DETAIL_FIELDS, detail_row):
+                    detail_columns[field].append(value)
+            detail_offsets.append(detail_offsets[-1] + len(details))
+        set_offsets.append(set_offsets[-1] + len(exercise_sets))
+
+    exercise_columns['scheduled_date'] = [value.isoformat() for value in exercise_columns['scheduled_date']]
+    exercise_columns['created_at'] = [value.isoformat() for value in exercise_columns['created_at']]
+
+    return {
+        'format': COLUMNAR_FORMAT,
+        'count': len(exercise_rows),
+        **columns,
+        'labels': {
+            'goal': _labels(Exercise.GOAL_CHOICES),
+            'body_part': _labels(ExerciseSet.BODY_PART_CHOICES),
+            'joint_type': _labels(ExerciseSet.JOINT_TYPE_CHOICES),
+        },
+    }
+
+
+def _typed_array(values):
+    """
+    依照欄位內容挑選最小的型別：非負整數用 u8~u64，含負數時用 i8~i64，浮點數能無損轉成 f32 時用 f32
+    """
+    if any(isinstance(value, float) for value in values):
+        packed = array('f', values)
+        if list(packed) == values:
+            return 'f32', packed
+        return 'f64', array('d', values)
+    minimum, maximum = min(values, default=0), max(values, default=0)
+    if minimum >= 0:
+        for name, typecode, limit in _UNSIGNED_TYPES:
+            if maximum <= limit:
+                return name, array(typecode, values)
+        raise ValueError('欄位數值超出 u64 範圍')
+    for name, typecode, limit in _SIGNED_TYPES:
+        # 二補數的範圍是 [-limit - 1, limit]
+        if -limit - 1 <= minimum and maximum <= limit:
+            return name, array(typecode, values)
+    raise ValueError('欄位數值超出 i64 範圍')
+
+
+def pack_columns(payload):
+    """
+    將 build_plan_columns 的結果打包為二進位格式；非欄位式資料（例如錯誤訊息）只會放在 header
+    """
+    header = dict(payload) if isinstance(payload, dict) else {'data': payload}
+    manifest = []
+    chunks = []
+    offset = 0
+    for group, fields in NUMERIC_COLUMNS.items():
+        if not isinstance(header.get(group), dict):
+            continue
+        group_columns = header[group] = dict(header[group])
+        for field in fields:
+            values = group_columns.get(field)
+            if values is None or any(value is None for value in values):
+                continue
+            type_name, packed = _typed_array(values)
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            data = packed.tobytes()
+            padding = -len(data) % 8
+            manifest.append({'path': f'{group}.{field}', 'type': type_name, 'offset': offset, 'length': len(values)})
+            chunks.append(data + b'\0' * padding)
+            offset += len(data) + padding
+            del group_columns[field]
+    header['columns'] = manifest
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    prefix = BINARY_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+    return prefix + b'\0' * (-len(prefix) % 8) + b''.join(chunks)
@@ -0,0 +1,125 @@
+"""
+Idempotency-Key：客戶端重試同一個 POST 時重播第一次的回應，不會再次寫入整棵計劃
+
+第一個請求先寫入一筆沒有 status_code 的 IdempotencyRecord 作為鎖（(user, key) 唯一），
+完成後保存狀態碼、回應內容與 Location 等標頭，保留 IDEMPOTENCY_KEY_TTL。
+  - 同一個 key 但請求內容不同：422
+  - 第一個請求仍在處理中：409 並附上 Retry-After；超過 IDEMPOTENCY_LOCK_TIMEOUT 視為中斷，由新的請求接手
+  - 所有最終結果都會保存並重播：2xx 與 4xx 回應，包含 view 拋出的 APIException（例如 ValidationError）
+  - 可以重試的結果不保存，刪除紀錄讓客戶端以同一個 key 重試：5xx、409、429 與非 APIException 的例外
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# 重播時一併返回的回應標頭
+STORED_HEADERS = ('Location',)
+# 不保存的狀態碼：讓客戶端稍後以同一個 key 重試
+RETRYABLE_STATUS = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request._request.body)
+    return digest.hexdigest()
+
+
+def find_record(user_id, key):
+    return IdempotencyRecord.objects.filter(user_id=user_id, key=key)
+
+
+def claim(user_id, key, fingerprint):
+    """
+    取得 key 的鎖，成功返回 (record, True)；已有紀錄時返回 (record, False)
+    """
+    current = now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(
+                user_id=user_id, key=key, fingerprint=fingerprint, locked_at=current,
+                expires_at=current + settings.IDEMPOTENCY_KEY_TTL,
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    record = find_record(user_id, key).first()
+    if record is None:
+        # 剛好被清除，重新取得
+        return claim(user_id, key, fingerprint)
+    if record.expires_at <= current:
+        IdempotencyRecord.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+        return claim(user_id, key, fingerprint)
+    if record.status_code is None and record.fingerprint == fingerprint \
+            and record.locked_at <= current - settings.IDEMPOTENCY_LOCK_TIMEOUT:
+        # 先前的請求已中斷，以 compare-and-set 接手
+        taken = IdempotencyRecord.objects.filter(
+            pk=record.pk, status_code__isnull=True, locked_at=record.locked_at
+        ).update(locked_at=current)
+        if taken:
+            record.locked_at = current
+            return record, True
+    return record, False
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.status_code, headers=record.response_headers)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    APIView 寫入方法的 decorator；沒有 Idempotency-Key 標頭時照常執行
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} 不可超過 {MAX_KEY_LENGTH} 個字元'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, claimed = claim(request.user.pk, key, fingerprint)
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'{HEADER} 已用於內容不同的請求'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is None:
+                return Response(
+                    {'error': '相同的請求正在處理中'}, status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'},
+                )
+            return replay(record)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except APIException as exc:
+            # 與 view 返回的錯誤回應相同處理，依狀態碼決定是否保存
+            response = self.handle_exception(exc)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS:
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = getattr(response, 'data', None)
+        record.response_headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+        record.save(update_fields=['status_code', 'response_body', 'response_headers'])
+        return response
+    return wrapper
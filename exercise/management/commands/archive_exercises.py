@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localdate
+from exercise.archive import archive_exercises
+from exercise.models import Exercise
+
+
+class Command(BaseCommand):
+    help = '將超過指定天數的運動計劃的 sets / details 壓縮封存到 ExerciseArchive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS, help='封存 scheduled_date 早於 N 天前的計劃')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--sleep', type=float, default=0.0, help='每個批次之間暫停的秒數')
+        parser.add_argument('--user', type=int, default=None, help='只封存指定使用者的計劃')
+
+    def handle(self, *args, **options):
+        horizon = localdate() - timedelta(days=options['days'])
+        exercises = Exercise.objects.primary().filter(scheduled_date__lt=horizon, is_archived=False)
+        if options['user'] is not None:
+            exercises = exercises.filter(user_id=options['user'])
+
+        last_id = 0
+        archived = 0
+        while True:
+            exercise_ids = list(
+                exercises.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not exercise_ids:
+                break
+            archived += archive_exercises(exercise_ids)
+            last_id = exercise_ids[-1]
+            self.stdout.write(f'processed up to id {last_id}, {archived} exercises archived')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'done: {archived} exercises archived before {horizon}'))
@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from exercise.models import ExerciseCatalog, ExerciseSet, normalize_exercise_name
+
+
+class Command(BaseCommand):
+    help = '為尚未對應目錄的 ExerciseSet 分批建立並設定 ExerciseCatalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='每個批次之間暫停的秒數')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        updated = 0
+        while True:
+            rows = list(
+                ExerciseSet.objects.primary().filter(id__gt=last_id, catalog__isnull=True)
+                .order_by('id')
+                .values_list('id', 'exercise_name')[:chunk_size]
+            )
+            if not rows:
+                break
+            catalog_ids = ExerciseCatalog.resolve(name for _, name in rows)
+            # 同一批次中相同名稱的 ExerciseSet 合併為一個 UPDATE
+            groups = {}
+            for set_id, name in rows:
+                catalog_id = catalog_ids.get(normalize_exercise_name(name))
+                if catalog_id is not None:
+                    groups.setdefault(catalog_id, []).append(set_id)
+            for catalog_id, set_ids in groups.items():
+                # update() 不會更新 auto_now 欄位；catalog_id 會同步給客戶端，需要更新 updated_at
+                updated += ExerciseSet.objects.filter(id__in=set_ids).update(catalog_id=catalog_id, updated_at=now())
+            last_id = rows[-1][0]
+            self.stdout.write(f'processed up to id {last_id}, {updated} sets linked')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'done: {updated} sets linked, {ExerciseCatalog.objects.count()} catalog entries'))
@@ -0,0 +1,105 @@
+import threading
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from exercise.models import Exercise, ExerciseSet, SetDetail
+
+
+def legacy_update_total_duration(exercise):
+    """
+    舊版做法：在 Python 中加總所有 sets，再以完整的 save() 寫回
+    """
+    total_seconds = sum(exercise_set.total_duration() for exercise_set in exercise.sets.all())
+    exercise.total_duration = total_seconds // 60
+    exercise.save()
+
+
+def atomic_update_total_duration(exercise):
+    exercise.update_total_duration()
+
+
+MODES = {
+    'legacy': legacy_update_total_duration,
+    'atomic': atomic_update_total_duration,
+}
+
+
+class Command(BaseCommand):
+    help = '多執行緒同時寫入同一個 Exercise，驗證 total_duration 彙總是否正確並比較吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=50, help='每個執行緒寫入的 SetDetail 數量')
+        parser.add_argument('--mode', choices=['both', *MODES], default='both')
+        parser.add_argument('--retries', type=int, default=20, help='SQLite 遇到 database is locked 時的重試次數')
+
+    def handle(self, *args, **options):
+        modes = list(MODES) if options['mode'] == 'both' else [options['mode']]
+        results = {}
+        for mode in modes:
+            results[mode] = self.run_mode(mode, options['threads'], options['writes'], options['retries'])
+            elapsed, expected, actual, failed = results[mode]
+            self.stdout.write(
+                f'{mode:>6}: {options["threads"] * options["writes"] - failed} writes in {elapsed:.2f}s '
+                f'({(options["threads"] * options["writes"] - failed) / elapsed:.1f} writes/s), '
+                f'total_duration expected {expected} got {actual}, lost updates {expected - actual}'
+            )
+
+        if 'atomic' in results:
+            elapsed, expected, actual, failed = results['atomic']
+            if failed or expected != actual:
+                raise CommandError('atomic 模式的 total_duration 與實際寫入不一致')
+        if len(results) == 2:
+            gain = results['legacy'][0] / results['atomic'][0]
+            self.stdout.write(self.style.SUCCESS(f'atomic throughput: {gain:.2f}x legacy'))
+
+    def run_mode(self, mode, thread_count, writes, retries):
+        update = MODES[mode]
+        user = User.objects.create_user(username=f'bench-aggregates-{uuid.uuid4().hex[:12]}')
+        try:
+            exercise = Exercise.objects.create(user=user, name=f'bench {mode}', scheduled_date=time.strftime('%Y-%m-%d'))
+            exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='bench', sets=0)
+            failures = []
+
+            def writer():
+                try:
+                    local_exercise = Exercise.objects.get(pk=exercise.pk)
+                    for _ in range(writes):
+                        # 每筆 SetDetail 剛好 60 秒，total_duration 應等於寫入筆數
+                        for attempt in range(retries + 1):
+                            try:
+                                SetDetail.objects.create(
+                                    exercise_set_id=exercise_set.pk, reps=10, weight=20.0, actual_duration=45, rest_time=15
+                                )
+                                break
+                            except OperationalError:
+                                if attempt == retries:
+                                    failures.append(1)
+                                    raise
+                                time.sleep(0.005 * (attempt + 1))
+                        for attempt in range(retries + 1):
+                            try:
+                                update(local_exercise)
+                                break
+                            except OperationalError:
+                                if attempt == retries:
+                                    raise
+                                time.sleep(0.005 * (attempt + 1))
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=writer) for _ in range(thread_count)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            actual = Exercise.objects.primary().get(pk=exercise.pk).total_duration
+            expected = SetDetail.objects.primary().filter(exercise_set_id=exercise_set.pk).count()
+            return elapsed, expected, actual, len(failures)
+        finally:
+            user.delete()
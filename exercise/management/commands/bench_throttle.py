@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from backend import throttling
+from backend.throttling import CacheBucketStore, LocalBucketStore, TokenBucketThrottle
+
+
+class Command(BaseCommand):
+    help = '量測 TokenBucketThrottle 每次檢查的開銷，以及登入 API 被限流 (429) 與正常處理的耗時'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+        parser.add_argument('--requests', type=int, default=20, help='端對端量測的登入請求數')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        iterations = options['iterations']
+
+        path = reverse('login')
+        match = resolve(path)
+        request = factory.post(path)
+        request.resolver_match = match
+        unthrottled = factory.get(reverse('calendar'))
+        unthrottled.resolver_match = resolve(reverse('calendar'))
+
+        bucket = (10 ** 9, 10 ** 9)  # 足夠大的桶子，只量測檢查本身
+        original_buckets, original_store = TokenBucketThrottle.buckets, throttling.get_store
+        try:
+            self.stdout.write('每次 allow_request 的平均耗時：')
+            cases = [
+                ('未設定限流的端點', unthrottled, LocalBucketStore()),
+                ('local store', request, LocalBucketStore()),
+                ('cache store', request, CacheBucketStore()),
+            ]
+            for label, case_request, store in cases:
+                TokenBucketThrottle.buckets = {'login': bucket}
+                throttling.get_store = lambda store=store: store
+                throttle = TokenBucketThrottle()
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    throttle.allow_request(case_request, None)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  {label:<12} {elapsed / iterations * 1e6:8.2f} µs')
+
+            # 端對端：桶子容量為 1，第一個請求正常處理（會執行密碼雜湊），之後都是 429
+            store = LocalBucketStore()
+            throttling.get_store = lambda: store
+            TokenBucketThrottle.buckets = {'login': (1, 1e-6)}
+            timings = {}
+            for position in range(options['requests']):
+                login_request = factory.post(path, {'username': 'bench-throttle-nobody', 'password': 'wrong'})
+                login_request.resolver_match = match
+                started = time.perf_counter()
+                response = match.func(login_request)
+                timings.setdefault(response.status_code, []).append(time.perf_counter() - started)
+        finally:
+            TokenBucketThrottle.buckets, throttling.get_store = original_buckets, original_store
+
+        self.stdout.write('\n登入 API 端對端耗時：')
+        for status_code, values in sorted(timings.items()):
+            self.stdout.write(f'  HTTP {status_code}: {len(values):4d} 次，平均 {sum(values) / len(values) * 1e3:8.3f} ms')
@@ -0,0 +1,67 @@
+import difflib
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from exercise.query_plans import ENDPOINT_BUDGETS, HOT_QUERIES, check_all
+
+
+class Command(BaseCommand):
+    help = '以種子資料檢查熱門查詢的執行計畫與端點查詢次數，並輸出與基準的差異（資料在結束時 rollback）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=os.path.join(settings.BASE_DIR, 'query_plans'))
+        parser.add_argument('--update', action='store_true', help='以這次的執行計畫覆寫基準檔')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--plans-per-user', type=int, default=30)
+
+    def handle(self, *args, **options):
+        directory = os.path.join(options['output_dir'], connection.vendor)
+        os.makedirs(directory, exist_ok=True)
+
+        plans, plan_problems, budget_results = check_all(users=options['users'], plans_per_user=options['plans_per_user'])
+        problems = []
+        for name, failed in plan_problems.items():
+            problems += [f'{name}: {message}' for message in failed]
+            self.stdout.write(f'{"FAIL" if failed else "ok":>4}  plan    {name}')
+        for budget in ENDPOINT_BUDGETS:
+            count, failed = budget_results[budget.name]
+            problems += [f'{budget.name}: {message}' for message in failed]
+            self.stdout.write(f'{"FAIL" if failed else "ok":>4}  queries {budget.name} ({count}/{budget.max_queries})')
+
+        diff = self.write_plans(directory, plans, options['update'])
+        diff_path = os.path.join(options['output_dir'], f'{connection.vendor}.diff')
+        if diff:
+            with open(diff_path, 'w', encoding='utf-8') as f:
+                f.write(diff)
+            self.stdout.write(self.style.WARNING(f'執行計畫與基準不同，差異已寫入 {diff_path}'))
+        elif os.path.exists(diff_path):
+            # 上一次執行留下的差異已不再成立
+            os.remove(diff_path)
+
+        if problems:
+            for problem in problems:
+                self.stderr.write(f'  {problem}')
+            raise CommandError(f'{len(problems)} 項查詢檢查失敗')
+        self.stdout.write(self.style.SUCCESS(
+            f'done: {len(HOT_QUERIES)} query plans and {len(ENDPOINT_BUDGETS)} endpoint budgets passed on {connection.vendor}'
+        ))
+
+    def write_plans(self, directory, plans, update):
+        """
+        與基準檔比較並返回 unified diff；沒有基準檔或 --update 時寫入基準檔
+        """
+        diff = []
+        for name, plan in plans.items():
+            path = os.path.join(directory, f'{name}.plan')
+            if os.path.exists(path) and not update:
+                with open(path, encoding='utf-8') as f:
+                    baseline = f.read()
+                diff += difflib.unified_diff(
+                    baseline.splitlines(keepends=True), plan.splitlines(keepends=True),
+                    fromfile=f'{name} (baseline)', tofile=f'{name} (current)',
+                )
+                continue
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(plan)
+        return ''.join(diff)
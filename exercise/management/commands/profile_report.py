@@ -0,0 +1,63 @@
+import glob
+import os
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = '彙總 ProfilingMiddleware 輸出的 collapsed stack 檔案，列出最耗時的函式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='collapsed 檔案目錄，預設為 settings.PROFILING_DIR')
+        parser.add_argument('--url-name', action='append', default=[], help='只統計指定的 URL name（可重複指定）')
+        parser.add_argument('--since-hours', type=float, default=None, help='只統計最近 N 小時的檔案')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--output', default=None, help='另外輸出合併後的 collapsed 檔案，可直接繪製火焰圖')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILING_DIR
+        paths = glob.glob(os.path.join(directory, '*.collapsed'))
+        if options['since_hours'] is not None:
+            cutoff = time.time() - options['since_hours'] * 3600
+            paths = [path for path in paths if os.path.getmtime(path) >= cutoff]
+        if not paths:
+            raise CommandError(f'{directory} 中沒有符合條件的 collapsed 檔案')
+
+        url_names = set(options['url_name'])
+        merged = Counter()
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if not stack or (url_names and stack.split(';', 1)[0] not in url_names):
+                        continue
+                    merged[stack] += int(count)
+
+        # self：樣本落在該函式本身；total：該函式出現在堆疊中（同一堆疊只計一次）
+        self_samples, total_samples, endpoints = Counter(), Counter(), Counter()
+        for stack, count in merged.items():
+            frames = stack.split(';')
+            endpoints[frames[0]] += count
+            self_samples[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_samples[frame] += count
+        total = sum(merged.values())
+        if not total:
+            raise CommandError('沒有符合條件的樣本')
+
+        self.stdout.write(f'{len(paths)} 個檔案，共 {total} 個樣本')
+        self.stdout.write('\n依端點：')
+        for name, count in endpoints.most_common():
+            self.stdout.write(f'  {count / total:7.1%}  {name}')
+        for title, counter in (('self', self_samples), ('total', total_samples)):
+            self.stdout.write(f'\n前 {options["top"]} 名 ({title})：')
+            for frame, count in counter.most_common(options['top']):
+                self.stdout.write(f'  {count / total:7.1%}  {count:8d}  {frame}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                for stack, count in merged.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.stdout.write(self.style.SUCCESS(f'\n合併結果已寫入 {options["output"]}'))
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from exercise.models import Exercise
+from exercise.rollups import refresh_weekly_rollups
+
+
+class Command(BaseCommand):
+    help = '依使用者分批重新計算 WeeklyRollup（排行榜資料）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, help='只重新計算此日期 (YYYY-MM-DD) 所在週之後的資料')
+        parser.add_argument('--until', default=None, help='只重新計算到此日期 (YYYY-MM-DD) 所在週為止')
+        parser.add_argument('--batch-size', type=int, default=200, help='每批處理的使用者數量')
+        parser.add_argument('--sleep', type=float, default=0.0, help='每個批次之間暫停的秒數')
+
+    def handle(self, *args, **options):
+        bounds = Exercise.objects.primary().aggregate(first=Min('scheduled_date'), last=Max('scheduled_date'))
+        start = parse_date(options['since']) if options['since'] else bounds['first']
+        end = parse_date(options['until']) if options['until'] else bounds['last']
+        if start is None or end is None:
+            if options['since'] or options['until']:
+                raise CommandError('日期格式錯誤，應為 YYYY-MM-DD')
+            self.stdout.write('沒有運動計劃，不需要重新計算')
+            return
+        end += timedelta(days=1)
+
+        last_id = 0
+        rows = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not user_ids:
+                break
+            rows += refresh_weekly_rollups(user_ids, start, end)
+            last_id = user_ids[-1]
+            self.stdout.write(f'processed up to user {last_id}, {rows} rollups written')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'done: {rows} rollups written for {start} ~ {end - timedelta(days=1)}'))
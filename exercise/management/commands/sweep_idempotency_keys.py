@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from accounts.purge import delete_in_batches
+from exercise.models import IdempotencyRecord
+
+
+class Command(BaseCommand):
+    help = '分批刪除已過期的 Idempotency-Key 紀錄'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.PURGE_SLEEP)
+
+    def handle(self, *args, **options):
+        deleted = delete_in_batches(
+            IdempotencyRecord.objects.filter(expires_at__lte=now()), options['batch_size'], options['sleep']
+        )
+        self.stdout.write(self.style.SUCCESS(f'done: {deleted} expired idempotency keys deleted'))
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = '執行 worker 預熱並列出各步驟耗時；--importtime 另外以 python -X importtime 分析啟動時的模組載入'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--importtime', action='store_true', help='在子行程中載入 WSGI application 並統計模組載入時間')
+        parser.add_argument('--top', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['importtime']:
+            self.report_imports(options['top'])
+
+        timings = warm_up()
+        self.stdout.write('warm-up:')
+        for name, seconds in timings:
+            self.stdout.write(f'  {seconds * 1000:9.1f} ms  {name}')
+        total = sum(seconds for _, seconds in timings)
+        self.stdout.write(self.style.SUCCESS(f'done: warm-up took {total * 1000:.1f} ms'))
+
+    def report_imports(self, top):
+        """
+        與 worker 一樣載入 WSGI application（包含預熱），解析 -X importtime 的輸出
+        """
+        module = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        modules = []
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((int(self_us), int(cumulative_us), name.strip()))
+
+        packages = Counter()
+        for self_us, _, name in modules:
+            packages[name.split('.')[0]] += self_us
+
+        self.stdout.write(f'imports: {len(modules)} modules, {sum(m[0] for m in modules) / 1000:.1f} ms')
+        self.stdout.write('slowest modules (cumulative):')
+        for self_us, cumulative_us, name in sorted(modules, key=lambda m: -m[1])[:top]:
+            self.stdout.write(f'  {cumulative_us / 1000:9.1f} ms  {self_us / 1000:8.1f} ms self  {name}')
+        self.stdout.write('by package (self):')
+        for name, self_us in packages.most_common(top):
+            self.stdout.write(f'  {self_us / 1000:9.1f} ms  {name}')
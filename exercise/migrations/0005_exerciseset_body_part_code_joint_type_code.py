@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0004_sync_updated_at_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exerciseset',
+            name='body_part_code',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Chest'), (2, 'Back'), (3, 'Legs'), (4, 'Shoulders'), (5, 'Arms'), (6, 'Core'), (7, 'Full Body')], default=7),
+        ),
+        migrations.AddField(
+            model_name='exerciseset',
+            name='joint_type_code',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Single Joint'), (2, 'Multi Joint')], default=2),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# 將 body_part / joint_type 的字串值分批轉換到新的 small integer 欄位
+
+from django.db import migrations
+
+CHUNK_SIZE = 5000
+
+# 0001 時期以英文代碼儲存的舊資料
+LEGACY_BODY_PARTS = {
+    'chest': 1, 'back': 2, 'legs': 3, 'shoulders': 4, 'arms': 5, 'core': 6, 'full_body': 7,
+}
+LEGACY_JOINT_TYPES = {
+    'single_joint': 1, 'multi_joint': 2,
+}
+
+
+def to_code(value, legacy, default):
+    value = (value or '').strip()
+    if value.isdigit() and int(value) in legacy.values():
+        return int(value)
+    return legacy.get(value.lower(), default)
+
+
+def convert_codes(apps, schema_editor):
+    ExerciseSet = apps.get_model('exercise', 'ExerciseSet')
+    last_id = 0
+    while True:
+        rows = list(
+            ExerciseSet.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'body_part', 'joint_type')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        # 同一批次中相同的 (body_part, joint_type) 合併為一個 UPDATE
+        groups = {}
+        for set_id, body_part, joint_type in rows:
+            codes = (to_code(body_part, LEGACY_BODY_PARTS, 7), to_code(joint_type, LEGACY_JOINT_TYPES, 2))
+            groups.setdefault(codes, []).append(set_id)
+        for (body_part_code, joint_type_code), set_ids in groups.items():
+            ExerciseSet.objects.filter(id__in=set_ids).update(
+                body_part_code=body_part_code, joint_type_code=joint_type_code
+            )
+        last_id = rows[-1][0]
+
+
+def restore_legacy_values(apps, schema_editor):
+    """
+    回滾時將 small integer 寫回 0002 ~ 0005 的字串欄位（'1' ~ '7'），之後再次 migrate 時 to_code 仍可轉換
+    """
+    ExerciseSet = apps.get_model('exercise', 'ExerciseSet')
+    last_id = 0
+    while True:
+        rows = list(
+            ExerciseSet.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'body_part_code', 'joint_type_code')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        groups = {}
+        for set_id, body_part_code, joint_type_code in rows:
+            groups.setdefault((str(body_part_code), str(joint_type_code)), []).append(set_id)
+        for (body_part, joint_type), set_ids in groups.items():
+            ExerciseSet.objects.filter(id__in=set_ids).update(body_part=body_part, joint_type=joint_type)
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    # 每個批次各自提交，避免在大表上長時間持有鎖
+    atomic = False
+
+    dependencies = [
+        ('exercise', '0005_exerciseset_body_part_code_joint_type_code'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_codes, restore_legacy_values),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0006_convert_body_part_joint_type'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exerciseset',
+            name='body_part',
+        ),
+        migrations.RemoveField(
+            model_name='exerciseset',
+            name='joint_type',
+        ),
+        migrations.RenameField(
+            model_name='exerciseset',
+            old_name='body_part_code',
+            new_name='body_part',
+        ),
+        migrations.RenameField(
+            model_name='exerciseset',
+            old_name='joint_type_code',
+            new_name='joint_type',
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(fields=['body_part', 'exercise'], name='exercise_ex_body_pa_4df17e_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0007_exerciseset_small_int_body_part_joint_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('normalized_name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['normalized_name'], name='exercise_catalog_prefix_idx', opclasses=['varchar_pattern_ops'])],
+            },
+        ),
+        migrations.AddField(
+            model_name='exerciseset',
+            name='catalog',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sets', to='exercise.exercisecatalog'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0008_exercise_catalog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='exercise_ex_user_id_b9e315_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:40
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def collapse_duplicate_measurements(apps, schema_editor):
+    # 建立唯一限制前，同一 (user, measured_at) 只保留最後寫入（id 最大）的一筆
+    BodyComposition = apps.get_model('exercise', 'BodyComposition')
+    duplicates = BodyComposition.objects.values('user_id', 'measured_at').annotate(
+        rows=Count('id'), keep_id=Max('id'),
+    ).filter(rows__gt=1)
+    for row in duplicates.iterator():
+        BodyComposition.objects.filter(
+            user_id=row['user_id'], measured_at=row['measured_at'],
+        ).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0009_exercise_schedule_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bodycomposition',
+            name='measured_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(collapse_duplicate_measurements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bodycomposition',
+            constraint=models.UniqueConstraint(fields=('user', 'measured_at'), name='unique_body_composition_measurement'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0010_body_composition_measured_at_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseArchive',
+            fields=[
+                ('exercise', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='exercise.exercise')),
+                ('payload', models.BinaryField()),
+                ('set_count', models.PositiveIntegerField(default=0)),
+                ('detail_count', models.PositiveIntegerField(default=0)),
+                ('total_volume', models.FloatField(default=0.0, help_text='所有 details 的訓練量 (reps * weight)')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='is_archived',
+            field=models.BooleanField(default=False, help_text='sets / details 已壓縮到 ExerciseArchive'),
+        ),
+    ]
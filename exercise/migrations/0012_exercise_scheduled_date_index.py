@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0011_exercise_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['scheduled_date'], name='exercise_ex_schedul_3cbd51_idx'),
+        ),
+    ]
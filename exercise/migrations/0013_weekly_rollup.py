@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0012_exercise_scheduled_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='該週的星期一')),
+                ('goal', models.PositiveSmallIntegerField(default=0)),
+                ('total_volume', models.FloatField(default=0.0)),
+                ('total_minutes', models.PositiveIntegerField(default=0)),
+                ('total_calories', models.FloatField(default=0.0)),
+                ('exercise_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['week_start', 'goal', '-total_volume'], name='rollup_volume_rank_idx'), models.Index(fields=['week_start', 'goal', '-total_minutes'], name='rollup_minutes_rank_idx'), models.Index(fields=['week_start', 'goal', '-total_calories'], name='rollup_calories_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'week_start', 'goal'), name='unique_weekly_rollup')],
+            },
+        ),
+    ]
@@ -1,7 +1,20 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localdate, now
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from backend.routers import ReplicaQuerySet
+
+def compute_bmi(height, weight):
+    """
+    身高（公分）與體重（公斤）換算 BMI，身高不合理時返回 0
+    """
+    if height and height > 0:
+        return weight / ((height / 100) ** 2)
+    return 0.0
 
 class BodyComposition(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -20,7 +33,19 @@ class BodyComposition(models.Model):
     lower_arm_circumference = models.FloatField(help_text="下臂圍 (公分)", null=True, blank=True)
     thigh_circumference = models.FloatField(help_text="大腿圍 (公分)", null=True, blank=True)
     calf_circumference = models.FloatField(help_text="小腿圍 (公分)", null=True, blank=True)
-    measured_at = models.DateTimeField(auto_now_add=True)
+    measured_at = models.DateTimeField(default=now)  # 可由體重計上傳的量測時間覆寫
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
+        constraints = [
+            # 同一時間點的量測只保留一筆，批次上傳重送時據此去重
+            models.UniqueConstraint(fields=['user', 'measured_at'], name='unique_body_composition_measurement'),
+        ]
 
     def __str__(self):
         return f"Body Composition for {self.user.username} at {self.measured_at}"
@@ -34,10 +59,7 @@ class BodyComposition(models.Model):
 
     def save(self, *args, **kwargs):
         # 計算 BMI 並保存到 bmi 字段
-        if self.height > 0:
-            self.bmi = self.weight / ((self.height / 100) ** 2)
-        else:
-            self.bmi = 0.0
+        self.bmi = compute_bmi(self.height, self.weight)
         super().save(*args, **kwargs)
 
 class ExerciseType(models.Model):
@@ -64,19 +86,43 @@ class Exercise(models.Model):
     calculated_calories_burned = models.FloatField(help_text="自動計算的熱量消耗（大卡）", default=0.0)
     scheduled_date = models.DateField(help_text="運動計劃的安排日期")
     scheduled_time = models.TimeField(help_text="運動計劃的具體時間", null=True, blank=True)
+    is_archived = models.BooleanField(default=False, help_text="sets / details 已壓縮到 ExerciseArchive")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+            models.Index(fields=['user', 'scheduled_date', 'scheduled_time']),
+            # admin 的 date_hierarchy 與跨使用者的日期篩選
+            models.Index(fields=['scheduled_date']),
+        ]
 
     def __str__(self):
         return f"{self.name} on {self.scheduled_date}"
     
     def update_total_duration(self):
         """
-        計算所有 ExerciseSet 的總時間，並將結果保存到 total_duration 欄位
+        以單一 UPDATE 重新計算 total_duration（分鐘），只寫入 total_duration 與 updated_at。
+        支援 SELECT ... FOR UPDATE 的資料庫會先鎖定此 Exercise，讓子查詢在取得鎖之後才讀取 SetDetail，
+        同時寫入同一計劃的兩個請求不會互相覆蓋彙總結果
         """
-        # 呼叫 total_duration 方法，注意加上 ()
-        total_seconds = sum(exercise_set.total_duration() for exercise_set in self.sets.all())
-        self.total_duration = total_seconds // 60  # 將秒數轉換為分鐘
-        self.save()  # 保存更新到資料庫
+        total_seconds = SetDetail.objects.filter(
+            exercise_set__exercise=OuterRef('pk')
+        ).values('exercise_set__exercise').annotate(
+            total=Sum(F('actual_duration') + F('rest_time'))
+        ).values('total')
+
+        with transaction.atomic():
+            if connection.features.has_select_for_update:
+                list(Exercise.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            Exercise.objects.filter(pk=self.pk).update(
+                total_duration=Coalesce(Subquery(total_seconds), 0) / 60,  # 將秒數轉換為分鐘
+                updated_at=now(),
+            )
+        self.refresh_from_db(using='default', fields=['total_duration', 'updated_at'])
     
     @property
     def get_goal_display(self):
@@ -100,6 +146,59 @@ class Exercise(models.Model):
     def get_calories_burned(self):
         return self.manual_calories_burned or self.calculated_calories_burned
 
+def normalize_exercise_name(name):
+    """
+    比對與搜尋用的名稱：去除多餘空白並忽略大小寫
+    """
+    return ' '.join(name.split()).casefold()
+
+class ExerciseCatalog(models.Model):
+    """
+    運動項目目錄，ExerciseSet 以外鍵指向此處，exercise_name 保留使用者輸入的顯示名稱
+    """
+    name = models.CharField(max_length=100)
+    normalized_name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # PostgreSQL 的 LIKE 'prefix%' 需要 pattern_ops 才能使用索引（其他資料庫會忽略 opclasses）
+            models.Index(fields=['normalized_name'], name='exercise_catalog_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def resolve(cls, names):
+        """
+        返回 {normalized_name: catalog_id}，不存在的名稱會以 bulk_create 建立
+        """
+        names = {normalize_exercise_name(name): ' '.join(name.split()) for name in names if name and name.strip()}
+        if not names:
+            return {}
+        catalog_ids = dict(cls.objects.primary().filter(normalized_name__in=names).values_list('normalized_name', 'id'))
+        missing = [key for key in names if key not in catalog_ids]
+        if missing:
+            cls.objects.bulk_create(
+                [cls(name=names[key], normalized_name=key) for key in missing], ignore_conflicts=True
+            )
+            catalog_ids.update(cls.objects.primary().filter(normalized_name__in=missing).values_list('normalized_name', 'id'))
+            from .catalog import catalog_index
+            transaction.on_commit(catalog_index.refresh)
+        return catalog_ids
+
+    @classmethod
+    def assign(cls, exercise_sets):
+        """
+        依 exercise_name 設定一批 ExerciseSet 的 catalog（尚未寫入資料庫）
+        """
+        catalog_ids = cls.resolve(exercise_set.exercise_name for exercise_set in exercise_sets)
+        for exercise_set in exercise_sets:
+            exercise_set.catalog_id = catalog_ids.get(normalize_exercise_name(exercise_set.exercise_name))
+
 class ExerciseSet(models.Model):
     BODY_PART_CHOICES = {
         1: _('Chest'),
@@ -117,27 +216,43 @@ class ExerciseSet(models.Model):
     }
     exercise = models.ForeignKey(Exercise, related_name='sets', on_delete=models.CASCADE)
     exercise_name = models.CharField(max_length=100)
-    body_part = models.CharField(max_length=20, choices=list(BODY_PART_CHOICES.items()), default=7)
-    joint_type = models.CharField(max_length=20, choices=list(JOINT_TYPE_CHOICES.items()), default=2)
+    catalog = models.ForeignKey(ExerciseCatalog, related_name='sets', on_delete=models.SET_NULL, null=True, blank=True)
+    body_part = models.PositiveSmallIntegerField(choices=list(BODY_PART_CHOICES.items()), default=7)
+    joint_type = models.PositiveSmallIntegerField(choices=list(JOINT_TYPE_CHOICES.items()), default=2)
     sets = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['body_part', 'exercise']),
+        ]
 
     def total_duration(self):
         return sum(detail.calculate_time for detail in self.details.all())
     
     def save(self, *args, **kwargs):
-        # 初次保存，不更新 sets 的值
-        if not self.pk:
-            super().save(*args, **kwargs)
-        # 已有主鍵後再更新 sets 值
-        self.sets = self.details.count()
+        # 初次保存時還沒有 details，已有主鍵後 sets 以 details 的數量為準
+        if self.pk:
+            self.sets = self.details.count()
+        if self.catalog_id is None:
+            ExerciseCatalog.assign([self])
+        super().save(*args, **kwargs)
         self.exercise.update_total_duration()
 
+        from .rollups import schedule_rollup_refresh
+        schedule_rollup_refresh([(self.exercise.user_id, self.exercise.scheduled_date)])
+
 class SetDetail(models.Model):
     exercise_set = models.ForeignKey(ExerciseSet, related_name='details', on_delete=models.CASCADE)
     reps = models.PositiveIntegerField()
     weight = models.FloatField()
     actual_duration = models.PositiveIntegerField(help_text="Actual duration per set in seconds")
     rest_time = models.PositiveIntegerField(help_text="Rest time between sets in seconds")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ReplicaQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.reps} reps @ {self.weight} kg, {self.actual_duration}s work, {self.rest_time}s rest"
@@ -150,6 +265,95 @@ class SetDetail(models.Model):
     def calculate_time(self):
         return self.actual_duration + self.rest_time
 
+class SyncTombstone(models.Model):
+    """
+    已刪除資料的紀錄，供增量同步通知客戶端刪除本地資料，由 post_delete 寫入（見 sync.record_deletion）。
+    只記錄刪除的起點：刪除 ExerciseSet 時只記錄 ExerciseSet，客戶端應一併移除其 SetDetail
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+            # prune_expired 依 deleted_at 清理所有使用者的舊紀錄
+            models.Index(fields=['deleted_at']),
+        ]
+
+    @classmethod
+    def record(cls, user_id, model, object_ids):
+        cls.objects.bulk_create([
+            cls(user_id=user_id, model=model._meta.model_name, object_id=object_id)
+            for object_id in object_ids
+        ])
+
+class ExerciseArchive(models.Model):
+    """
+    已封存運動計劃的 sets / details，以 zlib 壓縮的 JSON 存放在單一欄位；
+    摘要欄位讓歷史統計不需要解壓縮
+    """
+    exercise = models.OneToOneField(Exercise, primary_key=True, related_name='archive', on_delete=models.CASCADE)
+    payload = models.BinaryField()
+    set_count = models.PositiveIntegerField(default=0)
+    detail_count = models.PositiveIntegerField(default=0)
+    total_volume = models.FloatField(default=0.0, help_text="所有 details 的訓練量 (reps * weight)")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+class WeeklyRollup(models.Model):
+    """
+    每位使用者每週（ISO 週，以 scheduled_date 計算）的訓練彙總，供排行榜使用。
+    goal 為 0 的列是所有目標的合計；由 exercise.rollups 在計劃寫入後增量更新
+    """
+    ALL_GOALS = 0
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    week_start = models.DateField(help_text="該週的星期一")
+    goal = models.PositiveSmallIntegerField(default=ALL_GOALS)
+    total_volume = models.FloatField(default=0.0)
+    total_minutes = models.PositiveIntegerField(default=0)
+    total_calories = models.FloatField(default=0.0)
+    exercise_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'week_start', 'goal'], name='unique_weekly_rollup'),
+        ]
+        indexes = [
+            # 排行榜：WHERE week_start = ? AND goal = ? ORDER BY <指標> DESC LIMIT k
+            models.Index(fields=['week_start', 'goal', '-total_volume'], name='rollup_volume_rank_idx'),
+            models.Index(fields=['week_start', 'goal', '-total_minutes'], name='rollup_minutes_rank_idx'),
+            models.Index(fields=['week_start', 'goal', '-total_calories'], name='rollup_calories_rank_idx'),
+        ]
+
+class IdempotencyRecord(models.Model):
+    """
+    Idempotency-Key 對應的回應。status_code 為空表示第一個請求仍在處理中，
+    重複的請求會重播保存的回應，見 exercise/idempotency.py
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="method、路徑與請求內容的 sha256")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict, blank=True)
+    locked_at = models.DateTimeField(default=now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
 class Template(models.Model):
     name = models.CharField(max_length=100)
     exercises = models.ManyToManyField(Exercise)
@@ -167,32 +371,64 @@ def save_as_template(exercise_ids, template_name, user):
     template.exercises.set(exercises)
     return template
 
-def create_from_template(template_id, user):
-    template = Template.objects.prefetch_related('exercises__sets__details').get(id=template_id)
-    new_exercises = []
-    for exercise in template.exercises.all():
-        new_exercise = Exercise.objects.create(
+def create_from_template(template_id, user, scheduled_dates=None):
+    """
+    將模板中的運動計劃複製到每個指定日期（預設為今天），各層以 bulk_create 寫入
+    """
+    from .archive import attach_archived_sets
+    from .rollups import schedule_rollup_refresh
+
+    template = Template.objects.prefetch_related('exercises__exercise_type', 'exercises__sets__details').get(id=template_id)
+    attach_archived_sets(template.exercises.all())
+    scheduled_dates = scheduled_dates or [localdate()]
+    sources = [exercise for _ in scheduled_dates for exercise in template.exercises.all()]
+    new_exercises = [
+        Exercise(
+            user=user,
             name=exercise.name,
-            total_duration=exercise.total_duration,
             goal=exercise.goal,
-            user=user  # 將新計劃的用戶設置為當前用戶
+            total_duration=exercise.total_duration,
+            scheduled_date=scheduled_date,
+            scheduled_time=exercise.scheduled_time,
         )
-        for exercise_set in exercise.sets.all():
-            new_exercise_set = ExerciseSet.objects.create(
-                exercise=new_exercise,
-                exercise_name=exercise_set.exercise_name,
-                body_part=exercise_set.body_part
+        for scheduled_date in scheduled_dates
+        for exercise in template.exercises.all()
+    ]
+
+    with transaction.atomic():
+        Exercise.objects.bulk_create(new_exercises, batch_size=500)
+
+        through = Exercise.exercise_type.through
+        through.objects.bulk_create([
+            through(exercise_id=new_exercise.id, exercisetype_id=exercise_type.id)
+            for exercise, new_exercise in zip(sources, new_exercises)
+            for exercise_type in exercise.exercise_type.all()
+        ], batch_size=500)
+
+        set_sources, new_sets = [], []
+        for exercise, new_exercise in zip(sources, new_exercises):
+            for exercise_set in exercise.sets.all():
+                set_sources.append(exercise_set)
+                new_sets.append(ExerciseSet(
+                    exercise=new_exercise,
+                    exercise_name=exercise_set.exercise_name,
+                    catalog_id=exercise_set.catalog_id,
+                    body_part=exercise_set.body_part,
+                    joint_type=exercise_set.joint_type,
+                    sets=exercise_set.sets,
+                ))
+        ExerciseSet.objects.bulk_create(new_sets, batch_size=500)
+
+        SetDetail.objects.bulk_create([
+            SetDetail(
+                exercise_set=new_exercise_set,
+                reps=detail.reps,
+                weight=detail.weight,
+                actual_duration=detail.actual_duration,
+                rest_time=detail.rest_time
             )
-            SetDetail.objects.bulk_create([
-                SetDetail(
-                    exercise_set=new_exercise_set,
-                    reps=detail.reps,
-                    weight=detail.weight,
-                    actual_duration=detail.actual_duration,
-                    rest_time=detail.rest_time
-                )
-                for detail in exercise_set.details.all()
-            ])
-        new_exercises.append(new_exercise)
+            for exercise_set, new_exercise_set in zip(set_sources, new_sets)
+            for detail in exercise_set.details.all()
+        ], batch_size=500)
+        schedule_rollup_refresh([(user.pk, scheduled_date) for scheduled_date in scheduled_dates])
     return new_exercises
-
@@ -0,0 +1,169 @@
+"""
+漸進式超負荷 (progressive overload)：依最近幾週的紀錄產生下週的運動計劃
+
+1. 以一次查詢讀取所有指定使用者在 week_start 之前 weeks 週的 SetDetail（連同 set / exercise 欄位）
+2. 上一週（week_start 前 7 天）的每個計劃作為下週計劃的結構，預設排在一週後的同一天
+3. 每個動作（以 catalog 對應，沒有 catalog 時以名稱對應）取最近一次的 details，依計劃目標的規則
+   計算下一次的 reps / weight / 時間
+4. 所有使用者的 Exercise / ExerciseSet / SetDetail 各以一次 bulk_create 寫入
+
+同一使用者在目標日期已有同名計劃時略過，重複執行不會產生重複的計劃。
+"""
+from collections import namedtuple
+from datetime import time, timedelta
+
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from .models import Exercise, ExerciseSet, SetDetail, normalize_exercise_name
+from .rollups import schedule_rollup_refresh
+
+# reps 達到 max_reps 後加重 weight_step（比例）並回到 min_reps；rest_step 秒數、duration_step 比例每次調整
+OverloadRule = namedtuple('OverloadRule', ['min_reps', 'max_reps', 'weight_step', 'rest_step', 'duration_step'])
+
+RULES = {
+    1: OverloadRule(6, 12, 0.025, 0, 0.0),     # Muscle Gain：中低次數，加重為主
+    2: OverloadRule(12, 20, 0.025, -5, 0.0),   # Fat Loss：較高次數並縮短休息
+    3: OverloadRule(15, 25, 0.0, -5, 0.1),     # Endurance：增加次數與持續時間
+    4: OverloadRule(8, 15, 0.0, 0, 0.1),       # Flexibility：延長伸展時間
+    5: OverloadRule(8, 15, 0.025, 0, 0.0),     # General Fitness
+}
+MIN_REST_TIME = 30
+WEIGHT_INCREMENT = 0.5  # 最小加重單位（公斤）
+
+HISTORY_FIELDS = (
+    'exercise_set__exercise__user_id', 'exercise_set__exercise_id', 'exercise_set__exercise__name',
+    'exercise_set__exercise__goal', 'exercise_set__exercise__scheduled_date', 'exercise_set__exercise__scheduled_time',
+    'exercise_set_id', 'exercise_set__exercise_name', 'exercise_set__catalog_id', 'exercise_set__body_part',
+    'exercise_set__joint_type', 'reps', 'weight', 'actual_duration', 'rest_time',
+)
+
+
+def next_week_start(today=None):
+    today = today or localdate()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def next_target(rule, reps, weight, actual_duration, rest_time):
+    """
+    依規則計算單一 detail 的下一次目標
+    """
+    if reps >= rule.max_reps and weight > 0 and rule.weight_step:
+        increased = round(weight * (1 + rule.weight_step) / WEIGHT_INCREMENT) * WEIGHT_INCREMENT
+        weight = max(increased, weight + WEIGHT_INCREMENT)
+        reps = rule.min_reps
+    elif reps < rule.max_reps:
+        reps += 1
+    actual_duration = round(actual_duration * (1 + rule.duration_step))
+    rest_time = max(rest_time + rule.rest_step, min(rest_time, MIN_REST_TIME))
+    return reps, weight, actual_duration, rest_time
+
+
+def load_history(user_ids, week_start, weeks):
+    """
+    返回 (上一週的計劃, 每個動作最近一次的 details)：
+    plans: {exercise_id: {'user_id', 'name', 'goal', 'scheduled_date', 'scheduled_time', 'sets': {set_id: (欄位, details)}}}
+    latest: {(user_id, 動作): [(reps, weight, actual_duration, rest_time), ...]}
+    """
+    rows = SetDetail.objects.filter(
+        exercise_set__exercise__user_id__in=user_ids,
+        exercise_set__exercise__scheduled_date__gte=week_start - timedelta(weeks=weeks),
+        exercise_set__exercise__scheduled_date__lt=week_start,
+    ).order_by(
+        'exercise_set__exercise__scheduled_date', 'exercise_set__exercise__scheduled_time',
+        'exercise_set__exercise_id', 'exercise_set_id', 'id',
+    ).values_list(*HISTORY_FIELDS)
+
+    last_week = week_start - timedelta(days=7)
+    plans, latest = {}, {}
+    for (user_id, exercise_id, name, goal, scheduled_date, scheduled_time, set_id, exercise_name,
+         catalog_id, body_part, joint_type, reps, weight, actual_duration, rest_time) in rows.iterator(chunk_size=5000):
+        movement = catalog_id or normalize_exercise_name(exercise_name)
+        detail = (reps, weight, actual_duration, rest_time)
+        if scheduled_date >= last_week:
+            plan = plans.setdefault(exercise_id, {
+                'user_id': user_id, 'name': name, 'goal': goal,
+                'scheduled_date': scheduled_date, 'scheduled_time': scheduled_time, 'sets': {},
+            })
+            plan['sets'].setdefault(set_id, ((exercise_name, catalog_id, body_part, joint_type, movement), []))[1].append(detail)
+        # 依日期排序，較新的 set 會覆寫較舊的紀錄
+        details = latest.get((user_id, movement))
+        if details is None or details[0] != set_id:
+            details = latest[(user_id, movement)] = (set_id, [])
+        details[1].append(detail)
+    return plans, {key: details for key, (_, details) in latest.items()}
+
+
+def generate_next_week(user_ids, week_start=None, weeks=4, dates=None):
+    """
+    為多個使用者產生下週計劃，返回新建立的 Exercise。
+    dates 未指定時每個計劃排在一週後的同一天；指定時依原本的順序輪流排入 dates
+    """
+    week_start = week_start or next_week_start()
+    plans, latest = load_history(user_ids, week_start, weeks)
+    if not plans:
+        return []
+
+    sources = sorted(plans.items(), key=lambda item: (item[1]['scheduled_date'], item[1]['scheduled_time'] or time.min, item[0]))
+    dates = sorted(dates or [])
+    positions = {}
+    targets = []
+    for exercise_id, plan in sources:
+        if dates:
+            position = positions[plan['user_id']] = positions.get(plan['user_id'], -1) + 1
+            targets.append((exercise_id, plan, dates[position % len(dates)]))
+        else:
+            targets.append((exercise_id, plan, plan['scheduled_date'] + timedelta(days=7)))
+
+    target_dates = {scheduled_date for _, _, scheduled_date in targets}
+    existing = set(Exercise.objects.primary().filter(
+        user_id__in=user_ids, scheduled_date__in=target_dates
+    ).values_list('user_id', 'name', 'scheduled_date'))
+    type_rows = Exercise.exercise_type.through.objects.filter(
+        exercise_id__in=[exercise_id for exercise_id, _, _ in targets]
+    ).values_list('exercise_id', 'exercisetype_id')
+    types_by_exercise = {}
+    for exercise_id, type_id in type_rows:
+        types_by_exercise.setdefault(exercise_id, []).append(type_id)
+
+    new_exercises, new_types, new_sets, new_details = [], [], [], []
+    for exercise_id, plan, scheduled_date in targets:
+        key = (plan['user_id'], plan['name'], scheduled_date)
+        if key in existing:
+            continue
+        # dates 輪流排入時，同名的來源計劃可能排到同一天，只建立第一個
+        existing.add(key)
+        rule = RULES.get(plan['goal'], RULES[5])
+        exercise = Exercise(
+            user_id=plan['user_id'], name=plan['name'], goal=plan['goal'],
+            scheduled_date=scheduled_date, scheduled_time=plan['scheduled_time'],
+        )
+        total_seconds = 0
+        for (exercise_name, catalog_id, body_part, joint_type, movement), details in plan['sets'].values():
+            base = latest.get((plan['user_id'], movement), details)
+            exercise_set = ExerciseSet(
+                exercise=exercise, exercise_name=exercise_name, catalog_id=catalog_id,
+                body_part=body_part, joint_type=joint_type, sets=len(base),
+            )
+            new_sets.append(exercise_set)
+            for detail in base:
+                reps, weight, actual_duration, rest_time = next_target(rule, *detail)
+                total_seconds += actual_duration + rest_time
+                new_details.append(SetDetail(
+                    exercise_set=exercise_set, reps=reps, weight=weight,
+                    actual_duration=actual_duration, rest_time=rest_time,
+                ))
+        exercise.total_duration = total_seconds // 60
+        new_exercises.append(exercise)
+        new_types.extend((exercise, type_id) for type_id in types_by_exercise.get(exercise_id, []))
+
+    through = Exercise.exercise_type.through
+    with transaction.atomic():
+        Exercise.objects.bulk_create(new_exercises, batch_size=500)
+        through.objects.bulk_create(
+            [through(exercise_id=exercise.id, exercisetype_id=type_id) for exercise, type_id in new_types], batch_size=500
+        )
+        ExerciseSet.objects.bulk_create(new_sets, batch_size=500)
+        SetDetail.objects.bulk_create(new_details, batch_size=500)
+        schedule_rollup_refresh((exercise.user_id, exercise.scheduled_date) for exercise in new_exercises)
+    return new_exercises
@@ -0,0 +1,32 @@
+"""
+views 與 query_plans (check_query_plans) 共用的 queryset，執行計畫檢查的就是端點實際送出的查詢
+"""
+from datetime import timedelta
+from django.utils.timezone import now
+from .models import BodyComposition, Exercise
+
+MONTHLY_DAYS = 30
+WEEKLY_DAYS = 7
+
+
+def recent_plans(user, days):
+    """
+    最近 days 天內建立的運動計劃
+    """
+    return Exercise.objects.filter(user=user, created_at__gte=now() - timedelta(days=days))
+
+
+def monthly_plans_queryset(user):
+    return recent_plans(user, MONTHLY_DAYS)
+
+
+def weekly_plans_queryset(user):
+    return recent_plans(user, WEEKLY_DAYS)
+
+
+def user_plans(user):
+    return Exercise.objects.filter(user=user)
+
+
+def latest_body_composition_queryset(user):
+    return BodyComposition.objects.filter(user=user).order_by('-measured_at')
@@ -0,0 +1,265 @@
+"""
+熱門查詢的執行計畫檢查，由 manage.py check_query_plans 與 exercise/tests.py (check_all) 使用
+
+HOT_QUERIES 呼叫 views / 驗證 / 日誌 viewset 共用的 queryset 函式（exercise/queries.py 等），以 explain() 取得執行計畫，
+確認每個資料表都經由預期的索引讀取（expect：{資料表: 索引的第一個欄位}），且受保護的資料表沒有全表掃描。
+ENDPOINT_BUDGETS 以測試 client 呼叫端點並限制查詢次數。
+PostgreSQL 上會先 SET LOCAL enable_seqscan = off：種子資料量小時規劃器偏好循序掃描，
+這裡檢查的是索引「能否」被使用。
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+from rest_framework.authtoken.models import Token
+
+from accounts.authentication import SignedTokenAuthentication, auth_enabled, token_queryset
+from accounts.models import RefreshToken
+from accounts.tokens import issue_access_token, refresh_token_queryset
+from jobs.models import Job
+from jobs.worker import claimable_jobs
+from workout_journal.models import WorkoutJournalEntry
+from workout_journal.queries import expired_entries, journal_detail_queryset, journal_list_queryset
+from .idempotency import find_record
+from .models import BodyComposition, Exercise, ExerciseSet, IdempotencyRecord, SetDetail, WeeklyRollup
+from .queries import latest_body_composition_queryset, monthly_plans_queryset, user_plans
+from .rollups import leaderboard_queryset
+from .schedule import scheduled_plans
+from .sync import changed_querysets
+
+HotQuery = namedtuple('HotQuery', 'name build expect allow_scan', defaults=((),))
+EndpointBudget = namedtuple('EndpointBudget', 'name path max_queries')
+
+# 不允許全表掃描的資料表
+GUARDED_MODELS = (Exercise, ExerciseSet, SetDetail, BodyComposition, Token, RefreshToken, WeeklyRollup, Job, IdempotencyRecord)
+
+HOT_QUERIES = [
+    # exercise/views.py；plan_sets_prefetch / plan_details_prefetch 是 prefetch_related('sets__details') 送出的查詢
+    HotQuery('monthly_plans', lambda ctx: monthly_plans_queryset(ctx['user']), {'exercise_exercise': 'user_id'}),
+    HotQuery('plan_sets_prefetch', lambda ctx: ExerciseSet.objects.filter(exercise_id__in=ctx['exercise_ids']),
+             {'exercise_exerciseset': 'exercise_id'}),
+    HotQuery('plan_details_prefetch', lambda ctx: SetDetail.objects.filter(exercise_set_id__in=ctx['set_ids']),
+             {'exercise_setdetail': 'exercise_set_id'}),
+    HotQuery('calendar', lambda ctx: scheduled_plans(ctx['user'], ctx['today'] - timedelta(days=30), ctx['today']),
+             {'exercise_exercise': 'user_id'}),
+    HotQuery('exercise_detail', lambda ctx: user_plans(ctx['user']).filter(pk=ctx['exercise_ids'][0]),
+             {'exercise_exercise': 'id'}),
+    HotQuery('sync_exercises', lambda ctx: changed_querysets(ctx['user'], ctx['since'])['exercises'],
+             {'exercise_exercise': 'user_id'}),
+    HotQuery('sync_details', lambda ctx: changed_querysets(ctx['user'], ctx['since'])['details'],
+             {'exercise_exercise': 'user_id', 'exercise_exerciseset': 'exercise_id', 'exercise_setdetail': 'exercise_set_id'}),
+    HotQuery('body_composition_latest', lambda ctx: latest_body_composition_queryset(ctx['user'])[:1],
+             {'exercise_bodycomposition': 'user_id'}),
+    HotQuery('leaderboard', lambda ctx: leaderboard_queryset(ctx['week_start'])[:20], {'exercise_weeklyrollup': 'week_start'}),
+    HotQuery('idempotency_lookup', lambda ctx: find_record(ctx['user'].pk, 'seed-0'), {'exercise_idempotencyrecord': 'user_id'}),
+    # accounts/authentication.py 與 accounts/tokens.py
+    HotQuery('token_auth', lambda ctx: token_queryset(ctx['token_key']), {'authtoken_token': 'key', 'auth_user': 'id'}),
+    HotQuery('refresh_token', lambda ctx: refresh_token_queryset(ctx['refresh_key']),
+             {'accounts_refreshtoken': 'key_hash', 'auth_user': 'id'}),
+    # 背景工作
+    HotQuery('job_claim', lambda ctx: claimable_jobs(), {'jobs_job': 'status'}),
+    # workout_journal viewset：列表沒有篩選條件，本來就會讀取整個資料表
+    HotQuery('journal_list', lambda ctx: journal_list_queryset(), {}, ('workout_journal_workoutjournalentry',)),
+    HotQuery('journal_detail', lambda ctx: journal_detail_queryset().filter(pk=ctx['journal_id']),
+             {'workout_journal_workoutjournalentry': 'id'}),
+    HotQuery('journal_retention', lambda ctx: expired_entries(now() - timedelta(days=365)),
+             {'workout_journal_workoutjournalentry': 'created_at'}),
+]
+
+ENDPOINT_BUDGETS = [
+    # 以目前啟用的驗證方式發出請求：token 驗證 1 次查詢；Bearer 只在帳號狀態快取過期時查詢 1 次
+    EndpointBudget('monthly_plans', '/fitness_api/exercise/monthly_plans/', 6),
+    EndpointBudget('monthly_plans_columnar', '/fitness_api/exercise/monthly_plans/?format=columnar', 6),
+    EndpointBudget('weekly_plans', '/fitness_api/exercise/weekly_plans/', 6),
+    EndpointBudget('calendar', '/fitness_api/exercise/calendar/', 2),
+    EndpointBudget('sync', '/fitness_api/exercise/sync/', 7),
+    EndpointBudget('body_composition', '/fitness_api/exercise/body_composition/', 2),
+    EndpointBudget('leaderboard', '/fitness_api/exercise/leaderboard/', 4),
+    EndpointBudget('journal_list', '/fitness_api/workout_journal/workout-journals/', 2),
+]
+
+SQLITE_ACCESS_RE = re.compile(r'SEARCH (\w+) USING (?:(?:COVERING )?INDEX (\w+)|INTEGER PRIMARY KEY) \(([^)]*)\)')
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)(?! USING)')
+POSTGRES_ACCESS_RE = re.compile(r'(?:Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)? (?:using|on) (\w+)')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(costs=False)
+    return queryset.explain()
+
+
+def normalize_plan(plan):
+    """
+    移除每次執行都不同的部分（SQLite 的節點編號、PostgreSQL 條件中的常數），讓基準檔可以比對
+    """
+    lines = []
+    for line in plan.splitlines():
+        if connection.vendor == 'sqlite':
+            line = re.sub(r'^\d+ \d+ \d+ ', '', line)
+        else:
+            line = re.sub(r"'[^']*'(::[\w ]+(\[\])?)?", "'?'", line)
+            line = re.sub(r'\b\d+(\.\d+)?\b', 'N', line)
+        lines.append(line.rstrip())
+    return '\n'.join(lines) + '\n'
+
+
+def index_columns():
+    """
+    {索引名稱: (資料表, [欄位])}，PostgreSQL 的計畫只列出索引名稱
+    """
+    tables = connection.introspection.table_names()
+    result = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            for name, constraint in connection.introspection.get_constraints(cursor, table).items():
+                if constraint['index'] or constraint['primary_key'] or constraint['unique']:
+                    result[name] = (table, constraint['columns'])
+    return result
+
+
+def index_accesses(plan, indexes):
+    """
+    返回 {資料表: [使用索引時的第一個欄位, ...]} 與全表掃描的資料表
+    """
+    accesses, scans = {}, set()
+    if connection.vendor == 'sqlite':
+        for table, _, condition in SQLITE_ACCESS_RE.findall(plan):
+            column = condition.split('=')[0].split('>')[0].split('<')[0].strip()
+            accesses.setdefault(table, []).append('id' if column == 'rowid' else column)
+        scans.update(SQLITE_SCAN_RE.findall(plan))
+    else:
+        for name in POSTGRES_ACCESS_RE.findall(plan):
+            if name in indexes:
+                table, columns = indexes[name]
+                accesses.setdefault(table, []).append(columns[0])
+        scans.update(POSTGRES_SCAN_RE.findall(plan))
+    return accesses, scans
+
+
+def check_plan(hot_query, plan, indexes):
+    """
+    返回違反預期的說明列表
+    """
+    accesses, scans = index_accesses(plan, indexes)
+    guarded = {model._meta.db_table for model in GUARDED_MODELS}
+    problems = []
+    for table, column in hot_query.expect.items():
+        if column not in accesses.get(table, []):
+            problems.append(f'{table} 沒有使用以 {column} 開頭的索引')
+    for table in sorted(scans):
+        if table in hot_query.allow_scan:
+            continue
+        if table in guarded or table in hot_query.expect:
+            problems.append(f'{table} 全表掃描')
+    return problems
+
+
+def seed(users=20, plans_per_user=30, sets_per_plan=3, details_per_set=4, journal_entries=200):
+    """
+    建立檢查用的資料並返回 HOT_QUERIES 需要的參數；呼叫端負責在交易結束時 rollback
+    """
+    from django.contrib.auth.models import User
+    from exercise.rollups import refresh_weekly_rollups
+
+    today = localdate()
+    user_objects = User.objects.bulk_create([User(username=f'query-plan-{i}') for i in range(users)])
+    exercises = Exercise.objects.bulk_create([
+        Exercise(user=user, name=f'Plan {i}', goal=i % 5 + 1, total_duration=45,
+                 scheduled_date=today - timedelta(days=i % 60))
+        for user in user_objects for i in range(plans_per_user)
+    ], batch_size=500)
+    sets = ExerciseSet.objects.bulk_create([
+        ExerciseSet(exercise=exercise, exercise_name=f'Lift {i}', body_part=i % 5 + 1, joint_type=1, sets=details_per_set)
+        for exercise in exercises for i in range(sets_per_plan)
+    ], batch_size=500)
+    SetDetail.objects.bulk_create([
+        SetDetail(exercise_set=exercise_set, reps=8 + i, weight=40 + i, actual_duration=40, rest_time=60)
+        for exercise_set in sets for i in range(details_per_set)
+    ], batch_size=500)
+    BodyComposition.objects.bulk_create([
+        BodyComposition(user=user, height=170, weight=70 + i, measured_at=now() - timedelta(days=i))
+        for user in user_objects for i in range(10)
+    ], batch_size=500)
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in user_objects])
+    refresh_key = RefreshToken.issue(user_objects[0])
+    IdempotencyRecord.objects.bulk_create([
+        IdempotencyRecord(user=user, key=f'seed-{i}', fingerprint='0' * 64, status_code=201, expires_at=now() + timedelta(hours=1))
+        for user in user_objects for i in range(5)
+    ], batch_size=500)
+    Job.objects.bulk_create([Job(name='exercise.recompute_calories', user=user) for user in user_objects], batch_size=500)
+    entries = WorkoutJournalEntry.objects.bulk_create([
+        WorkoutJournalEntry(title=f'Entry {i}', content=f'<p>Entry {i}</p>', body_text=f'Entry {i}', word_count=2)
+        for i in range(journal_entries)
+    ], batch_size=500)
+    refresh_weekly_rollups([user.pk for user in user_objects], today - timedelta(days=60), today + timedelta(days=1))
+
+    user = user_objects[0]
+    user_exercise_ids = [exercise.id for exercise in exercises if exercise.user_id == user.pk]
+    return {
+        'user': user,
+        'today': today,
+        'since': now() - timedelta(days=1),
+        'week_start': today - timedelta(days=today.weekday()),
+        'exercise_ids': user_exercise_ids,
+        'set_ids': [exercise_set.id for exercise_set in sets if exercise_set.exercise_id in set(user_exercise_ids)],
+        'token_key': tokens[0].key,
+        'refresh_key': refresh_key,
+        'journal_id': entries[0].id,
+    }
+
+
+def check_plans(context):
+    """
+    返回 (正規化後的執行計畫 {名稱: plan}, {名稱: [問題]})
+    """
+    indexes = index_columns()
+    plans, problems = {}, {}
+    for hot_query in HOT_QUERIES:
+        plan = explain(hot_query.build(context))
+        plans[hot_query.name] = normalize_plan(plan)
+        problems[hot_query.name] = check_plan(hot_query, plan, indexes)
+    return plans, problems
+
+
+def check_budgets(context, host='localhost'):
+    """
+    以目前啟用的驗證方式呼叫 ENDPOINT_BUDGETS，返回 {名稱: (查詢次數, [問題])}；host 必須在 ALLOWED_HOSTS 中
+    """
+    if auth_enabled(SignedTokenAuthentication):
+        credentials = f'Bearer {issue_access_token(context["user"])}'
+    else:
+        credentials = f'Token {context["token_key"]}'
+    client = Client(HTTP_HOST=host)
+    results = {}
+    for budget in ENDPOINT_BUDGETS:
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(budget.path, HTTP_AUTHORIZATION=credentials)
+        count = len(queries.captured_queries)
+        if response.status_code != 200:
+            results[budget.name] = (count, [f'HTTP {response.status_code}'])
+        elif count > budget.max_queries:
+            results[budget.name] = (count, [f'{count} 次查詢，上限 {budget.max_queries}'])
+        else:
+            results[budget.name] = (count, [])
+    return results
+
+
+def check_all(users=20, plans_per_user=30, host='localhost'):
+    """
+    建立種子資料、檢查執行計畫與查詢次數後 rollback，返回 (plans, plan_problems, budget_results)
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        context = seed(users=users, plans_per_user=plans_per_user)
+        plans, plan_problems = check_plans(context)
+        budget_results = check_budgets(context, host)
+        transaction.set_rollback(True)
+    return plans, plan_problems, budget_results
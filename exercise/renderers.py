@@ -0,0 +1,27 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .columnar import pack_columns
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    欄位式 JSON：Accept: application/vnd.fitness.columnar+json
+    """
+    media_type = 'application/vnd.fitness.columnar+json'
+    format = 'columnar'
+    columnar = True
+
+
+class ColumnarBinaryRenderer(BaseRenderer):
+    """
+    欄位式二進位格式：Accept: application/vnd.fitness.columnar
+    """
+    media_type = 'application/vnd.fitness.columnar'
+    format = 'columnar-bin'
+    charset = None
+    render_style = 'binary'
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return pack_columns(data)
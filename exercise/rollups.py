@@ -0,0 +1,182 @@
+"""
+每週訓練彙總 (WeeklyRollup) 與排行榜
+
+計劃寫入後以 schedule_rollup_refresh 在交易提交時重新計算受影響的 (使用者, 週)：
+只聚合該使用者那幾週的計劃，查詢範圍固定很小。serializer、模板與計劃產生器在寫入時直接呼叫；
+其他地方（例如 admin）的刪除與 SetDetail 修改由 refresh_on_delete / refresh_on_detail_save 訊號處理。
+訓練量與 SetDetail.calculate_volume 的規則相同（3 ~ 15 下才計算），已封存的計劃使用 ExerciseArchive.total_volume。
+排行榜只讀取 WeeklyRollup 的索引並快取 LEADERBOARD_CACHE_SECONDS 秒，不會掃描 sets / details；
+其他使用者只顯示名次與數值，不公開帳號。
+"""
+from datetime import timedelta
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, QuerySet, Sum, When
+from django.db.models.functions import Coalesce, TruncWeek
+from django.utils.dateparse import parse_date
+
+from .models import Exercise, ExerciseSet, SetDetail, WeeklyRollup
+
+LEADERBOARD_METRICS = ('total_volume', 'total_minutes', 'total_calories')
+ROLLUP_FIELDS = ('total_volume', 'total_minutes', 'total_calories', 'exercise_count')
+# 同一次刪除 (origin) 中已查過的計劃與已排程的 (使用者, 日期)，origin 結束後自動釋放
+_deletion_memos = WeakKeyDictionary()
+
+
+def week_start_of(day):
+    return day - timedelta(days=day.weekday())
+
+
+def refresh_weekly_rollups(user_ids, start, end):
+    """
+    重新計算 user_ids 在 [start, end) 之間（會擴大到整週）的所有 WeeklyRollup
+    """
+    start, end = week_start_of(start), week_start_of(end - timedelta(days=1)) + timedelta(days=7)
+    exercises = Exercise.objects.primary().filter(
+        user_id__in=user_ids, scheduled_date__gte=start, scheduled_date__lt=end
+    )
+    totals = {}
+
+    def add(user_id, week, goal, **values):
+        for key in (goal, WeeklyRollup.ALL_GOALS):
+            row = totals.setdefault((user_id, week, key), dict.fromkeys(ROLLUP_FIELDS, 0))
+            for field, value in values.items():
+                row[field] += value or 0
+
+    exercise_rows = exercises.annotate(week=TruncWeek('scheduled_date')).values('user_id', 'week', 'goal').annotate(
+        minutes=Sum('total_duration'),
+        calories=Sum(Coalesce('manual_calories_burned', 'calculated_calories_burned')),
+        count=Count('id'),
+        archived_volume=Sum('archive__total_volume'),
+    ).order_by()
+    for row in exercise_rows:
+        add(row['user_id'], row['week'], row['goal'], total_minutes=row['minutes'], total_calories=row['calories'],
+            exercise_count=row['count'], total_volume=row['archived_volume'])
+
+    volume_rows = SetDetail.objects.primary().filter(exercise_set__exercise__in=exercises).annotate(
+        week=TruncWeek('exercise_set__exercise__scheduled_date'),
+    ).values('exercise_set__exercise__user_id', 'week', 'exercise_set__exercise__goal').annotate(
+        volume=Sum(Case(
+            When(reps__gte=3, reps__lte=15, then=F('reps') * F('weight')), default=0.0, output_field=FloatField()
+        )),
+    ).order_by()
+    for row in volume_rows:
+        add(row['exercise_set__exercise__user_id'], row['week'], row['exercise_set__exercise__goal'], total_volume=row['volume'])
+
+    rollups = [
+        WeeklyRollup(user_id=user_id, week_start=week, goal=goal, **values)
+        for (user_id, week, goal), values in totals.items()
+    ]
+    with transaction.atomic():
+        stale = WeeklyRollup.objects.filter(user_id__in=user_ids, week_start__gte=start, week_start__lt=end)
+        if totals:
+            WeeklyRollup.objects.bulk_create(
+                rollups, batch_size=500, update_conflicts=True,
+                unique_fields=['user', 'week_start', 'goal'], update_fields=[*ROLLUP_FIELDS, 'updated_at'],
+            )
+            keys = {(rollup.user_id, rollup.week_start, rollup.goal) for rollup in rollups}
+            stale_ids = [
+                pk for pk, user_id, week, goal in stale.values_list('pk', 'user_id', 'week_start', 'goal')
+                if (user_id, week, goal) not in keys
+            ]
+            WeeklyRollup.objects.filter(pk__in=stale_ids).delete()
+        else:
+            stale.delete()
+    return len(rollups)
+
+
+def schedule_rollup_refresh(user_dates):
+    """
+    在交易提交後重新計算受影響的週；user_dates 為 (user_id, scheduled_date) 的集合。
+    scheduled_date 可能仍是呼叫端設定的 ISO 字串（Django 在保存時才轉換），這裡先轉成 date
+    """
+    ranges = {}
+    for user_id, day in user_dates:
+        if isinstance(day, str):
+            day = parse_date(day)
+        if day is None:
+            continue
+        first, last = ranges.get(user_id, (day, day))
+        ranges[user_id] = (min(first, day), max(last, day))
+    if not ranges:
+        return
+
+    def refresh():
+        for user_id, (first, last) in ranges.items():
+            refresh_weekly_rollups([user_id], first, last + timedelta(days=1))
+
+    transaction.on_commit(refresh)
+
+
+def _plan_of(sender, instance, plans):
+    """
+    被刪除或修改的資料所屬計劃的 (user_id, scheduled_date)，同一個 set 只查詢一次
+    """
+    if sender is Exercise:
+        return instance.user_id, instance.scheduled_date
+    if sender is ExerciseSet:
+        key, lookup = ('exercise', instance.exercise_id), Exercise.objects.filter(pk=instance.exercise_id)
+    else:
+        key, lookup = ('set', instance.exercise_set_id), Exercise.objects.filter(sets=instance.exercise_set_id)
+    if key not in plans:
+        plans[key] = lookup.primary().values_list('user_id', 'scheduled_date').first()
+    return plans[key]
+
+
+def refresh_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    post_delete：只處理刪除的起點，串聯刪除的子資料由起點所屬的計劃一起重新計算
+    """
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not sender:
+        return
+    memo = _deletion_memos.setdefault(origin, {}) if origin is not None else {}
+    plan = _plan_of(sender, instance, memo.setdefault('plans', {}))
+    scheduled = memo.setdefault('scheduled', set())
+    if plan is not None and plan not in scheduled:
+        scheduled.add(plan)
+        schedule_rollup_refresh([plan])
+
+
+def refresh_on_detail_save(sender, instance, **kwargs):
+    """
+    post_save：單筆保存的 SetDetail（例如 admin 的 inline）；批次寫入的呼叫端自行排程
+    """
+    plan = _plan_of(sender, instance, {})
+    if plan is not None:
+        schedule_rollup_refresh([plan])
+
+
+def leaderboard_queryset(week_start, metric='total_volume', goal=WeeklyRollup.ALL_GOALS):
+    return WeeklyRollup.objects.filter(week_start=week_start, goal=goal).order_by(f'-{metric}', 'user_id')
+
+
+def leaderboard(week_start, metric='total_volume', goal=WeeklyRollup.ALL_GOALS, limit=20, viewer_id=None):
+    """
+    返回指定週的前 limit 名（名次、數值，以及是否為 viewer_id 本人），結果快取 LEADERBOARD_CACHE_SECONDS 秒
+    """
+    cache_key = f'leaderboard:{week_start.isoformat()}:{goal}:{metric}:{limit}'
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = list(leaderboard_queryset(week_start, metric, goal).values_list('user_id', metric)[:limit])
+        cache.set(cache_key, rows, settings.LEADERBOARD_CACHE_SECONDS)
+    return [
+        {'rank': position, 'value': value, 'is_me': user_id == viewer_id}
+        for position, (user_id, value) in enumerate(rows, start=1)
+    ]
+
+
+def user_rank(user_id, week_start, metric='total_volume', goal=WeeklyRollup.ALL_GOALS):
+    """
+    使用者在該週的名次與數值（沒有紀錄時返回 None），以索引範圍計數取得
+    """
+    value = WeeklyRollup.objects.filter(
+        user_id=user_id, week_start=week_start, goal=goal
+    ).values_list(metric, flat=True).first()
+    if value is None:
+        return None
+    ahead = WeeklyRollup.objects.filter(week_start=week_start, goal=goal, **{f'{metric}__gt': value}).count()
+    return {'rank': ahead + 1, 'value': value}
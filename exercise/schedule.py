@@ -0,0 +1,99 @@
+"""
+行事曆：依 (scheduled_date, scheduled_time) 排序的運動計劃，以及 iCalendar 匯出
+"""
+from datetime import datetime, timedelta
+from django.db.models import F
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+from .models import Exercise
+
+MAX_RANGE_DAYS = 366
+CALENDAR_FIELDS = ('id', 'name', 'goal', 'total_duration', 'scheduled_date', 'scheduled_time')
+
+
+def parse_range(params, today=None):
+    """
+    解析 start / end（含），預設為本月；格式錯誤或區間過長時拋出 ValueError
+    """
+    today = today or localdate()
+    start = parse_date(params['start']) if params.get('start') else today.replace(day=1)
+    if start is None:
+        raise ValueError('日期格式錯誤')
+    if params.get('end'):
+        end = parse_date(params['end'])
+    else:
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        end = next_month - timedelta(days=1)
+    if end is None or end < start:
+        raise ValueError('日期格式錯誤')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'查詢區間不可超過 {MAX_RANGE_DAYS} 天')
+    return start, end
+
+
+def scheduled_plans(user, start, end):
+    return Exercise.objects.filter(
+        user=user, scheduled_date__gte=start, scheduled_date__lte=end
+    # 沒有時間的計劃排在當天最前面；Postgres 的 ASC 預設把 NULL 排在最後，這裡明確指定讓各資料庫一致
+    ).order_by('scheduled_date', F('scheduled_time').asc(nulls_first=True), 'id')
+
+
+def calendar_days(user, start, end):
+    """
+    以一次 values() 查詢返回依日期分組的輕量資料（不含 sets / details）
+    """
+    days = {}
+    for row in scheduled_plans(user, start, end).values(*CALENDAR_FIELDS):
+        day = row.pop('scheduled_date').isoformat()
+        days.setdefault(day, []).append(row)
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'days': days}
+
+
+def _escape(text):
+    return (
+        text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """
+    RFC 5545：每行最多 75 octets，超過的部分以 CRLF + 空白接續
+    """
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def iter_ical(queryset, chunk_size=2000):
+    """
+    逐筆產生 iCalendar 內容，搭配 StreamingHttpResponse 使用，不需要一次載入整個區間
+    """
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//fitness_project//exercise calendar//ZH')
+    rows = queryset.values_list('id', 'name', 'goal', 'total_duration', 'scheduled_date', 'scheduled_time', 'updated_at')
+    for exercise_id, name, goal, total_duration, scheduled_date, scheduled_time, updated_at in rows.iterator(chunk_size=chunk_size):
+        yield _fold('BEGIN:VEVENT')
+        yield _fold(f'UID:exercise-{exercise_id}@fitness_project')
+        yield _fold(f'DTSTAMP:{updated_at:%Y%m%dT%H%M%SZ}')
+        if scheduled_time is None:
+            # 沒有指定時間的計劃視為整天的活動
+            yield _fold(f'DTSTART;VALUE=DATE:{scheduled_date:%Y%m%d}')
+        else:
+            # scheduled_time 沒有時區，以 floating time 表示
+            yield _fold(f'DTSTART:{datetime.combine(scheduled_date, scheduled_time):%Y%m%dT%H%M%S}')
+            yield _fold(f'DURATION:PT{total_duration or 0}M')
+        yield _fold(f'SUMMARY:{_escape(name)}')
+        yield _fold(f'CATEGORIES:{_escape(str(Exercise.GOAL_CHOICES.get(goal, "")))}')
+        yield _fold('END:VEVENT')
+    yield _fold('END:VCALENDAR')
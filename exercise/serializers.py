@@ -1,6 +1,52 @@
+from django.db import transaction
+from django.utils.timezone import now
 from rest_framework import serializers
-from .models import BodyComposition, Exercise, ExerciseSet, SetDetail, ExerciseType, Template
+from .models import compute_bmi, BodyComposition, Exercise, ExerciseSet, SetDetail, ExerciseType, Template, ExerciseCatalog
 from django.utils.translation import gettext_lazy as _
+from .archive import attach_archived_sets, restore_exercise
+from .rollups import schedule_rollup_refresh
+
+SET_REQUIRED_FIELDS = ['exercise_name', 'body_part', 'joint_type']
+DETAIL_REQUIRED_FIELDS = ['reps', 'weight', 'actual_duration', 'rest_time']
+
+
+def match_rows(existing, incoming):
+    """
+    將傳入資料對應到既有資料：先依 id，沒有 id 的再依順序對應剩下的既有資料，
+    對應不到的返回 (None, data)。傳入的 id 會從 data 中移除
+    """
+    by_id = {row.id: row for row in existing}
+    claimed = {data['id'] for data in incoming if data.get('id') in by_id}
+    unclaimed = iter([row for row in existing if row.id not in claimed])
+    for data in incoming:
+        row_id = data.pop('id', None)
+        if row_id in claimed:
+            yield by_id[row_id], data
+        elif row_id is None:
+            yield next(unclaimed, None), data
+        else:
+            # 不屬於此計劃的 id 視為新資料
+            yield None, data
+
+
+def apply_changes(instance, data):
+    """
+    將 data 寫入 instance，返回實際有變動的欄位名稱
+    """
+    changed = []
+    for field_name, value in data.items():
+        value = instance._meta.get_field(field_name).to_python(value)
+        if getattr(instance, field_name) != value:
+            setattr(instance, field_name, value)
+            changed.append(field_name)
+    return changed
+
+
+def require_fields(data, field_names):
+    missing = [field_name for field_name in field_names if field_name not in data]
+    if missing:
+        raise serializers.ValidationError({field_name: _('This field is required.') for field_name in missing})
+
 
 class BodyCompositionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,37 +61,82 @@ class BodyCompositionSerializer(serializers.ModelSerializer):
         read_only_fields = ['bmi']
 
     def create(self, validated_data):
-        if validated_data.get('height') > 0:
-            validated_data['bmi'] = validated_data['weight'] / ((validated_data['height'] / 100) ** 2)
-        else:
-            validated_data['bmi'] = 0.0
-        return super().create(validated_data)
+        validated_data['bmi'] = compute_bmi(validated_data.get('height'), validated_data.get('weight'))
+        if 'measured_at' not in validated_data:
+            return super().create(validated_data)
+        # 與批次上傳相同：同一 (user, measured_at) 已存在時覆寫，不違反唯一限制
+        body_composition, _ = BodyComposition.objects.update_or_create(
+            user=validated_data.pop('user'), measured_at=validated_data.pop('measured_at'), defaults=validated_data,
+        )
+        return body_composition
 
     def update(self, instance, validated_data):
-        if validated_data.get('height', instance.height) > 0:
-            validated_data['bmi'] = validated_data.get('weight', instance.weight) / ((validated_data.get('height', instance.height) / 100) ** 2)
-        else:
-            validated_data['bmi'] = 0.0
+        validated_data['bmi'] = compute_bmi(
+            validated_data.get('height', instance.height), validated_data.get('weight', instance.weight)
+        )
         return super().update(instance, validated_data)
 
+class BodyCompositionReadingSerializer(BodyCompositionSerializer):
+    """
+    批次上傳的單筆量測，必須帶有量測時間
+    """
+    class Meta(BodyCompositionSerializer.Meta):
+        extra_kwargs = {'measured_at': {'required': True}}
+
+class BodyCompositionBatchSerializer(serializers.Serializer):
+    MAX_READINGS = 5000
+
+    readings = BodyCompositionReadingSerializer(many=True, allow_empty=False, max_length=MAX_READINGS)
+    on_conflict = serializers.ChoiceField(choices=['update', 'ignore'], default='update')
+
+    def save(self, user):
+        """
+        一次計算 BMI 後以 bulk_create 寫入；同一 (user, measured_at) 依 on_conflict 覆寫或略過
+        """
+        readings = {}
+        for reading in self.validated_data['readings']:
+            # 同一批次內重複的量測時間以最後一筆為準
+            readings[reading['measured_at']] = reading
+        objs = [
+            BodyComposition(user=user, bmi=compute_bmi(reading.get('height'), reading.get('weight')), **reading)
+            for reading in readings.values()
+        ]
+
+        if self.validated_data['on_conflict'] == 'ignore':
+            BodyComposition.objects.bulk_create(objs, batch_size=500, ignore_conflicts=True)
+        else:
+            update_fields = [
+                field.name for field in BodyComposition._meta.concrete_fields
+                if field.name not in ('id', 'user', 'measured_at')
+            ]
+            BodyComposition.objects.bulk_create(
+                objs, batch_size=500, update_conflicts=True,
+                unique_fields=['user', 'measured_at'], update_fields=update_fields,
+            )
+        return len(objs)
+
 class ExerciseTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExerciseType
         fields = ['id', 'name', 'description']
 
 class SetDetailSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)  # 更新時用來對應既有資料
+
     class Meta:
         model = SetDetail
-        fields = ['reps', 'weight', 'actual_duration', 'rest_time']
+        fields = ['id', 'reps', 'weight', 'actual_duration', 'rest_time']
 
 class ExerciseSetSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)  # 更新時用來對應既有資料
     details = SetDetailSerializer(many=True)
     body_part = serializers.IntegerField()  # 接收數字值
     joint_type = serializers.IntegerField()  # 接收數字值
+    catalog = serializers.PrimaryKeyRelatedField(read_only=True)  # 由 exercise_name 自動對應
 
     class Meta:
         model = ExerciseSet
-        fields = ['exercise_name', 'body_part', 'joint_type', 'sets', 'details']
+        fields = ['id', 'exercise_name', 'catalog', 'body_part', 'joint_type', 'sets', 'details']
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -56,6 +147,7 @@ class ExerciseSetSerializer(serializers.ModelSerializer):
 
     # 這裡新增一個 create 方法
     def create(self, validated_data):
+        validated_data.pop('id', None)
         details_data = validated_data.pop('details')
         sets = validated_data.get('sets')
         
@@ -66,10 +158,18 @@ class ExerciseSetSerializer(serializers.ModelSerializer):
         exercise_set = ExerciseSet.objects.create(**validated_data)
         
         for detail_data in details_data:
+            detail_data.pop('id', None)
             SetDetail.objects.create(exercise_set=exercise_set, **detail_data)
         
         return exercise_set
 
+class ExerciseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # 已封存計劃的 sets / details 以一次查詢從 ExerciseArchive 載入
+        exercises = list(data.all() if hasattr(data, 'all') else data)
+        attach_archived_sets(exercises)
+        return super().to_representation(exercises)
+
 class ExerciseSerializer(serializers.ModelSerializer):
     sets = ExerciseSetSerializer(many=True)
     goal = serializers.IntegerField()  # 直接接收數字
@@ -83,55 +183,149 @@ class ExerciseSerializer(serializers.ModelSerializer):
             'calculated_calories_burned', 'scheduled_date', 'created_at', 
             'exercise_type', 'sets'
         ]
+        list_serializer_class = ExerciseListSerializer
     
     def to_representation(self, instance):
+        attach_archived_sets([instance])
         representation = super().to_representation(instance)
         # 將數字目標轉換為文字
         representation['goal'] = Exercise.GOAL_CHOICES.get(instance.goal, _('Unknown'))
         return representation
 
+    @transaction.atomic
     def create(self, validated_data):
         sets_data = validated_data.pop('sets')
         exercise_types_data = validated_data.pop('exercise_type')  # 這裡是 ID 列表
         exercise = Exercise.objects.create(**validated_data)
         exercise.exercise_type.set(exercise_types_data)
 
+        exercise_sets, details = [], []
         for set_data in sets_data:
+            set_data.pop('id', None)
             details_data = set_data.pop('details')
-            # 先創建 ExerciseSet
-            exercise_set = ExerciseSet.objects.create(exercise=exercise, **set_data)
-            # 創建 SetDetail
+            # sets 的值為 details 的數量
+            set_data['sets'] = len(details_data)
+            exercise_set = ExerciseSet(exercise=exercise, **set_data)
+            exercise_sets.append(exercise_set)
             for detail_data in details_data:
-                SetDetail.objects.create(exercise_set=exercise_set, **detail_data)
-            # 更新 sets 的值為 details 的數量
-            exercise_set.sets = len(details_data)
-            exercise_set.save()
+                detail_data.pop('id', None)
+                details.append(SetDetail(exercise_set=exercise_set, **detail_data))
+
+        # 整棵計劃以批次寫入，最後只更新一次 total_duration
+        ExerciseCatalog.assign(exercise_sets)
+        ExerciseSet.objects.bulk_create(exercise_sets)
+        SetDetail.objects.bulk_create(details)
+        exercise.update_total_duration()
+        schedule_rollup_refresh([(exercise.user_id, exercise.scheduled_date)])
 
         return exercise
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         sets_data = validated_data.pop('sets', None)
         exercise_types_data = validated_data.pop('exercise_type', None)
+        previous_date = instance.scheduled_date
+
+        if sets_data is not None and instance.is_archived:
+            # 修改已封存計劃的 sets 前先還原到熱資料表
+            restore_exercise(instance)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        if validated_data or exercise_types_data is not None:
+            # 只寫入有傳入的欄位；只修改 exercise_type 時也要更新 updated_at，增量同步才會送出
+            instance.save(update_fields=[*validated_data, 'updated_at'])
 
         if exercise_types_data is not None:
             instance.exercise_type.set(exercise_types_data)
 
         if sets_data is not None:
-            instance.sets.all().delete()
-            for set_data in sets_data:
-                details_data = set_data.pop('details')
-                # 更新 sets 為 details 的數量
-                set_data['sets'] = len(details_data)
-                exercise_set = ExerciseSet.objects.create(exercise=instance, **set_data)
-                for detail_data in details_data:
-                    SetDetail.objects.create(exercise_set=exercise_set, **detail_data)
+            self.diff_sets(instance, sets_data)
+            instance.update_total_duration()
 
+        # 日期變更時舊的那一週也要重新計算
+        schedule_rollup_refresh([(instance.user_id, previous_date), (instance.user_id, instance.scheduled_date)])
         return instance
 
+    def diff_sets(self, instance, sets_data):
+        """
+        比對傳入的 sets / details 與既有資料，只寫入有變動的部分：
+        有 id 的依 id 對應，沒有 id 的依順序對應尚未被認領的既有資料，
+        其餘以 bulk_create / bulk_update 寫入，多出來的既有資料才刪除
+        """
+        timestamp = now()
+        existing_sets = list(instance.sets.prefetch_related('details').order_by('id'))
+
+        sets_to_create, sets_to_update, set_fields = [], [], set()
+        details_to_create, details_to_update, detail_fields = [], [], set()
+        pending_details = []  # (新建的 ExerciseSet, details_data)
+        renamed_sets = []  # 需要重新對應 catalog 的既有 ExerciseSet
+        matched_set_ids, stale_detail_ids = set(), []
+
+        for exercise_set, set_data in match_rows(existing_sets, sets_data):
+            details_data = set_data.pop('details', None)
+            if details_data is not None:
+                set_data['sets'] = len(details_data)
+
+            if exercise_set is None:
+                require_fields(set_data, SET_REQUIRED_FIELDS)
+                exercise_set = ExerciseSet(exercise=instance, **set_data)
+                sets_to_create.append(exercise_set)
+                pending_details.append((exercise_set, details_data or []))
+                continue
+
+            matched_set_ids.add(exercise_set.id)
+            changed = apply_changes(exercise_set, set_data)
+            if changed:
+                exercise_set.updated_at = timestamp
+                sets_to_update.append(exercise_set)
+                set_fields.update(changed)
+            if 'exercise_name' in changed:
+                renamed_sets.append(exercise_set)
+
+            if details_data is None:
+                continue
+            existing_details = sorted(exercise_set.details.all(), key=lambda detail: detail.id)
+            matched_ids = set()
+            for detail, detail_data in match_rows(existing_details, details_data):
+                if detail is None:
+                    require_fields(detail_data, DETAIL_REQUIRED_FIELDS)
+                    details_to_create.append(SetDetail(exercise_set=exercise_set, **detail_data))
+                    continue
+                matched_ids.add(detail.id)
+                changed = apply_changes(detail, detail_data)
+                if changed:
+                    detail.updated_at = timestamp
+                    details_to_update.append(detail)
+                    detail_fields.update(changed)
+            stale_detail_ids.extend(detail.id for detail in existing_details if detail.id not in matched_ids)
+
+        stale_set_ids = [exercise_set.id for exercise_set in existing_sets if exercise_set.id not in matched_set_ids]
+
+        # 刪除紀錄由 post_delete 寫入（見 sync.record_deletion）
+        if stale_set_ids:
+            ExerciseSet.objects.filter(id__in=stale_set_ids).delete()
+        if stale_detail_ids:
+            SetDetail.objects.filter(id__in=stale_detail_ids).delete()
+
+        if sets_to_create or renamed_sets:
+            ExerciseCatalog.assign(sets_to_create + renamed_sets)
+        if renamed_sets:
+            set_fields.add('catalog')
+        if sets_to_update:
+            ExerciseSet.objects.bulk_update(sets_to_update, [*set_fields, 'updated_at'])
+        if sets_to_create:
+            ExerciseSet.objects.bulk_create(sets_to_create)
+            for exercise_set, details_data in pending_details:
+                for detail_data in details_data:
+                    detail_data.pop('id', None)
+                    require_fields(detail_data, DETAIL_REQUIRED_FIELDS)
+                    details_to_create.append(SetDetail(exercise_set=exercise_set, **detail_data))
+        if details_to_update:
+            SetDetail.objects.bulk_update(details_to_update, [*detail_fields, 'updated_at'])
+        if details_to_create:
+            SetDetail.objects.bulk_create(details_to_create)
+
 
 class TemplateSerializer(serializers.ModelSerializer):
     exercises = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
@@ -141,3 +335,9 @@ class TemplateSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'exercises', 'created_at', 'updated_at']
 
 
+
+class GeneratePlanSerializer(serializers.Serializer):
+    weeks = serializers.IntegerField(min_value=1, max_value=12, default=4)
+    week_start = serializers.DateField(required=False)
+    dates = serializers.ListField(child=serializers.DateField(), required=False, allow_empty=False, max_length=14)
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=10000)
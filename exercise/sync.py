@@ -0,0 +1,166 @@
+"""
+增量同步：返回指定 cursor 之後有變動的資料與刪除紀錄
+
+cursor 是伺服器時間 (ISO 8601)。為了涵蓋 auto_now 寫入時間早於交易提交時間的情況，
+返回的 cursor 會往前重疊 CURSOR_OVERLAP，客戶端以 id 進行 upsert，重複收到同一筆資料不影響結果。
+已封存計劃 (is_archived) 的 sets / details 不在熱資料表中，改由 ExerciseArchive 的 payload 還原後一併返回
+（id 與原本相同，updated_at 使用計劃的 updated_at）；封存時會更新計劃的 updated_at，增量同步也會重新送出。
+
+刪除紀錄由 record_deletion (post_delete) 統一寫入，只記錄刪除的起點：刪除 Exercise 時不另外記錄
+其 sets / details，客戶端應一併移除子資料。刪除紀錄只保留 SYNC_TOMBSTONE_DAYS 天（accounts/purge.py 的
+prune_expired 清理），cursor 早於這個期限時改為完整同步並返回 full_sync，客戶端必須以回應取代本地資料。帳號刪除 (accounts/purge.py) 以 _raw_delete 直接刪除，
+不會寫入刪除紀錄，該帳號的 token 與刪除紀錄也會一起刪除，不會再有客戶端同步。
+"""
+from datetime import timedelta
+from weakref import WeakKeyDictionary
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware, now
+from .archive import unpack
+from .models import BodyComposition, Exercise, ExerciseArchive, ExerciseSet, SetDetail, SyncTombstone
+
+CURSOR_OVERLAP = timedelta(seconds=5)
+# 同一次刪除 (origin) 中已查過的使用者，origin 結束後自動釋放
+_tombstone_memos = WeakKeyDictionary()
+
+EXERCISE_FIELDS = (
+    'id', 'name', 'goal', 'total_duration', 'manual_calories_burned', 'calculated_calories_burned',
+    'scheduled_date', 'scheduled_time', 'is_archived', 'created_at', 'updated_at',
+)
+SET_FIELDS = ('id', 'exercise_id', 'exercise_name', 'catalog_id', 'body_part', 'joint_type', 'sets', 'updated_at')
+DETAIL_FIELDS = ('id', 'exercise_set_id', 'reps', 'weight', 'actual_duration', 'rest_time', 'updated_at')
+BODY_COMPOSITION_FIELDS = (
+    'id', 'height', 'weight', 'body_fat_percentage', 'muscle_mass', 'bmi', 'visceral_fat',
+    'basal_metabolic_rate', 'waist_circumference', 'hip_circumference', 'chest_circumference',
+    'shoulder_circumference', 'upper_arm_circumference', 'lower_arm_circumference',
+    'thigh_circumference', 'calf_circumference', 'measured_at', 'updated_at',
+)
+
+
+def parse_cursor(value):
+    """
+    解析客戶端傳入的 cursor，空值代表完整同步；格式錯誤時拋出 ValueError
+    """
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(value)
+    if is_naive(since):
+        since = make_aware(since)
+    return since
+
+
+def changed_querysets(user, since=None):
+    """
+    since 之後變動的資料，{名稱: queryset}；changes_since 與 query_plans 共用
+    """
+    querysets = {
+        'exercises': Exercise.objects.filter(user=user),
+        'sets': ExerciseSet.objects.filter(exercise__user=user),
+        'details': SetDetail.objects.filter(exercise_set__exercise__user=user),
+        'body_compositions': BodyComposition.objects.filter(user=user),
+        'tombstones': SyncTombstone.objects.filter(user=user),
+    }
+    if since is not None:
+        for name, queryset in querysets.items():
+            field = 'deleted_at' if name == 'tombstones' else 'updated_at'
+            querysets[name] = queryset.filter(**{f'{field}__gte': since})
+    return querysets
+
+
+def tombstone_horizon():
+    """
+    最舊仍保留刪除紀錄的時間，更早的 cursor 無法得知之間的刪除
+    """
+    return now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+
+
+def changes_since(user, since=None):
+    """
+    返回 since 之後變動的 Exercise / ExerciseSet / SetDetail / BodyComposition 以及刪除紀錄；
+    since 為 None 或早於 tombstone_horizon() 時返回完整資料並標記 full_sync
+    """
+    cursor = now() - CURSOR_OVERLAP
+    if since is not None and since < tombstone_horizon():
+        since = None
+    changed = changed_querysets(user, since)
+
+    exercise_rows = list(changed['exercises'].values(*EXERCISE_FIELDS).order_by('id'))
+    types_by_exercise = {}
+    type_rows = Exercise.exercise_type.through.objects.filter(
+        exercise_id__in=[row['id'] for row in exercise_rows]
+    ).values_list('exercise_id', 'exercisetype_id')
+    for exercise_id, type_id in type_rows:
+        types_by_exercise.setdefault(exercise_id, []).append(type_id)
+    for row in exercise_rows:
+        row['exercise_type'] = types_by_exercise.get(row['id'], [])
+
+    set_rows = list(changed['sets'].values(*SET_FIELDS).order_by('id'))
+    detail_rows = list(changed['details'].values(*DETAIL_FIELDS).order_by('id'))
+    archived_sets, archived_details = archived_rows(exercise_rows)
+    set_rows += archived_sets
+    detail_rows += archived_details
+
+    deleted = {}
+    for model, object_id in changed['tombstones'].values_list('model', 'object_id').order_by('id'):
+        deleted.setdefault(model, []).append(object_id)
+
+    return {
+        'cursor': cursor.isoformat(),
+        'full_sync': since is None,
+        'exercises': exercise_rows,
+        'sets': set_rows,
+        'details': detail_rows,
+        'body_compositions': list(changed['body_compositions'].values(*BODY_COMPOSITION_FIELDS).order_by('id')),
+        'deleted': deleted,
+    }
+
+
+def archived_rows(exercise_rows):
+    """
+    以一次查詢讀取 exercise_rows 中已封存計劃的 payload，返回與 SET_FIELDS / DETAIL_FIELDS 相同格式的資料
+    """
+    updated_at = {row['id']: row['updated_at'] for row in exercise_rows if row['is_archived']}
+    if not updated_at:
+        return [], []
+    set_rows, detail_rows = [], []
+    payloads = ExerciseArchive.objects.filter(exercise_id__in=updated_at).values_list('exercise_id', 'payload').order_by('exercise_id')
+    for exercise_id, payload in payloads:
+        for set_data, details_data in unpack(payload):
+            set_rows.append({'exercise_id': exercise_id, **set_data, 'updated_at': updated_at[exercise_id]})
+            detail_rows.extend(
+                {'exercise_set_id': set_data['id'], **data, 'updated_at': updated_at[exercise_id]} for data in details_data
+            )
+    return set_rows, detail_rows
+
+
+def _deleted_by_user(sender, instance, memo):
+    if sender in (Exercise, BodyComposition):
+        return instance.user_id
+    if sender is ExerciseSet:
+        key, lookup = ('exercise', instance.exercise_id), Exercise.objects.filter(pk=instance.exercise_id).values_list('user_id')
+    else:
+        key, lookup = ('set', instance.exercise_set_id), ExerciseSet.objects.filter(
+            pk=instance.exercise_set_id
+        ).values_list('exercise__user_id')
+    if key not in memo:
+        row = lookup.using(DEFAULT_DB_ALIAS).first()
+        memo[key] = row[0] if row else None
+    return memo[key]
+
+
+def record_deletion(sender, instance, origin=None, **kwargs):
+    """
+    post_delete：刪除的起點是 sender 本身時寫入 SyncTombstone，串聯刪除的子資料不另外記錄
+    """
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not sender:
+        return
+    # 同一次刪除的多筆資料共用查詢結果（刪除一批 details 時每個 set 只查詢一次使用者）
+    memo = _tombstone_memos.setdefault(origin, {}) if origin is not None else {}
+    user_id = _deleted_by_user(sender, instance, memo)
+    if user_id is not None:
+        SyncTombstone.record(user_id, sender, [instance.pk])
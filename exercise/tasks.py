@@ -0,0 +1,79 @@
+"""
+exercise 的背景工作，由 jobs app 啟動時自動載入並註冊
+"""
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.crypto import get_random_string
+from django.utils.dateparse import parse_date
+from django.utils.timezone import now
+from jobs.registry import job
+from .models import BodyComposition, Exercise, create_from_template
+from .overload import generate_next_week
+from .rollups import schedule_rollup_refresh
+from .schedule import iter_ical, parse_range, scheduled_plans
+
+
+@job('exercise.create_from_template')
+def clone_template(job):
+    """
+    將模板複製到 payload 中的每個日期
+    """
+    scheduled_dates = [parse_date(value) for value in job.payload['scheduled_dates']]
+    new_exercises = create_from_template(job.payload['template_id'], job.user, scheduled_dates)
+    return {'exercise_ids': [exercise.id for exercise in new_exercises]}
+
+
+@job('exercise.generate_plans')
+def generate_plans(job, chunk_size=500):
+    """
+    分批為多位使用者產生下週計劃，每批固定查詢與寫入次數
+    """
+    user_ids = job.payload['user_ids']
+    week_start = parse_date(job.payload['week_start'])
+    dates = [parse_date(value) for value in job.payload.get('dates', [])]
+    created = 0
+    for position in range(0, len(user_ids), chunk_size):
+        created += len(generate_next_week(user_ids[position:position + chunk_size], week_start, job.payload['weeks'], dates))
+    return {'users': len(user_ids), 'created': created}
+
+
+@job('exercise.recompute_calories')
+def recompute_calories(job, chunk_size=500):
+    """
+    以最新一筆體重重新計算用戶所有運動計劃的熱量消耗
+    """
+    weight = BodyComposition.objects.filter(user_id=job.user_id).order_by('-measured_at').values_list('weight', flat=True).first()
+    if weight is None:
+        return {'updated': 0}
+
+    exercises = Exercise.objects.filter(user_id=job.user_id).prefetch_related('exercise_type').order_by('id')
+    updated, changed, dates = 0, [], set()
+    for exercise in exercises.iterator(chunk_size=chunk_size):
+        if not exercise.exercise_type.all():
+            continue
+        exercise.calculate_calories(weight)
+        dates.add(exercise.scheduled_date)
+        exercise.updated_at = now()  # bulk_update 不會更新 auto_now 欄位
+        changed.append(exercise)
+        if len(changed) >= chunk_size:
+            updated += len(changed)
+            Exercise.objects.bulk_update(changed, ['calculated_calories_burned', 'updated_at'])
+            changed = []
+    updated += len(changed)
+    Exercise.objects.bulk_update(changed, ['calculated_calories_burned', 'updated_at'])
+    schedule_rollup_refresh((job.user_id, day) for day in dates)
+    return {'updated': updated, 'weight': weight}
+
+
+@job('exercise.export_calendar', cpu_bound=True)
+def export_calendar(job):
+    """
+    將指定區間的運動計劃匯出為 .ics 檔並存到 media，返回下載網址
+    """
+    start, end = parse_range(job.payload)
+    content = ''.join(iter_ical(scheduled_plans(job.user_id, start, end)))
+    name = default_storage.save(
+        f'exports/exercise-{start:%Y%m%d}-{end:%Y%m%d}-{get_random_string(16)}.ics',
+        ContentFile(content.encode('utf-8')),
+    )
+    return {'url': default_storage.url(name)}
@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import json
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import BodyComposition, Exercise, ExerciseSet, SetDetail, WeeklyRollup
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+class ExerciseUpdateDiffTests(TestCase):
+    def setUp(self):
+        from .models import ExerciseType
+
+        ExerciseType.objects.bulk_create([ExerciseType(id=1, name='重量訓練'), ExerciseType(id=2, name='有氧')])
+        self.user = User.objects.create_user(username='diff')
+
+    def detail(self, reps=10, weight=50):
+        return {'reps': reps, 'weight': weight, 'actual_duration': 40, 'rest_time': 60}
+
+    def create_plan(self, set_count=2, detail_count=2):
+        sets = [
+            {'exercise_name': f'Move {index}', 'body_part': 1, 'joint_type': 2, 'sets': detail_count,
+             'details': [self.detail(reps=index + 1) for _ in range(detail_count)]}
+            for index in range(set_count)
+        ]
+        return self.save(None, {'name': 'Plan', 'goal': 1, 'scheduled_date': '2026-10-20', 'exercise_type': [1], 'sets': sets})
+
+    def save(self, instance, data):
+        from .serializers import ExerciseSerializer
+
+        serializer = ExerciseSerializer(instance, data=data, partial=instance is not None)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(**({} if instance else {'user': self.user}))
+
+    def snapshot(self, exercise):
+        return [
+            (exercise_set.id, exercise_set.exercise_name, [(detail.id, detail.reps) for detail in exercise_set.details.order_by('id')])
+            for exercise_set in exercise.sets.order_by('id')
+        ]
+
+    def test_exercise_type_change_bumps_updated_at(self):
+        exercise = self.create_plan()
+        before = exercise.updated_at
+        self.save(exercise, {'exercise_type': [2]})
+        exercise.refresh_from_db()
+        self.assertGreater(exercise.updated_at, before)
+        self.assertEqual(list(exercise.exercise_type.values_list('id', flat=True)), [2])
+
+    def test_match_by_id_and_one_field_edit_keeps_ids(self):
+        exercise = self.create_plan()
+        (first_id, _, first_details), (second_id, _, second_details) = self.snapshot(exercise)
+        # 順序與傳入順序相反，依 id 對應；只修改一個 detail 的 reps
+        self.save(exercise, {'sets': [
+            {'id': second_id, 'details': [{'id': detail_id, **self.detail(reps=2)} for detail_id, _ in second_details]},
+            {'id': first_id, 'details': [
+                {'id': first_details[0][0], **self.detail(reps=1)},
+                {'id': first_details[1][0], **self.detail(reps=9)},
+            ]},
+        ]})
+        self.assertEqual(self.snapshot(exercise), [
+            (first_id, 'Move 0', [(first_details[0][0], 1), (first_details[1][0], 9)]),
+            (second_id, 'Move 1', second_details),
+        ])
+
+    def test_positional_match_without_ids(self):
+        exercise = self.create_plan()
+        (first_id, _, first_details), (second_id, _, second_details) = self.snapshot(exercise)
+        self.save(exercise, {'sets': [
+            {'exercise_name': 'Renamed', 'details': [self.detail(reps=1), self.detail(reps=1)]},
+            {'details': [self.detail(reps=7), self.detail(reps=2)]},
+        ]})
+        self.assertEqual(self.snapshot(exercise), [
+            (first_id, 'Renamed', first_details),
+            (second_id, 'Move 1', [(second_details[0][0], 7), (second_details[1][0], 2)]),
+        ])
+
+    def test_creates_updates_and_deletes(self):
+        from .sync import changes_since
+
+        exercise = self.create_plan(set_count=3)
+        (first_id, _, first_details), (second_id, _, _), (third_id, _, _) = self.snapshot(exercise)
+        kept_detail_id, removed_detail_id = (detail_id for detail_id, _ in first_details)
+        # 沒有傳入的既有 set / detail 刪除，其餘依 id 更新
+        self.save(exercise, {'sets': [
+            {'id': first_id, 'details': [{'id': kept_detail_id, **self.detail(reps=5)}]},
+            {'id': third_id, 'exercise_name': 'Third'},
+        ]})
+        self.assertEqual(self.snapshot(exercise), [
+            (first_id, 'Move 0', [(kept_detail_id, 5)]),
+            (third_id, 'Third', [(detail_id, 3) for detail_id, _ in self.snapshot(exercise)[1][2]]),
+        ])
+        self.assertEqual(changes_since(self.user)['deleted'], {'exerciseset': [second_id], 'setdetail': [removed_detail_id]})
+
+        # 對應不到既有資料的 set / detail 新增
+        self.save(exercise, {'sets': [
+            {'id': first_id, 'details': [{'id': kept_detail_id, **self.detail(reps=5)}, self.detail(reps=6)]},
+            {'id': third_id},
+            {'exercise_name': 'New', 'body_part': 1, 'joint_type': 2, 'details': [self.detail(reps=3)]},
+        ]})
+        (_, _, first_details), _, (new_id, name, new_details) = self.snapshot(exercise)
+        self.assertEqual(first_details[0], (kept_detail_id, 5))
+        self.assertEqual(first_details[1][1], 6)
+        self.assertGreater(first_details[1][0], removed_detail_id)
+        self.assertEqual((name, [reps for _, reps in new_details]), ('New', [3]))
+        self.assertEqual(ExerciseSet.objects.get(pk=first_id).sets, 2)
+        self.assertEqual(ExerciseSet.objects.get(pk=new_id).sets, 1)
+        exercise.refresh_from_db()
+        self.assertEqual(exercise.total_duration, 500 // 60)  # 5 個 detail，各 100 秒
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count_queries(set_count):
+            exercise = self.create_plan(set_count=set_count, detail_count=3)
+            sets = [
+                {'id': set_id, 'details': [{'id': detail_id, **self.detail(reps=reps + 1)} for detail_id, reps in details]}
+                for set_id, _, details in self.snapshot(exercise)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.save(exercise, {'sets': sets})
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(8))
+
+
+class WeeklyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rollup')
+
+    def test_set_save_on_exercise_with_string_date(self):
+        # scheduled_date 以 ISO 字串建立時，保存 set 後的增量更新不應出錯
+        exercise = Exercise.objects.create(user=self.user, name='Push', scheduled_date='2026-10-21')
+        with self.captureOnCommitCallbacks(execute=True):
+            exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Bench', sets=0)
+            SetDetail.objects.create(exercise_set=exercise_set, reps=10, weight=50, actual_duration=40, rest_time=20)
+            exercise_set.save()
+
+        rollup = WeeklyRollup.objects.get(user=self.user, week_start=date(2026, 10, 19), goal=WeeklyRollup.ALL_GOALS)
+        self.assertEqual(rollup.total_volume, 500)
+        self.assertEqual(rollup.exercise_count, 1)
+
+
+class WeeklyRollupTotalsTests(TestCase):
+    week = date(2026, 10, 19)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='totals')
+
+    def plan(self, goal, reps_list, weight=10, day=20):
+        exercise = Exercise.objects.create(
+            user=self.user, name=f'Goal {goal}', goal=goal, scheduled_date=date(2026, 10, day), total_duration=30,
+            manual_calories_burned=100,
+        )
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Lift', sets=0)
+        for reps in reps_list:
+            SetDetail.objects.create(exercise_set=exercise_set, reps=reps, weight=weight, actual_duration=30, rest_time=30)
+        return exercise
+
+    def rollups(self):
+        return {
+            rollup.goal: (rollup.total_volume, rollup.total_minutes, rollup.total_calories, rollup.exercise_count)
+            for rollup in WeeklyRollup.objects.filter(user=self.user, week_start=self.week)
+        }
+
+    def test_totals_per_goal_and_aggregate(self):
+        from .archive import archive_exercises
+        from .rollups import refresh_weekly_rollups
+
+        # 只有 3 ~ 15 下的 detail 計入訓練量
+        self.plan(1, [2, 3, 15, 16])
+        archived = self.plan(2, [10])
+        archive_exercises([archived.pk])
+        self.plan(2, [5], day=21)
+        Exercise.objects.filter(user=self.user).update(total_duration=30)
+
+        refresh_weekly_rollups([self.user.pk], self.week, self.week + timedelta(days=1))
+        self.assertEqual(self.rollups(), {
+            1: (180, 30, 100, 1),
+            2: (150, 60, 200, 2),  # 已封存的計劃使用 ExerciseArchive.total_volume
+            WeeklyRollup.ALL_GOALS: (330, 90, 300, 3),
+        })
+
+    def test_deletes_and_detail_edits_refresh_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            muscle = self.plan(1, [10, 10])
+            self.plan(2, [5])
+        self.assertEqual(self.rollups()[WeeklyRollup.ALL_GOALS][0], 250)
+
+        # 單筆修改 SetDetail（例如 admin）
+        detail = SetDetail.objects.filter(exercise_set__exercise=muscle).first()
+        detail.reps = 12
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.save()
+        self.assertEqual(self.rollups()[1][0], 220)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SetDetail.objects.filter(pk=detail.pk).delete()
+        self.assertEqual(self.rollups()[1][0], 100)
+
+        # 刪除計劃後沒有資料的目標列也一併刪除
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            muscle.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(set(self.rollups()), {2, WeeklyRollup.ALL_GOALS})
+        self.assertEqual(self.rollups()[WeeklyRollup.ALL_GOALS][0], 50)
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.plan(1, [10])
+        self.plan(3, [4], day=27)
+        WeeklyRollup.objects.all().delete()
+        WeeklyRollup.objects.create(user=self.user, week_start=date(2026, 10, 12), total_volume=999)
+        WeeklyRollup.objects.create(user=self.user, week_start=self.week, goal=5, total_volume=999)
+
+        call_command('rebuild_weekly_rollups', '--batch-size', '1', stdout=StringIO())
+        rows = WeeklyRollup.objects.filter(user=self.user, week_start__gte=self.week).order_by('week_start', 'goal')
+        self.assertEqual(list(rows.values_list('week_start', 'goal', 'total_volume')), [
+            (self.week, WeeklyRollup.ALL_GOALS, 100),
+            (self.week, 1, 100),
+            (date(2026, 10, 26), WeeklyRollup.ALL_GOALS, 40),
+            (date(2026, 10, 26), 3, 40),
+        ])
+        # 重新計算範圍以外的列不受影響
+        self.assertTrue(WeeklyRollup.objects.filter(week_start=date(2026, 10, 12)).exists())
+
+
+class OverloadRuleTests(SimpleTestCase):
+    def test_rules_per_goal(self):
+        from .overload import MIN_REST_TIME, RULES, next_target
+
+        muscle_gain, fat_loss, endurance = RULES[1], RULES[2], RULES[3]
+        # reps 未達 max_reps：只加一次
+        self.assertEqual(next_target(muscle_gain, 8, 60, 40, 90), (9, 60, 40, 90))
+        # 達到 max_reps：加重（至少 WEIGHT_INCREMENT）並回到 min_reps
+        self.assertEqual(next_target(muscle_gain, 12, 60, 40, 90), (6, 61.5, 40, 90))
+        self.assertEqual(next_target(muscle_gain, 12, 10, 40, 90), (6, 10.5, 40, 90))
+        # 沒有負重的動作不加重，停在 max_reps
+        self.assertEqual(next_target(muscle_gain, 12, 0, 40, 90), (12, 0, 40, 90))
+        # 縮短休息但不低於 MIN_REST_TIME，原本就低於下限時維持不變
+        self.assertEqual(next_target(fat_loss, 12, 20, 40, 60), (13, 20, 40, 55))
+        self.assertEqual(next_target(fat_loss, 12, 20, 40, MIN_REST_TIME + 2), (13, 20, 40, MIN_REST_TIME))
+        self.assertEqual(next_target(fat_loss, 12, 20, 40, 20), (13, 20, 40, 20))
+        # 耐力：不加重，到 max_reps 後只延長持續時間
+        self.assertEqual(next_target(endurance, 25, 20, 60, 45), (25, 20, 66, 40))
+
+
+class GenerateNextWeekTests(TestCase):
+    week_start = date(2026, 10, 26)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='overload')
+
+    def plan(self, name, scheduled_date, goal=1):
+        exercise = Exercise.objects.create(user=self.user, name=name, goal=goal, scheduled_date=scheduled_date)
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Bench', sets=0)
+        SetDetail.objects.create(exercise_set=exercise_set, reps=8, weight=60, actual_duration=40, rest_time=90)
+        return exercise
+
+    def test_generates_once_per_name_and_date(self):
+        from .overload import generate_next_week
+
+        self.plan('Push', date(2026, 10, 20))
+        created = generate_next_week([self.user.pk], self.week_start)
+        self.assertEqual([(exercise.name, exercise.scheduled_date) for exercise in created], [('Push', date(2026, 10, 27))])
+        detail = SetDetail.objects.get(exercise_set__exercise=created[0])
+        self.assertEqual((detail.reps, detail.weight), (9, 60))
+
+        self.assertEqual(generate_next_week([self.user.pk], self.week_start), [])
+        self.assertEqual(Exercise.objects.filter(scheduled_date=date(2026, 10, 27)).count(), 1)
+
+    def test_dates_round_robin(self):
+        from .overload import generate_next_week
+
+        for day, name in ((19, 'Push'), (20, 'Pull'), (21, 'Push'), (22, 'Legs')):
+            self.plan(name, date(2026, 10, day))
+        created = generate_next_week([self.user.pk], self.week_start, dates=[date(2026, 10, 29), date(2026, 10, 27)])
+        # 依原本的順序輪流排入排序後的 dates；第二個 Push 與第一個排到同一天，只建立一次
+        self.assertEqual(
+            [(exercise.name, exercise.scheduled_date.day) for exercise in created],
+            [('Push', 27), ('Pull', 29), ('Legs', 29)],
+        )
+
+    def test_only_staff_generate_for_other_users(self):
+        other = User.objects.create_user(username='athlete')
+        self.plan('Push', date(2026, 10, 20))
+        payload = {'user_ids': [self.user.pk, other.pk], 'week_start': self.week_start.isoformat()}
+
+        response = api_client(other).post('/fitness_api/exercise/generate_plan/', payload, format='json')
+        self.assertEqual(response.status_code, 403)
+        staff = api_client(User.objects.create_user(username='coach', is_staff=True))
+        response = staff.post('/fitness_api/exercise/generate_plan/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+
+
+class LeaderboardViewTests(TestCase):
+    def setUp(self):
+        # leaderboard 在 REPLICA_READ_VIEWS 中；測試的副本是另一個空的資料庫，這裡固定讀主庫
+        patcher = mock.patch('backend.routers.replica_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def test_invalid_week_returns_400(self):
+        client = api_client(User.objects.create_user(username='leader'))
+        for week in ('2026-02-30', 'not-a-date'):
+            response = client.get('/fitness_api/exercise/leaderboard/', {'week': week})
+            self.assertEqual(response.status_code, 400, week)
+        self.assertEqual(client.get('/fitness_api/exercise/leaderboard/', {'week': '2026-02-28'}).status_code, 200)
+
+    def test_other_users_are_anonymous(self):
+        week = date(2026, 10, 19)
+        me, other = User.objects.create_user(username='me'), User.objects.create_user(username='other')
+        WeeklyRollup.objects.create(user=other, week_start=week, total_volume=200)
+        WeeklyRollup.objects.create(user=me, week_start=week, total_volume=100)
+
+        response = api_client(me).get('/fitness_api/exercise/leaderboard/', {'week': '2026-10-21'})
+        self.assertEqual(response.json()['entries'], [
+            {'rank': 1, 'value': 200, 'is_me': False},
+            {'rank': 2, 'value': 100, 'is_me': True},
+        ])
+        self.assertEqual(response.json()['me'], {'rank': 2, 'value': 100})
+
+
+class ColumnarTypedArrayTests(TestCase):
+    def test_picks_signed_types_for_negative_values(self):
+        from .columnar import _typed_array
+
+        cases = [
+            ([0, 255], 'u8'), ([0, 65536], 'u32'),
+            ([-1, 127], 'i8'), ([-129, 0], 'i16'), ([-1, 40000], 'i32'), ([-(2 ** 40), 1], 'i64'),
+        ]
+        for values, expected in cases:
+            type_name, packed = _typed_array(values)
+            self.assertEqual(type_name, expected, values)
+            self.assertEqual(list(packed), values)
+        with self.assertRaises(ValueError):
+            _typed_array([-1, 2 ** 63])
+
+
+def decode_columnar(body):
+    """
+    依 columnar.py 的格式還原二進位回應：header 中的數值欄位換回 list
+    """
+    import struct
+    from array import array
+
+    typecodes = {'u8': 'B', 'u16': 'H', 'u32': 'I', 'u64': 'Q', 'i8': 'b', 'i16': 'h', 'i32': 'i', 'i64': 'q', 'f32': 'f', 'f64': 'd'}
+    assert body[:4] == b'FPC1'
+    (header_length,) = struct.unpack('<I', body[4:8])
+    header = json.loads(body[8:8 + header_length].decode('utf-8'))
+    data = body[8 + header_length + (-(8 + header_length) % 8):]
+    for column in header.pop('columns'):
+        values = array(typecodes[column['type']])
+        values.frombytes(data[column['offset']:column['offset'] + column['length'] * values.itemsize])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        group, field = column['path'].split('.')
+        header[group][field] = values.tolist()
+    return header
+
+
+class ColumnarPlanTests(TestCase):
+    url = '/fitness_api/exercise/monthly_plans/'
+
+    def setUp(self):
+        from .archive import archive_exercises
+        from .models import ExerciseType
+
+        patcher = mock.patch('backend.routers.replica_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ExerciseType.objects.bulk_create([ExerciseType(id=1, name='重量訓練'), ExerciseType(id=2, name='有氧')])
+        self.user = User.objects.create_user(username='columnar')
+        self.client = api_client(self.user)
+        for name, goal, set_details in (('Legs', 1, [[(5, 102.5), (5, 100)], [(12, 20)]]), ('Empty', 2, []),
+                                        ('Archived', 3, [[(8, 60.25), (8, 60), (6, 65)]])):
+            exercise = Exercise.objects.create(user=self.user, name=name, goal=goal, scheduled_date=date(2026, 10, 19))
+            exercise.exercise_type.set([1, 2] if name == 'Legs' else [2])
+            for index, details in enumerate(set_details):
+                exercise_set = ExerciseSet.objects.create(
+                    exercise=exercise, exercise_name=f'{name} {index}', body_part=index + 1, joint_type=2, sets=0
+                )
+                for reps, weight in details:
+                    SetDetail.objects.create(exercise_set=exercise_set, reps=reps, weight=weight, actual_duration=30, rest_time=60)
+        archive_exercises(Exercise.objects.filter(name='Archived').values_list('id', flat=True))
+
+    def test_accept_header_and_format_pick_renderer(self):
+        from .renderers import ColumnarBinaryRenderer, ColumnarJSONRenderer
+
+        cases = [
+            ({'HTTP_ACCEPT': 'application/vnd.fitness.columnar+json'}, {}, ColumnarJSONRenderer),
+            ({'HTTP_ACCEPT': 'application/vnd.fitness.columnar'}, {}, ColumnarBinaryRenderer),
+            ({}, {'format': 'columnar'}, ColumnarJSONRenderer),
+            ({}, {'format': 'columnar-bin'}, ColumnarBinaryRenderer),
+        ]
+        for url in (self.url, '/fitness_api/exercise/weekly_plans/'):
+            for headers, params, renderer in cases:
+                response = self.client.get(url, params, **headers)
+                self.assertEqual(response.status_code, 200, (url, headers, params))
+                self.assertIsInstance(response.accepted_renderer, renderer)
+                self.assertEqual(response['Content-Type'].split(';')[0], renderer.media_type)
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+            self.assertIsInstance(response.json(), list)
+
+    def test_binary_payload_matches_serializer(self):
+        body = self.client.get(self.url, HTTP_ACCEPT='application/vnd.fitness.columnar').content
+        columns = decode_columnar(body)
+        self.assertEqual(columns, self.client.get(self.url, {'format': 'columnar'}).json())
+
+        exercises, sets, details, labels = columns['exercises'], columns['sets'], columns['details'], columns['labels']
+        rebuilt = {}
+        for i in range(columns['count']):
+            plan_sets = []
+            for j in range(exercises['set_offsets'][i], exercises['set_offsets'][i + 1]):
+                plan_sets.append({
+                    'id': sets['id'][j],
+                    'exercise_name': sets['exercise_name'][j],
+                    'body_part': labels['body_part'][str(sets['body_part'][j])],
+                    'joint_type': labels['joint_type'][str(sets['joint_type'][j])],
+                    'sets': sets['sets'][j],
+                    'details': [
+                        {field: details[field][k] for field in ('id', 'reps', 'weight', 'actual_duration', 'rest_time')}
+                        for k in range(sets['detail_offsets'][j], sets['detail_offsets'][j + 1])
+                    ],
+                })
+            rebuilt[exercises['id'][i]] = {
+                'name': exercises['name'][i],
+                'goal': labels['goal'][str(exercises['goal'][i])],
+                'exercise_type': columns['exercise_types']['id'][exercises['type_offsets'][i]:exercises['type_offsets'][i + 1]],
+                'sets': plan_sets,
+            }
+
+        # 一般 JSON 回應即 ExerciseSerializer 的輸出
+        expected = {
+            plan['id']: {
+                'name': plan['name'],
+                'goal': plan['goal'],
+                'exercise_type': sorted(plan['exercise_type']),
+                'sets': [{key: value for key, value in exercise_set.items() if key != 'catalog'} for exercise_set in plan['sets']],
+            }
+            for plan in self.client.get(self.url, HTTP_ACCEPT='application/json').json()
+        }
+        self.assertEqual(rebuilt, expected)
+        # 已封存的計劃從 ExerciseArchive 還原
+        archived = Exercise.objects.get(name='Archived')
+        self.assertTrue(archived.is_archived)
+        self.assertEqual([detail['weight'] for detail in rebuilt[archived.pk]['sets'][0]['details']], [60.25, 60, 65])
+        self.assertEqual(exercises['set_offsets'], [0, 2, 2, 3])
+
+
+class CalendarViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='calendar')
+        self.client = api_client(self.user)
+        other = User.objects.create_user(username='calendar-other')
+        for user, day, name in ((self.user, 1, 'Before'), (self.user, 5, 'Legs'), (self.user, 5, 'Core'),
+                                (self.user, 10, 'Run, long; easy'), (self.user, 11, 'After'), (other, 5, 'Other')):
+            Exercise.objects.create(user=user, name=name, scheduled_date=date(2026, 10, day))
+        Exercise.objects.filter(name='Legs').update(scheduled_time='18:30', total_duration=45)
+
+    def test_range_is_inclusive_and_grouped_by_day(self):
+        response = self.client.get('/fitness_api/exercise/calendar/', {'start': '2026-10-05', 'end': '2026-10-10'})
+        self.assertEqual(response.status_code, 200)
+        days = response.json()['days']
+        self.assertEqual(list(days), ['2026-10-05', '2026-10-10'])
+        # 沒有時間的計劃排在前面
+        self.assertEqual([plan['name'] for plan in days['2026-10-05']], ['Core', 'Legs'])
+        self.assertEqual(
+            self.client.get('/fitness_api/exercise/calendar/', {'start': '2026-10-10', 'end': '2026-10-05'}).status_code, 400
+        )
+
+    def test_ics_stream(self):
+        response = self.client.get('/fitness_api/exercise/calendar.ics', {'start': '2026-10-05', 'end': '2026-10-10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertEqual(body.count('END:VEVENT'), 3)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        # 每行都以 CRLF 結尾，沒有單獨的 LF
+        self.assertEqual(body.count('\n'), body.count('\r\n'))
+        self.assertIn('DTSTART:20261005T183000\r\nDURATION:PT45M\r\n', body)
+        self.assertIn('DTSTART;VALUE=DATE:20261010\r\n', body)
+        self.assertIn('SUMMARY:Run\\, long\\; easy\r\n', body)
+
+
+class CatalogAutocompleteViewTests(TestCase):
+    def test_limit_is_clamped_and_validated(self):
+        from .catalog import catalog_index
+        from .models import ExerciseCatalog
+
+        ExerciseCatalog.resolve(['Bench Press', 'Bent Over Row'])
+        # 在測試的交易中同步預熱，避免背景執行緒讀取；結束後清掉只存在於此交易的項目
+        catalog_index.warm()
+        self.addCleanup(catalog_index.reset)
+        client = api_client(User.objects.create_user(username='autocomplete'))
+        url = '/fitness_api/exercise/catalog/autocomplete/'
+        for limit in ('-3', '0'):
+            response = client.get(url, {'q': 'be', 'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+            self.assertEqual(len(response.data), 1, limit)
+        self.assertEqual(client.get(url, {'q': 'be', 'limit': 'ten'}).status_code, 400)
+
+
+class AsyncJobTests(TestCase):
+    def setUp(self):
+        from .models import save_as_template
+
+        self.user = User.objects.create_user(username='async')
+        self.client = api_client(self.user)
+        exercise = Exercise.objects.create(user=self.user, name='Push', goal=1, scheduled_date=date(2026, 10, 1))
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Bench Press', sets=0)
+        SetDetail.objects.create(exercise_set=exercise_set, reps=8, weight=60, actual_duration=30, rest_time=90)
+        self.template = save_as_template([exercise.pk], 'Push day', self.user)
+        self.url = f'/fitness_api/exercise/templates/{self.template.pk}/create/'
+
+    def assertAccepted(self, response):
+        from jobs.models import Job
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(response['Location'], body['status_url'])
+        self.assertTrue(body['status_url'].endswith(f'/fitness_api/jobs/{body["job_id"]}/'))
+        self.assertEqual(body['status'], Job.PENDING)
+        return Job.objects.get(pk=body['job_id'])
+
+    def test_prefer_respond_async_returns_202_and_location(self):
+        response = self.client.post(self.url, {'scheduled_dates': ['2026-10-20']}, format='json', HTTP_PREFER='respond-async')
+        queued = self.assertAccepted(response)
+        self.assertEqual(queued.name, 'exercise.create_from_template')
+        self.assertEqual(queued.user, self.user)
+        self.assertEqual(Exercise.objects.filter(user=self.user).count(), 1)
+
+        status_response = self.client.get(response['Location'])
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.json()['status'], 'pending')
+
+        response = self.client.get(
+            '/fitness_api/exercise/calendar.ics', {'start': '2026-10-01', 'end': '2026-10-31'}, HTTP_PREFER='respond-async'
+        )
+        self.assertEqual(self.assertAccepted(response).name, 'exercise.export_calendar')
+        # 沒有 Prefer 時同步處理
+        self.assertEqual(self.client.post(self.url, {'scheduled_dates': ['2026-10-21']}, format='json').status_code, 201)
+
+    def test_create_from_template_job_end_to_end(self):
+        from jobs.worker import Worker
+
+        dates = [date(2026, 11, day) for day in range(1, 10)]
+        response = self.client.post(self.url, {'scheduled_dates': [day.isoformat() for day in dates]}, format='json')
+        queued = self.assertAccepted(response)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Worker().run_once(), 1)
+        body = self.client.get(response['Location']).json()
+        self.assertEqual(body['status'], 'succeeded')
+        created = Exercise.objects.filter(pk__in=body['result']['exercise_ids'])
+        self.assertEqual(sorted(created.values_list('scheduled_date', flat=True)), dates)
+        self.assertEqual(set(created.values_list('user', 'name')), {(self.user.pk, 'Push')})
+        self.assertEqual(SetDetail.objects.filter(exercise_set__exercise__in=created).count(), len(dates))
+        self.assertEqual(queued.pk, body['id'])
+
+
+class CatalogIndexTests(TestCase):
+    def setUp(self):
+        from .catalog import catalog_index
+        from .models import ExerciseCatalog
+
+        self.index = catalog_index
+        self.ids = ExerciseCatalog.resolve(['Bench Press', 'Incline Bench  Press', 'Bent Over Row', 'Squat'])
+        # 同步預熱；background 預熱的執行緒看不到測試交易中的資料
+        self.index.warm()
+        self.addCleanup(self.index.reset)
+        patcher = mock.patch.object(self.index, '_warm_in_background')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, prefix, limit=10):
+        return [name for _, name in self.index.search(prefix, limit)]
+
+    def test_prefix_and_word_suffix_search(self):
+        self.assertEqual(self.names('BEN'), ['Bench Press', 'Bent Over Row', 'Incline Bench Press'])
+        # 完整名稱的前綴命中排在單字後綴命中之前
+        self.assertEqual(self.names('bench'), ['Bench Press', 'Incline Bench Press'])
+        self.assertEqual(self.names('press'), ['Bench Press', 'Incline Bench Press'])
+        self.assertEqual(self.names('over r'), ['Bent Over Row'])
+        self.assertEqual(self.names('bench', limit=1), ['Bench Press'])
+        self.assertEqual(self.names('  '), [])
+        self.assertEqual(self.names('deadlift'), [])
+
+    def test_refresh_after_resolve_swaps_in_new_lists(self):
+        from .models import ExerciseCatalog
+
+        before = self.index._index
+        with self.captureOnCommitCallbacks(execute=True):
+            new_ids = ExerciseCatalog.resolve(['Bulgarian Split Squat'])
+        self.assertEqual(self.names('split'), ['Bulgarian Split Squat'])
+        self.assertEqual(self.names('squat'), ['Squat', 'Bulgarian Split Squat'])
+        # 已發布的串列沒有被修改，正在讀取的 search 不會看到變動中的資料
+        self.assertEqual(len(before[0]), 4)
+        self.assertNotIn(new_ids['bulgarian split squat'], before[2])
+
+    def test_rename_and_delete_invalidate(self):
+        from .models import ExerciseCatalog
+
+        squat = ExerciseCatalog.objects.get(pk=self.ids['squat'])
+        squat.name, squat.normalized_name = 'Back Squat', 'back squat'
+        squat.save()
+        self.assertFalse(self.index.warmed)
+        # 尚未重建時改用資料庫的前綴查詢
+        self.assertEqual(self.names('back'), ['Back Squat'])
+        self.index.warm()
+        self.assertEqual(self.names('squat'), ['Back Squat'])
+
+        ExerciseCatalog.objects.filter(pk=self.ids['bench press']).delete()
+        self.assertFalse(self.index.warmed)
+        self.index.warm()
+        self.assertEqual(self.names('bench'), ['Incline Bench Press'])
+
+
+class BodyCompositionTests(TestCase):
+    def test_single_post_with_existing_measured_at_updates(self):
+        user = User.objects.create_user(username='scale')
+        client = api_client(user)
+        reading = {'height': 170, 'weight': 70, 'measured_at': '2026-10-01T08:00:00Z'}
+        self.assertEqual(client.post('/fitness_api/exercise/body_composition/', reading, format='json').status_code, 201)
+        reading['weight'] = 68
+        self.assertEqual(client.post('/fitness_api/exercise/body_composition/', reading, format='json').status_code, 201)
+        self.assertEqual(list(BodyComposition.objects.filter(user=user).values_list('weight', flat=True)), [68])
+
+
+class BodyCompositionBatchTests(TestCase):
+    url = '/fitness_api/exercise/body_composition/batch/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='batch-scale')
+        self.client = api_client(self.user)
+
+    def reading(self, minute, weight=70):
+        return {'height': 170, 'weight': weight, 'measured_at': f'2026-10-01T08:{minute:02d}:00Z'}
+
+    def weights(self):
+        return list(BodyComposition.objects.filter(user=self.user).order_by('measured_at').values_list('weight', flat=True))
+
+    def test_duplicates_in_one_batch_keep_the_last_reading(self):
+        payload = {'readings': [self.reading(0), self.reading(0, 71), self.reading(1)]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'received': 3, 'unique': 2})
+        self.assertEqual(self.weights(), [71, 70])
+        self.assertAlmostEqual(BodyComposition.objects.filter(user=self.user).first().bmi, 24.57, places=2)
+
+    def test_existing_reading_is_updated_or_ignored(self):
+        existing = BodyComposition.objects.create(
+            user=self.user, height=170, weight=80, measured_at=datetime(2026, 10, 1, 8, 0, tzinfo=timezone.utc)
+        )
+        payload = {'readings': [self.reading(0, 75), self.reading(1)], 'on_conflict': 'ignore'}
+        self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 201)
+        self.assertEqual(self.weights(), [80, 70])
+
+        payload['on_conflict'] = 'update'
+        self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 201)
+        self.assertEqual(self.weights(), [75, 70])
+        existing.refresh_from_db()
+        self.assertEqual(existing.weight, 75)
+
+    def test_large_batches_are_inserted_in_chunks(self):
+        start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        readings = [
+            {'height': 170, 'weight': 70, 'measured_at': (start + timedelta(minutes=minute)).isoformat()}
+            for minute in range(1200)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'readings': readings}, format='json')
+        self.assertEqual(response.data, {'received': 1200, 'unique': 1200})
+        self.assertEqual(BodyComposition.objects.filter(user=self.user).count(), 1200)
+
+        # 每批最多 500 筆（SQLite 的參數上限可能讓每批更小）
+        fields = [field for field in BodyComposition._meta.concrete_fields if not field.primary_key]
+        batch_size = min(500, connection.ops.bulk_batch_size(fields, readings) or 500)
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "exercise_bodycomposition"')]
+        self.assertEqual(len(inserts), -(-1200 // batch_size))
+
+    def test_empty_or_invalid_batches_are_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'readings': []}, format='json').status_code, 400)
+        response = self.client.post(self.url, {'readings': [{'height': 170, 'weight': 70}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        payload = {'readings': [self.reading(0)], 'on_conflict': 'skip'}
+        self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 400)
+        self.assertEqual(self.weights(), [])
+
+
+class BodyCompositionMigrationTests(TransactionTestCase):
+    before = [('exercise', '0009_exercise_schedule_index')]
+    after = [('exercise', '0010_body_composition_measured_at_unique')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_are_collapsed_before_constraint(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        user = old_apps.get_model('auth', 'User').objects.create(username='dupes')
+        OldBodyComposition = old_apps.get_model('exercise', 'BodyComposition')
+        measured_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for weight in (70, 71, 72):
+            OldBodyComposition.objects.create(user_id=user.pk, height=170, weight=weight)
+        # 0010 之前 measured_at 是 auto_now_add，需要另外寫入相同的時間
+        OldBodyComposition.objects.filter(user_id=user.pk).update(measured_at=measured_at)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        new_apps = executor.loader.project_state(self.after).apps
+        rows = new_apps.get_model('exercise', 'BodyComposition').objects.filter(user_id=user.pk)
+        self.assertEqual(list(rows.values_list('weight', flat=True)), [72])
+
+
+class BodyPartMigrationTests(TransactionTestCase):
+    codes = [('exercise', '0007_exerciseset_small_int_body_part_joint_type')]
+    legacy = [('exercise', '0005_exerciseset_body_part_code_joint_type_code')]
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_rollback_restores_string_codes(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.codes)
+        code_apps = executor.loader.project_state(self.codes).apps
+        user = code_apps.get_model('auth', 'User').objects.create(username='rollback')
+        exercise = code_apps.get_model('exercise', 'Exercise').objects.create(user_id=user.pk, name='Old', scheduled_date=date(2026, 1, 5))
+        CodeExerciseSet = code_apps.get_model('exercise', 'ExerciseSet')
+        for body_part, joint_type in ((1, 1), (3, 2), (7, 2)):
+            CodeExerciseSet.objects.create(
+                exercise_id=exercise.pk, exercise_name='Lift', sets=0, body_part=body_part, joint_type=joint_type
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.legacy)
+        legacy_apps = executor.loader.project_state(self.legacy).apps
+        rows = legacy_apps.get_model('exercise', 'ExerciseSet').objects.order_by('id').values_list('body_part', 'joint_type')
+        self.assertEqual(list(rows), [('1', '1'), ('3', '2'), ('7', '2')])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.codes)
+        rows = CodeExerciseSet.objects.order_by('id').values_list('body_part', 'joint_type')
+        self.assertEqual(list(rows), [(1, 1), (3, 2), (7, 2)])
+
+
+class ArchiveSyncTests(TestCase):
+    def test_archived_sets_stay_in_sync(self):
+        from .archive import archive_exercises
+        from .sync import changes_since
+
+        user = User.objects.create_user(username='archived')
+        exercise = Exercise.objects.create(user=user, name='Old', scheduled_date=date(2020, 1, 6))
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Row', sets=0)
+        detail = SetDetail.objects.create(exercise_set=exercise_set, reps=8, weight=40, actual_duration=30, rest_time=30)
+        before = changes_since(user)
+
+        archive_exercises([exercise.pk])
+        full = changes_since(user)
+        self.assertEqual([row['id'] for row in full['sets']], [exercise_set.pk])
+        self.assertEqual([row['id'] for row in full['details']], [detail.pk])
+        self.assertTrue(full['exercises'][0]['is_archived'])
+
+        # 封存會更新計劃的 updated_at，增量同步也會重新送出
+        incremental = changes_since(user, before['exercises'][0]['updated_at'])
+        self.assertEqual([row['id'] for row in incremental['exercises']], [exercise.pk])
+        self.assertEqual([row['id'] for row in incremental['details']], [detail.pk])
+
+
+class SyncTombstoneTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tombstone')
+        self.exercise = Exercise.objects.create(user=self.user, name='Legs', scheduled_date=date(2026, 10, 19))
+        self.exercise_set = ExerciseSet.objects.create(exercise=self.exercise, exercise_name='Squat', sets=0)
+        self.details = [
+            SetDetail.objects.create(exercise_set=self.exercise_set, reps=5, weight=100, actual_duration=30, rest_time=90)
+            for _ in range(2)
+        ]
+
+    def deleted(self):
+        from .sync import changes_since
+        return changes_since(self.user)['deleted']
+
+    def test_detail_queryset_delete(self):
+        SetDetail.objects.filter(pk__in=[detail.pk for detail in self.details]).delete()
+        self.assertCountEqual(self.deleted()['setdetail'], [detail.pk for detail in self.details])
+        self.assertEqual(list(self.deleted()), ['setdetail'])
+
+    def test_cascade_records_only_origin(self):
+        set_id, exercise_id = self.exercise_set.pk, self.exercise.pk
+        self.exercise_set.delete()
+        self.assertEqual(self.deleted(), {'exerciseset': [set_id]})
+
+        self.exercise.delete()
+        self.assertEqual(self.deleted(), {'exerciseset': [set_id], 'exercise': [exercise_id]})
+
+    def test_backfill_bumps_updated_at(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        ExerciseSet.objects.filter(pk=self.exercise_set.pk).update(catalog_id=None)
+        before = ExerciseSet.objects.get(pk=self.exercise_set.pk).updated_at
+        call_command('backfill_exercise_catalog', stdout=StringIO())
+        self.exercise_set.refresh_from_db()
+        self.assertIsNotNone(self.exercise_set.catalog_id)
+        self.assertGreater(self.exercise_set.updated_at, before)
+
+
+class SyncViewTests(TestCase):
+    url = '/fitness_api/exercise/sync/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync')
+        self.client = api_client(self.user)
+        self.exercise = Exercise.objects.create(user=self.user, name='Legs', scheduled_date=date(2026, 10, 19))
+
+    def test_parse_cursor(self):
+        from django.utils.timezone import get_current_timezone, is_aware
+        from .sync import parse_cursor
+
+        self.assertIsNone(parse_cursor(None))
+        self.assertIsNone(parse_cursor(''))
+        self.assertEqual(parse_cursor('2026-10-19T08:00:00Z'), datetime(2026, 10, 19, 8, tzinfo=timezone.utc))
+        self.assertEqual(parse_cursor('2026-10-19T16:00:00+08:00'), datetime(2026, 10, 19, 8, tzinfo=timezone.utc))
+        # 沒有時區的 cursor 視為伺服器時區
+        naive = parse_cursor('2026-10-19T08:00:00')
+        self.assertTrue(is_aware(naive))
+        self.assertEqual(naive.utcoffset(), datetime(2026, 10, 19, 8).astimezone(get_current_timezone()).utcoffset())
+        for value in ('yesterday', '2026-02-30T00:00:00'):
+            with self.assertRaises(ValueError, msg=value):
+                parse_cursor(value)
+
+    def test_invalid_cursor_returns_400(self):
+        for value in ('yesterday', '2026-02-30T00:00:00'):
+            response = self.client.get(self.url, {'since': value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('error', response.json())
+
+    def test_incremental_and_full_sync(self):
+        from django.utils.timezone import now
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.json()['full_sync'])
+        self.assertEqual([row['id'] for row in response.json()['exercises']], [self.exercise.pk])
+
+        cursor = response.json()['cursor']
+        Exercise.objects.filter(pk=self.exercise.pk).update(updated_at=now() - timedelta(minutes=1))
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['full_sync'])
+        self.assertEqual(response.json()['exercises'], [])
+
+    @override_settings(SYNC_TOMBSTONE_DAYS=30)
+    def test_cursor_older_than_tombstone_horizon_gets_full_sync(self):
+        from django.utils.timezone import now
+
+        Exercise.objects.filter(pk=self.exercise.pk).update(updated_at=now() - timedelta(days=40))
+        response = self.client.get(self.url, {'since': (now() - timedelta(days=31)).isoformat()})
+        self.assertTrue(response.json()['full_sync'])
+        self.assertEqual([row['id'] for row in response.json()['exercises']], [self.exercise.pk])
+
+        response = self.client.get(self.url, {'since': (now() - timedelta(days=29)).isoformat()})
+        self.assertFalse(response.json()['full_sync'])
+        self.assertEqual(response.json()['exercises'], [])
+
+
+class TotalDurationConcurrencyTests(TransactionTestCase):
+    THREADS = 4
+    WRITES = 10
+
+    def retry(self, func, retries=50):
+        # SQLite 同時寫入會出現 database (table) is locked，重試直到取得鎖
+        for attempt in range(retries + 1):
+            try:
+                return func()
+            except OperationalError:
+                if attempt == retries:
+                    raise
+                time.sleep(0.005 * (attempt + 1))
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        from django.db.models.signals import post_save
+        from .rollups import refresh_on_detail_save
+
+        user = User.objects.create_user(username='concurrent')
+        exercise = Exercise.objects.create(user=user, name='Circuit', scheduled_date=date(2026, 10, 19))
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Burpee', sets=0)
+        errors = []
+
+        def writer():
+            try:
+                local_exercise = self.retry(lambda: Exercise.objects.get(pk=exercise.pk))
+                for _ in range(self.WRITES):
+                    # 每筆 SetDetail 剛好 60 秒，total_duration 應等於寫入筆數
+                    self.retry(lambda: SetDetail.objects.create(
+                        exercise_set_id=exercise_set.pk, reps=10, weight=20, actual_duration=45, rest_time=15
+                    ))
+                    self.retry(local_exercise.update_total_duration)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.THREADS)]
+        # SetDetail 的 post_save 會在 autocommit 下立即重算 rollup，鎖定錯誤會讓 retry 重複新增已提交的資料
+        post_save.disconnect(sender=SetDetail, dispatch_uid='rollup_refresh_setdetail_save')
+        self.addCleanup(post_save.connect, refresh_on_detail_save, sender=SetDetail, dispatch_uid='rollup_refresh_setdetail_save')
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        exercise.refresh_from_db()
+        self.assertEqual(SetDetail.objects.filter(exercise_set=exercise_set).count(), self.THREADS * self.WRITES)
+        self.assertEqual(exercise.total_duration, self.THREADS * self.WRITES)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='x')
+        self.client.force_login(self.admin)
+        self.user = User.objects.create_user(username='lifter')
+
+    def plans(self, count, start=0):
+        exercises = Exercise.objects.bulk_create([
+            Exercise(user=self.user, name=f'Plan {i}', scheduled_date=date(2026, 10, 1) + timedelta(days=i % 20))
+            for i in range(start, start + count)
+        ])
+        sets = ExerciseSet.objects.bulk_create([
+            ExerciseSet(exercise=exercise, exercise_name='Squat', sets=1) for exercise in exercises
+        ])
+        SetDetail.objects.bulk_create([
+            SetDetail(exercise_set=exercise_set, reps=5, weight=100, actual_duration=30, rest_time=90) for exercise_set in sets
+        ])
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = ['/admin/exercise/exercise/', '/admin/exercise/exerciseset/', '/admin/exercise/setdetail/']
+        self.plans(3)
+        few = {url: self.changelist_queries(url) for url in urls}
+        self.plans(40, start=3)
+        self.assertEqual({url: self.changelist_queries(url) for url in urls}, few)
+
+    def test_inline_loads_at_most_max_rows(self):
+        from backend.admin_tools import BoundedInlineFormSet
+
+        exercise = Exercise.objects.create(user=self.user, name='Volume', scheduled_date=date(2026, 10, 19))
+        exercise_set = ExerciseSet.objects.create(exercise=exercise, exercise_name='Squat', sets=0)
+        SetDetail.objects.bulk_create([
+            SetDetail(exercise_set=exercise_set, reps=5, weight=100, actual_duration=30, rest_time=90)
+            for _ in range(BoundedInlineFormSet.max_rows + 10)
+        ])
+        response = self.client.get(f'/admin/exercise/exerciseset/{exercise_set.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), BoundedInlineFormSet.max_rows)
+
+    def test_catalog_search_is_normalized(self):
+        from .models import ExerciseCatalog
+
+        ExerciseCatalog.resolve(['Bench Press', 'Incline Bench Press'])
+        response = self.client.get('/admin/exercise/exercisecatalog/', {'q': '  BENCH  p'})
+        self.assertEqual([catalog.name for catalog in response.context['cl'].result_list], ['Bench Press'])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='paginator')
+        Exercise.objects.bulk_create([Exercise(user=user, name=f'Plan {i}', scheduled_date=date(2026, 10, 19)) for i in range(3)])
+
+    def postgres(self, reltuples=None):
+        fake = mock.MagicMock(vendor='postgresql')
+        fake.cursor.return_value.__enter__.return_value.fetchone.return_value = reltuples
+        return mock.patch('backend.admin_tools.connections', {'default': fake})
+
+    def count(self, queryset):
+        from backend.admin_tools import EstimatedCountPaginator
+        return EstimatedCountPaginator(queryset, 10).count
+
+    def test_exact_count_on_other_databases(self):
+        self.assertEqual(self.count(Exercise.objects.order_by('id')), 3)
+
+    def test_postgres_uses_estimates_above_threshold(self):
+        from backend.admin_tools import EXACT_COUNT_THRESHOLD
+
+        with self.postgres((EXACT_COUNT_THRESHOLD * 2.0,)):
+            self.assertEqual(self.count(Exercise.objects.order_by('id')), EXACT_COUNT_THRESHOLD * 2)
+        # 尚未 ANALYZE 或估計值很小時精確計算
+        for row in ((-1.0,), (10.0,), None):
+            with self.postgres(row):
+                self.assertEqual(self.count(Exercise.objects.order_by('id')), 3, row)
+
+        plan = json.dumps([{'Plan': {'Plan Rows': EXACT_COUNT_THRESHOLD + 1}}])
+        with self.postgres(), mock.patch('django.db.models.query.QuerySet.explain', return_value=plan) as explain:
+            self.assertEqual(self.count(Exercise.objects.filter(name='Plan 1').order_by('id')), EXACT_COUNT_THRESHOLD + 1)
+        explain.assert_called_once_with(format='json')
+
+
+class ReplicaCacheCheckTests(TestCase):
+    def test_replica_requires_shared_cache(self):
+        from backend.routers import check_replica_cache
+
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=local):
+            with mock.patch('backend.routers.replica_available', return_value=False):
+                self.assertEqual(check_replica_cache(), [])
+            with mock.patch('backend.routers.replica_available', return_value=True):
+                self.assertEqual([error.id for error in check_replica_cache()], ['backend.W001'])
+        with override_settings(CACHES=shared), mock.patch('backend.routers.replica_available', return_value=True):
+            self.assertEqual(check_replica_cache(), [])
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """
+    DATABASES 在 settings 載入時由環境變數決定，所以在子行程中以不同的環境變數重新載入
+    """
+    def load_databases(self, **env):
+        import importlib.util
+        import os
+        import subprocess
+
+        env = {**{k: v for k, v in os.environ.items() if not k.startswith('DB_')}, **env}
+        code = 'import json; from backend import settings; print(json.dumps(settings.DATABASES, default=str))'
+        result = subprocess.run(
+            [sys.executable, '-c', code], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        self.pool_available = bool(importlib.util.find_spec('psycopg') and importlib.util.find_spec('psycopg_pool'))
+        return json.loads(result.stdout)
+
+    def test_sqlite_with_replica(self):
+        databases = self.load_databases(DB_ENGINE='sqlite', DB_NAME='/tmp/a.sqlite3', DB_REPLICA_NAME='/tmp/b.sqlite3')
+        self.assertEqual(databases['default']['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(databases['default']['NAME'], '/tmp/a.sqlite3')
+        self.assertEqual(databases['replica']['NAME'], '/tmp/b.sqlite3')
+
+    def test_sqlite_without_replica(self):
+        self.assertNotIn('replica', self.load_databases(DB_ENGINE='sqlite'))
+
+    def test_postgresql_replica_copies_primary(self):
+        databases = self.load_databases(DB_NAME='fitness', DB_REPLICA_HOST='replica.internal', DB_POOL_MAX_SIZE='4')
+        default, replica = databases['default'], databases['replica']
+        self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(replica['HOST'], 'replica.internal')
+        self.assertEqual(replica['NAME'], 'fitness')
+        self.assertEqual(replica['PORT'], default['PORT'])
+        self.assertEqual(replica['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(replica['OPTIONS'], default['OPTIONS'])
+        if self.pool_available:
+            self.assertEqual(default['CONN_MAX_AGE'], 0)
+            self.assertEqual(default['OPTIONS']['pool']['max_size'], 4)
+        else:
+            self.assertEqual(default['CONN_MAX_AGE'], 60)
+            self.assertNotIn('pool', default['OPTIONS'])
+
+    def test_pool_can_be_disabled(self):
+        default = self.load_databases(DB_POOL='0', DB_CONN_MAX_AGE='30')['default']
+        self.assertEqual(default['CONN_MAX_AGE'], 30)
+        self.assertNotIn('pool', default['OPTIONS'])
+        self.assertNotIn('replica', self.load_databases())
+
+
+class ReplicaRouterTests(TestCase):
+    def test_only_allowed_reads_use_replica(self):
+        from backend.routers import ReplicaRouter, replica_reads
+
+        router = ReplicaRouter()
+        with mock.patch('backend.routers.replica_available', return_value=True):
+            self.assertEqual(Exercise.objects.all().db, 'default')
+            with replica_reads():
+                self.assertEqual(Exercise.objects.all().db, 'replica')
+                self.assertEqual(Exercise.objects.primary().db, 'default')
+                self.assertEqual(User.objects.all().db, 'default')
+                self.assertEqual(router.db_for_write(Exercise), 'default')
+        with mock.patch('backend.routers.replica_available', return_value=False), replica_reads():
+            # 沒有設定副本時維持主庫
+            self.assertEqual(Exercise.objects.all().db, 'default')
+
+
+REPLICA_CONFIGURED = 'replica' in settings.DATABASES
+
+
+@skipUnless(REPLICA_CONFIGURED, '以 DB_ENGINE=sqlite DB_REPLICA_NAME=/tmp/replica.sqlite3 執行測試')
+class ReplicaRoutingTests(TestCase):
+    """
+    以兩個 SQLite 資料庫驗證路由：副本中放入不同的資料，從返回內容判斷查詢走哪一個資料庫
+    """
+    # 沒有設定副本時測試會被略過，但 test runner 仍會為列出的資料庫執行檢查
+    databases = {'default', 'replica'} if REPLICA_CONFIGURED else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replica')
+        User.objects.using('replica').create(pk=self.user.pk, username='replica')
+        Exercise.objects.create(user=self.user, name='primary', scheduled_date=date(2026, 10, 19))
+        Exercise.objects.using('replica').create(user_id=self.user.pk, name='replica', scheduled_date=date(2026, 10, 19))
+        self.client = api_client(self.user)
+
+    def monthly_plan_names(self):
+        response = self.client.get('/fitness_api/exercise/monthly_plans/')
+        self.assertEqual(response.status_code, 200)
+        return [plan['name'] for plan in response.json()]
+
+    def test_replica_read_views_use_replica(self):
+        self.assertEqual(self.monthly_plan_names(), ['replica'])
+
+    def test_write_pins_user_to_primary(self):
+        reading = {'height': 170, 'weight': 70, 'measured_at': '2026-10-01T08:00:00Z'}
+        self.assertEqual(self.client.post('/fitness_api/exercise/body_composition/', reading, format='json').status_code, 201)
+        self.assertEqual(self.monthly_plan_names(), ['primary'])
+
+        cache.clear()
+        self.assertEqual(self.monthly_plan_names(), ['replica'])
+
+    def test_sync_and_primary_use_default(self):
+        from backend.routers import replica_reads
+
+        response = self.client.get('/fitness_api/exercise/sync/')
+        self.assertEqual([row['name'] for row in response.json()['exercises']], ['primary'])
+        with replica_reads():
+            self.assertEqual(list(Exercise.objects.values_list('name', flat=True)), ['replica'])
+            self.assertEqual(list(Exercise.objects.primary().values_list('name', flat=True)), ['primary'])
+
+
+class ProfilingMiddlewareTests(TestCase):
+    # 不在 REPLICA_READ_VIEWS 中的端點，設定副本時也只查詢主庫
+    url = '/fitness_api/exercise/sync/'
+
+    def get(self, client, sample_rate=0):
+        sampler = mock.MagicMock()
+        sampler.return_value.start.return_value.stop.return_value = {'a;b': 1}
+        with mock.patch('backend.middleware.StackSampler', sampler), \
+                mock.patch('backend.middleware.write_collapsed', return_value='/profiles/sync.txt'), \
+                override_settings(PROFILING_SAMPLE_RATE=sample_rate):
+            response = client.get(self.url, HTTP_X_PROFILE='1')
+        return response, sampler.called
+
+    def test_only_staff_can_request_profile(self):
+        for client in (APIClient(), api_client(User.objects.create_user(username='member'))):
+            response, started = self.get(client)
+            self.assertFalse(started)
+            self.assertNotIn('X-Profile-File', response)
+
+        response, started = self.get(api_client(User.objects.create_user(username='staff', is_staff=True)))
+        self.assertTrue(started)
+        self.assertEqual(response['X-Profile-File'], 'sync.txt')
+
+    def test_random_sample_does_not_return_file_name(self):
+        response, started = self.get(api_client(User.objects.create_user(username='sampled')), sample_rate=1)
+        self.assertTrue(started)
+        self.assertNotIn('X-Profile-File', response)
+
+
+class WarmUpTests(TransactionTestCase):
+    def test_warm_up_runs_on_sqlite(self):
+        from backend.warmup import warm_up
+        from .catalog import catalog_index
+
+        self.addCleanup(catalog_index.reset)
+        with self.assertNoLogs('backend.warmup', level='WARNING'):
+            timings = warm_up()
+        self.assertEqual([name for name, _ in timings[:2]], ['urls', 'translations'])
+        self.assertIn('exercise', [name for name, _ in timings])
+
+    def test_exercise_warms_choice_labels(self):
+        from django.apps import apps as django_apps
+        from .catalog import catalog_index
+        from .models import ExerciseSet
+
+        self.addCleanup(catalog_index.reset)
+        with mock.patch('backend.warmup.warm_labels') as warm_labels:
+            django_apps.get_app_config('exercise').warm_up()
+        labels = warm_labels.call_args.args
+        self.assertIn(Exercise.GOAL_CHOICES[1], labels)
+        self.assertIn(ExerciseSet.JOINT_TYPE_CHOICES[2], labels)
+
+
+class IdempotencyTests(TestCase):
+    url = '/fitness_api/exercise/create_exercise_plan/'
+
+    def setUp(self):
+        from .models import ExerciseType
+
+        ExerciseType.objects.create(id=1, name='重量訓練')
+        self.client = api_client(User.objects.create_user(username='idempotent'))
+
+    def payload(self, name='Push'):
+        return {
+            'name': name, 'goal': 1, 'scheduled_date': '2026-10-20', 'exercise_type': [1],
+            'sets': [{'exercise_name': 'Bench', 'body_part': 1, 'joint_type': 2, 'sets': 1,
+                      'details': [{'reps': 10, 'weight': 60, 'actual_duration': 40, 'rest_time': 60}]}],
+        }
+
+    def post(self, data, key):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_and_conflicting_body(self):
+        first = self.post(self.payload(), 'plan-1')
+        self.assertEqual(first.status_code, 201)
+        replayed = self.post(self.payload(), 'plan-1')
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(Exercise.objects.count(), 1)
+
+        self.assertEqual(self.post(self.payload('Pull'), 'plan-1').status_code, 422)
+
+    def test_validation_error_is_stored(self):
+        invalid = {**self.payload(), 'scheduled_date': 'not-a-date'}
+        first = self.post(invalid, 'plan-2')
+        self.assertEqual(first.status_code, 400)
+        replayed = self.post(invalid, 'plan-2')
+        self.assertEqual(replayed.status_code, 400)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.post(self.payload(), 'plan-2').status_code, 422)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes_and_stay_within_budgets(self):
+        from .query_plans import check_all
+
+        # 查詢預算只計算 default 連線；測試的副本是另一個空的資料庫
+        with mock.patch('backend.routers.replica_available', return_value=False):
+            _, plan_problems, budget_results = check_all(users=5, plans_per_user=10, host='testserver')
+        self.assertEqual({name: failed for name, failed in plan_problems.items() if failed}, {})
+        self.assertEqual({name: failed for name, (_, failed) in budget_results.items() if failed}, {})
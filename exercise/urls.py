@@ -1,11 +1,20 @@
 from django.urls import path
-from .views import MonthlyPlansView, WeeklyPlansView, BodyCompositionDetailView, CreateExercisePlanView, TemplateListView, TemplateDetailView, CreateFromTemplateView
+from .views import MonthlyPlansView, WeeklyPlansView, BodyCompositionDetailView, CreateExercisePlanView, TemplateListView, TemplateDetailView, CreateFromTemplateView, SyncView, ExerciseDetailView, CatalogAutocompleteView, CalendarView, CalendarICSView, BodyCompositionBatchView, RecomputeCaloriesView, GeneratePlanView, LeaderboardView
 
 urlpatterns = [
     path('monthly_plans/', MonthlyPlansView.as_view(), name='monthly-plans'),
     path('weekly_plans/', WeeklyPlansView.as_view(), name='weekly-plans'),    
+    path('calendar/', CalendarView.as_view(), name='calendar'),
+    path('calendar.ics', CalendarICSView.as_view(), name='calendar-ics'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('create_exercise_plan/', CreateExercisePlanView.as_view(), name='create-exercise-plan'),
+    path('exercises/<int:pk>/', ExerciseDetailView.as_view(), name='exercise-detail'),
     path('body_composition/', BodyCompositionDetailView.as_view(), name='body-composition'),
+    path('body_composition/batch/', BodyCompositionBatchView.as_view(), name='body-composition-batch'),
+    path('generate_plan/', GeneratePlanView.as_view(), name='generate-plan'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('recompute_calories/', RecomputeCaloriesView.as_view(), name='recompute-calories'),
+    path('catalog/autocomplete/', CatalogAutocompleteView.as_view(), name='catalog-autocomplete'),
     path('templates/', TemplateListView.as_view(), name='template_list'),
     path('templates/<int:template_id>/', TemplateDetailView.as_view(), name='template_detail'),
     path('templates/<int:template_id>/create/', CreateFromTemplateView.as_view(), name='create_from_template'),
@@ -1,30 +1,49 @@
 from django.forms import ValidationError
+from django.http import StreamingHttpResponse
 from rest_framework import status, generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from django.utils.timezone import now
-from datetime import timedelta
-from .models import Exercise, BodyComposition, ExerciseSet, SetDetail, Template, save_as_template, create_from_template
-from .serializers import ExerciseSerializer, BodyCompositionSerializer, TemplateSerializer
+from rest_framework.settings import api_settings
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+from .models import Exercise, ExerciseSet, SetDetail, Template, WeeklyRollup, save_as_template, create_from_template
+from .serializers import ExerciseSerializer, BodyCompositionSerializer, BodyCompositionBatchSerializer, TemplateSerializer, GeneratePlanSerializer
+from .renderers import ColumnarJSONRenderer, ColumnarBinaryRenderer
+from .columnar import build_plan_columns
+from .sync import changes_since, parse_cursor
+from .catalog import catalog_index
+from .queries import latest_body_composition_queryset, monthly_plans_queryset, user_plans, weekly_plans_queryset
+from .schedule import calendar_days, iter_ical, parse_range, scheduled_plans
+from .overload import generate_next_week, next_week_start
+from .idempotency import idempotent
+from .rollups import LEADERBOARD_METRICS, leaderboard, user_rank, week_start_of
+from backend.routers import read_alias
+from jobs.registry import enqueue
+from jobs.views import job_accepted, prefers_async
+
+# 計劃歷史端點額外支援欄位式格式，由 Accept header 協商
+PLAN_RENDERER_CLASSES = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer, ColumnarBinaryRenderer]
+
+
+def wants_columnar(request):
+    return getattr(request.accepted_renderer, 'columnar', False)
 
 class MonthlyPlansView(APIView):
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = PLAN_RENDERER_CLASSES
 
     def get(self, request):
         """
         返回當前用戶最近一個月的運動計劃
         """
-        user = request.user
-        one_month_ago = now() - timedelta(days=30)
-        
+        monthly_plans = monthly_plans_queryset(request.user)
+
+        if wants_columnar(request):
+            return Response(build_plan_columns(monthly_plans))
+
         # 使用 prefetch_related 來優化數據庫查詢，獲取 ExerciseSet 和 SetDetail
-        monthly_plans = Exercise.objects.filter(
-            user=user,
-            created_at__gte=one_month_ago
-        ).prefetch_related('sets__details')
+        monthly_plans = monthly_plans.prefetch_related('sets__details', 'exercise_type')
         
         # 序列化數據
         serializer = ExerciseSerializer(monthly_plans, many=True)
@@ -36,21 +55,20 @@ class MonthlyPlansView(APIView):
             return Response([])
 
 class WeeklyPlansView(APIView):
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = PLAN_RENDERER_CLASSES
 
     def get(self, request):
         """
         返回當前用戶最近一周的運動計劃
         """
-        user = request.user
-        one_week_ago = now() - timedelta(days=7)
-        
+        weekly_plans = weekly_plans_queryset(request.user)
+
+        if wants_columnar(request):
+            return Response(build_plan_columns(weekly_plans))
+
         # 使用 prefetch_related 來優化數據庫查詢，獲取 ExerciseSet 和 SetDetail
-        weekly_plans = Exercise.objects.filter(
-            user=user,
-            created_at__gte=one_week_ago
-        ).prefetch_related('sets__details')
+        weekly_plans = weekly_plans.prefetch_related('sets__details', 'exercise_type')
         
         # 序列化數據
         serializer = ExerciseSerializer(weekly_plans, many=True)
@@ -61,11 +79,79 @@ class WeeklyPlansView(APIView):
         else:
             return Response([])
 
+class SyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        返回 since 之後有變動的運動計劃、組數、細節與身體組成數據，以及刪除紀錄
+        """
+        try:
+            since = parse_cursor(request.query_params.get('since'))
+        except ValueError:
+            return Response({'error': 'since 格式錯誤，應為 ISO 8601 時間'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(changes_since(request.user, since))
+
+class CalendarView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        返回當前用戶在 start ~ end（含）之間依日期分組的運動計劃，不含 sets / details
+        """
+        try:
+            start, end = parse_range(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(calendar_days(request.user, start, end))
+
+class CalendarICSView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        以 iCalendar 格式串流匯出 start ~ end（含）之間的運動計劃
+        """
+        try:
+            start, end = parse_range(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if prefers_async(request):
+            job = enqueue('exercise.export_calendar', user=request.user, start=start.isoformat(), end=end.isoformat())
+            return job_accepted(request, job)
+
+        # 串流內容在 middleware 結束後才產生，這裡先決定要讀取的資料庫
+        plans = scheduled_plans(request.user, start, end).using(read_alias())
+        response = StreamingHttpResponse(iter_ical(plans), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="exercise-{start:%Y%m%d}-{end:%Y%m%d}.ics"'
+        return response
+
+class CatalogAutocompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        依輸入的前綴返回運動項目目錄的自動完成結果
+        """
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            return Response({'error': 'limit 必須是數字'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = catalog_index.search(request.query_params.get('q', ''), limit)
+        return Response([{'id': catalog_id, 'name': name} for catalog_id, name in results])
+
 class CreateExercisePlanView(generics.CreateAPIView):
     serializer_class = ExerciseSerializer
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         # 在保存計劃時自動將當前用戶設為計劃的擁有者
         serializer.save(user=self.request.user)
@@ -74,8 +160,17 @@ class CreateExercisePlanView(generics.CreateAPIView):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+class ExerciseDetailView(generics.RetrieveUpdateAPIView):
+    """
+    查詢或更新單一運動計劃；更新時只寫入有變動的 sets / details
+    """
+    serializer_class = ExerciseSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return user_plans(self.request.user).prefetch_related('sets__details', 'exercise_type')
+
 class BodyCompositionDetailView(APIView):
-    authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -84,7 +179,7 @@ class BodyCompositionDetailView(APIView):
         """
         user = request.user
         # 獲取當前用戶的最新身體狀態數據
-        body_composition = BodyComposition.objects.filter(user=user).order_by('-measured_at').first()
+        body_composition = latest_body_composition_queryset(user).first()
 
         if body_composition:
             serializer = BodyCompositionSerializer(body_composition)
@@ -92,6 +187,7 @@ class BodyCompositionDetailView(APIView):
         else:
             return Response({})
         
+    @idempotent
     def post(self, request):
         """
         創建或更新當前用戶的身體組成數據
@@ -106,9 +202,27 @@ class BodyCompositionDetailView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+class BodyCompositionBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        批次上傳多筆身體組成數據（例如智慧體重計同步），以量測時間去重
+        """
+        serializer = BodyCompositionBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        unique = serializer.save(user=request.user)
+        return Response(
+            {'received': len(serializer.validated_data['readings']), 'unique': unique},
+            status=status.HTTP_201_CREATED,
+        )
+    
 class TemplateListView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         """
         創建計劃模板
@@ -185,13 +299,117 @@ class TemplateDetailView(APIView):
 
 class CreateFromTemplateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # 超過此數量的日期改為背景工作
+    ASYNC_DATE_THRESHOLD = 7
 
+    @idempotent
     def post(self, request, template_id):
         """
-        使用模板創建新的運動計劃
+        使用模板創建新的運動計劃，可在 scheduled_dates 指定多個日期（預設為今天）；
+        日期較多或客戶端送出 Prefer: respond-async 時排入背景工作並返回 202
         """
-        try:
-            new_exercises = create_from_template(template_id, request.user)
-            return Response({'message': '成功創建運動計劃'}, status=status.HTTP_201_CREATED)
-        except Template.DoesNotExist:
+        scheduled_dates = []
+        for value in request.data.get('scheduled_dates') or []:
+            try:
+                scheduled_date = parse_date(str(value))
+            except ValueError:
+                scheduled_date = None
+            if scheduled_date is None:
+                return Response({'error': '日期格式錯誤'}, status=status.HTTP_400_BAD_REQUEST)
+            scheduled_dates.append(scheduled_date)
+        scheduled_dates = scheduled_dates or [localdate()]
+
+        if not Template.objects.filter(id=template_id).exists():
             return Response({'error': '模板不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+        if prefers_async(request) or len(scheduled_dates) > self.ASYNC_DATE_THRESHOLD:
+            job = enqueue(
+                'exercise.create_from_template', user=request.user, template_id=template_id,
+                scheduled_dates=[scheduled_date.isoformat() for scheduled_date in scheduled_dates],
+            )
+            return job_accepted(request, job)
+
+        new_exercises = create_from_template(template_id, request.user, scheduled_dates)
+        return Response(
+            {'message': '成功創建運動計劃', 'exercise_ids': [exercise.id for exercise in new_exercises]},
+            status=status.HTTP_201_CREATED,
+        )
+
+class RecomputeCaloriesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        以最新體重在背景重新計算所有運動計劃的熱量消耗
+        """
+        job = enqueue('exercise.recompute_calories', user=request.user)
+        return job_accepted(request, job)
+
+class GeneratePlanView(APIView):
+    permission_classes = [IsAuthenticated]
+    # 批次產生超過此人數時改為背景工作
+    ASYNC_USER_THRESHOLD = 20
+
+    def post(self, request):
+        """
+        依最近幾週的紀錄以漸進式超負荷產生下週的運動計劃；staff 可以 user_ids 一次為多位使用者產生。
+        目前沒有教練與學員的對應資料，staff 視為管理員（與背景工作、媒體檔案的權限相同），可以為任何使用者產生
+        """
+        serializer = GeneratePlanSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        if 'user_ids' in data and not request.user.is_staff:
+            return Response({'error': '只有教練可以為其他使用者產生計劃'}, status=status.HTTP_403_FORBIDDEN)
+        user_ids = data.get('user_ids') or [request.user.pk]
+        week_start = data.get('week_start') or next_week_start()
+
+        if prefers_async(request) or len(user_ids) > self.ASYNC_USER_THRESHOLD:
+            job = enqueue(
+                'exercise.generate_plans', user=request.user, user_ids=user_ids, week_start=week_start.isoformat(),
+                weeks=data['weeks'], dates=[value.isoformat() for value in data.get('dates', [])],
+            )
+            return job_accepted(request, job)
+
+        new_exercises = generate_next_week(user_ids, week_start, data['weeks'], data.get('dates'))
+        return Response(
+            {'week_start': week_start, 'created': len(new_exercises), 'exercise_ids': [exercise.id for exercise in new_exercises]},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class LeaderboardView(APIView):
+    permission_classes = [IsAuthenticated]
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        """
+        返回指定週（預設本週）的排行榜：metric 為 volume / minutes / calories，goal 可篩選運動目標
+        """
+        metric = f"total_{request.query_params.get('metric', 'volume')}"
+        try:
+            goal = int(request.query_params.get('goal', WeeklyRollup.ALL_GOALS))
+            limit = min(int(request.query_params.get('limit', 20)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'goal 與 limit 必須為整數'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # 格式正確但不存在的日期（例如 2026-02-30）會拋出 ValueError，與格式錯誤一樣處理
+            week = parse_date(request.query_params['week']) if request.query_params.get('week') else localdate()
+        except ValueError:
+            week = None
+        if week is None:
+            return Response({'error': '日期格式錯誤'}, status=status.HTTP_400_BAD_REQUEST)
+        if metric not in LEADERBOARD_METRICS:
+            return Response({'error': 'metric 必須為 volume、minutes 或 calories'}, status=status.HTTP_400_BAD_REQUEST)
+        if goal != WeeklyRollup.ALL_GOALS and goal not in Exercise.GOAL_CHOICES:
+            return Response({'error': '無效的運動目標'}, status=status.HTTP_400_BAD_REQUEST)
+
+        week_start = week_start_of(week)
+        return Response({
+            'week_start': week_start,
+            'metric': metric,
+            'goal': goal,
+            'entries': leaderboard(week_start, metric, goal, max(limit, 1), viewer_id=request.user.pk),
+            'me': user_rank(request.user.pk, week_start, metric, goal),
+        })
@@ -0,0 +1,39 @@
+import signal
+import time
+from django.core.management.base import BaseCommand
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = '執行背景工作佇列（可同時啟動多個 worker）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help='cpu_bound 工作的 process pool 大小，預設為 CPU 數量')
+        parser.add_argument('--batch-size', type=int, default=10, help='每次領取的工作數量')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='佇列為空時的等待秒數')
+        parser.add_argument('--once', action='store_true', help='處理完目前佇列中的工作後結束')
+
+    def handle(self, *args, **options):
+        worker = Worker(processes=options['processes'], batch_size=options['batch_size'])
+        self.stopping = False
+
+        def stop(signum, frame):
+            # 處理完目前這一批工作後再結束
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'worker {worker.name} 已啟動')
+        processed = 0
+        try:
+            while not self.stopping:
+                count = worker.run_once()
+                processed += count
+                if count == 0:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        finally:
+            worker.close()
+        self.stdout.write(self.style.SUCCESS(f'worker {worker.name} 結束，共處理 {processed} 筆工作'))
@@ -0,0 +1,38 @@
+"""
+背景工作的註冊與排入佇列
+
+    @job('exercise.recompute_calories')
+    def recompute_calories(job):
+        ...
+
+    enqueue('exercise.recompute_calories', user=request.user, exercise_ids=[...])
+
+cpu_bound=True 的工作會交給 worker 的 process pool 執行，其餘在 worker 主程序內依序執行。
+handler 的返回值必須可以序列化為 JSON，會寫入 Job.result。
+"""
+from collections import namedtuple
+
+from .models import Job
+
+JobHandler = namedtuple('JobHandler', ['func', 'cpu_bound', 'max_attempts'])
+
+_handlers = {}
+
+
+def job(name, cpu_bound=False, max_attempts=3):
+    def register(func):
+        _handlers[name] = JobHandler(func, cpu_bound, max_attempts)
+        return func
+    return register
+
+
+def get_handler(name):
+    return _handlers[name]
+
+
+def enqueue(name, user=None, **payload):
+    """
+    建立一筆待執行的 Job；在交易中呼叫時，worker 要等交易提交後才看得到
+    """
+    handler = get_handler(name)
+    return Job.objects.create(name=name, user=user, payload=payload, max_attempts=handler.max_attempts)
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'result', 'error', 'run_after', 'created_at', 'updated_at']
+        read_only_fields = fields
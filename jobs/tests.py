@@ -0,0 +1,93 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .models import Job
+from .registry import enqueue, job
+from .worker import LOCK_TIMEOUT, Worker, claim
+
+
+@job('jobs.tests.fail', max_attempts=2)
+def always_fail(job):
+    raise RuntimeError('boom')
+
+
+class ClaimTests(TestCase):
+    def create_jobs(self, count, **fields):
+        return [Job.objects.create(name='jobs.tests.fail', **fields) for _ in range(count)]
+
+    def test_compare_and_set_claim(self):
+        jobs = self.create_jobs(3)
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False):
+            first = claim('worker-a', 2)
+            second = claim('worker-b', 10)
+            third = claim('worker-c', 10)
+        self.assertEqual([job.pk for job in first], [job.pk for job in jobs[:2]])
+        self.assertEqual([job.pk for job in second], [jobs[2].pk])
+        self.assertEqual(third, [])
+        self.assertEqual({job.locked_by for job in first}, {'worker-a'})
+        self.assertEqual({job.attempts for job in first + second}, {1})
+
+    def test_claim_skips_future_jobs(self):
+        self.create_jobs(1, run_after=now() + timedelta(minutes=5))
+        self.assertEqual(claim('worker-a', 10), [])
+
+    def test_stale_running_job_is_reclaimed_until_max_attempts(self):
+        stale = now() - LOCK_TIMEOUT - timedelta(minutes=1)
+        retry, exhausted = (
+            Job.objects.create(name='jobs.tests.fail', status=Job.RUNNING, locked_at=stale, attempts=attempts, max_attempts=3)
+            for attempts in (1, 3)
+        )
+        self.assertEqual([job.pk for job in claim('worker-a', 10)], [retry.pk])
+
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, Job.FAILED)
+        self.assertEqual(exhausted.attempts, 3)
+        self.assertIsNone(exhausted.locked_at)
+
+    def test_recently_locked_job_is_not_reclaimed(self):
+        self.create_jobs(1, status=Job.RUNNING, locked_at=now())
+        self.assertEqual(claim('worker-a', 10), [])
+
+
+class RetryTests(TestCase):
+    def test_failure_backs_off_then_fails(self):
+        queued = enqueue('jobs.tests.fail')
+        worker = Worker()
+        started = now()
+        self.assertEqual(worker.run_once(), 1)
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('RuntimeError: boom', queued.error)
+        # 第 1 次失敗後等待 2^1 * 10 秒
+        self.assertGreaterEqual(queued.run_after, started + timedelta(seconds=20))
+        self.assertEqual(worker.run_once(), 0)
+
+        Job.objects.filter(pk=queued.pk).update(run_after=now())
+        self.assertEqual(worker.run_once(), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+
+class JobDetailViewTests(TestCase):
+    def test_other_users_job_is_not_found(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+
+        owner, other = User.objects.create_user(username='owner'), User.objects.create_user(username='other')
+        queued = enqueue('jobs.tests.fail', user=owner)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/fitness_api/jobs/{queued.pk}/').status_code, 404)
+        self.assertEqual(client.get('/fitness_api/jobs/').json(), [])
+
+        client.force_authenticate(owner)
+        response = client.get(f'/fitness_api/jobs/{queued.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], Job.PENDING)
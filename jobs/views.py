@@ -0,0 +1,46 @@
+from django.urls import reverse
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .models import Job
+from .serializers import JobSerializer
+
+
+def prefers_async(request):
+    """
+    客戶端送出 Prefer: respond-async (RFC 7240) 時改為排入背景工作
+    """
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def job_accepted(request, job):
+    """
+    返回 202 與工作狀態的網址
+    """
+    url = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+    return Response(
+        {'job_id': job.pk, 'status': job.status, 'status_url': url},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': url},
+    )
+
+
+class JobListView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        """
+        返回當前用戶最近的 50 筆工作
+        """
+        return Job.objects.filter(user=self.request.user).order_by('-created_at')[:50]
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Job.objects.all()
+        return Job.objects.filter(user=self.request.user)
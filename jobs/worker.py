@@ -0,0 +1,147 @@
+"""
+領取與執行 Job
+
+PostgreSQL 以 SELECT ... FOR UPDATE SKIP LOCKED 領取，多個 worker 不會互相等待；
+不支援 SKIP LOCKED 的資料庫（SQLite）改以帶條件的 UPDATE 逐筆搶佔 (compare-and-set)。
+worker 中途結束時，超過 LOCK_TIMEOUT 仍停在 running 的工作會被重新領取（計入 attempts）；
+已達 max_attempts 的不再領取，由 fail_stale_jobs 標記為 failed。
+"""
+import os
+import socket
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.db import connection, connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .models import Job
+from .registry import get_handler
+
+LOCK_TIMEOUT = timedelta(minutes=30)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claimable_jobs():
+    current = now()
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=current)
+        | Q(status=Job.RUNNING, locked_at__lt=current - LOCK_TIMEOUT, attempts__lt=F('max_attempts'))
+    ).order_by('run_after', 'id')
+
+
+def fail_stale_jobs():
+    """
+    停在 running 超過 LOCK_TIMEOUT 且已達重試上限的工作標記為 failed，返回筆數
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now() - LOCK_TIMEOUT, attempts__gte=F('max_attempts')
+    ).update(
+        status=Job.FAILED, error='worker 中斷，已達重試上限', locked_at=None, locked_by='', updated_at=now(),
+    )
+
+
+def claim(worker, limit):
+    """
+    將最多 limit 筆可執行的工作標記為 running 並返回
+    """
+    fail_stale_jobs()
+    current = now()
+    claimed = dict(
+        status=Job.RUNNING, locked_at=current, locked_by=worker,
+        attempts=F('attempts') + 1, updated_at=current,
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_ids = list(claimable_jobs().select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=job_ids).update(**claimed)
+    else:
+        job_ids = []
+        for job_id in claimable_jobs().values_list('id', flat=True)[:limit]:
+            # 其他 worker 已領走的工作不再符合條件，UPDATE 會返回 0
+            if claimable_jobs().filter(id=job_id).update(**claimed):
+                job_ids.append(job_id)
+    return list(Job.objects.filter(id__in=job_ids).order_by('id'))
+
+
+def run(job):
+    """
+    執行 handler，返回 (result, error)；error 為 traceback 字串
+    """
+    try:
+        return get_handler(job.name).func(job), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _run_in_process(job):
+    try:
+        return run(job)
+    finally:
+        connections.close_all()
+
+
+def finish(job, result=None, error=None):
+    """
+    寫回執行結果；失敗且尚有重試次數時以指數退避重新排程
+    """
+    if error is None:
+        job.status, job.result, job.error = Job.SUCCEEDED, result, ''
+    elif job.attempts < job.max_attempts:
+        job.status, job.run_after, job.error = Job.PENDING, now() + job.retry_delay(), error
+    else:
+        job.status, job.error = Job.FAILED, error
+    job.locked_at, job.locked_by = None, ''
+    job.save(update_fields=['status', 'result', 'error', 'run_after', 'locked_at', 'locked_by', 'updated_at'])
+
+
+class Worker:
+    def __init__(self, processes=None, batch_size=10):
+        self.name = worker_name()
+        self.processes = processes
+        self.batch_size = batch_size
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # fork 出的子程序不能沿用父程序的資料庫連線，先全部關閉，子程序會各自重新連線
+            connections.close_all()
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, initializer=django.setup)
+        return self._pool
+
+    def run_once(self):
+        """
+        領取一批工作：一般工作依序在本程序執行，cpu_bound 的工作交給 process pool 並行執行
+        """
+        jobs = claim(self.name, self.batch_size)
+        futures = []
+        for job in jobs:
+            try:
+                handler = get_handler(job.name)
+            except KeyError:
+                finish(job, error=f'未註冊的工作：{job.name}')
+                continue
+            if handler.cpu_bound:
+                futures.append((job, self.pool.submit(_run_in_process, job)))
+            else:
+                finish(job, *run(job))
+        for job, future in futures:
+            try:
+                result, error = future.result()
+            except Exception:
+                # 子程序異常結束 (BrokenProcessPool) 等情況
+                result, error = None, traceback.format_exc()
+                self.close()
+            finish(job, result, error)
+        return len(jobs)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
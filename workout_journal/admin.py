@@ -1,8 +1,21 @@
 from django.contrib import admin
+from django.db import connections
+from backend.admin_tools import LargeTableAdmin
 from .models import WorkoutJournalEntry
+from .search import search_entries
 
 # Register your models here.
 @admin.register(WorkoutJournalEntry)
-class WorkoutJournalEntryAdmin(admin.ModelAdmin):
-    list_display = ('title', 'created_at', 'updated_at')
-    search_fields = ('title', 'content')
\ No newline at end of file
+class WorkoutJournalEntryAdmin(LargeTableAdmin):
+    list_display = ('title', 'word_count', 'created_at', 'updated_at')
+    date_hierarchy = 'created_at'
+    search_fields = ('title',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        PostgreSQL 上以全文檢索 (GIN 索引 workout_journal_search_idx) 搜尋標題與純文字內容，
+        其他資料庫只搜尋標題
+        """
+        if not search_term or connections[queryset.db].vendor != 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+        return search_entries(queryset, search_term), False
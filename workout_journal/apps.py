@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class WorkoutJournalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workout_journal'
+    # 日誌圖片與縮小版本，見 backend/media.py
+    media_prefix = 'journal/'
+
+    def can_access_media(self, user, path):
+        """
+        日誌沒有擁有者，與日誌 API 相同，已登入的使用者可以讀取仍屬於某篇日誌的圖片
+        """
+        from .media import original_name
+        from .models import JournalImage
+
+        return any(
+            path == journal_image.image.name or path in journal_image.variants.values()
+            for journal_image in JournalImage.objects.filter(image__in={path, original_name(path)})
+        )
+
+    def warm_up(self):
+        """
+        建立日誌 serializer 的欄位，見 backend/warmup.py
+        """
+        from backend.warmup import warm_serializers
+        from .serializers import WorkoutJournalEntrySerializer
+
+        warm_serializers(WorkoutJournalEntrySerializer)
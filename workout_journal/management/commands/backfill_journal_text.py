@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from workout_journal.models import WorkoutJournalEntry
+
+
+class Command(BaseCommand):
+    help = '為既有的日誌分批計算 body_text / word_count / excerpt'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.0, help='每個批次之間暫停的秒數')
+        parser.add_argument('--all', action='store_true', help='重新計算所有日誌，預設只處理尚未計算的')
+
+    def handle(self, *args, **options):
+        entries = WorkoutJournalEntry.objects.primary().only('id', 'content')
+        if not options['all']:
+            entries = entries.filter(body_text='').exclude(content='')
+
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(entries.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            for entry in batch:
+                entry.update_text()
+                entry.updated_at = now()  # bulk_update 不會更新 auto_now 欄位
+            WorkoutJournalEntry.objects.bulk_update(batch, ['body_text', 'word_count', 'excerpt', 'updated_at'])
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'processed up to id {last_id}, {updated} entries updated')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'done: {updated} entries updated'))
@@ -0,0 +1,79 @@
+"""
+日誌圖片：上傳時以 Pillow 產生縮小版本，之後只提供靜態檔案
+
+JPEG 以 Image.draft 在解碼時直接縮小（DCT scaling），不需要先解碼整張原圖。
+"""
+import io
+import os
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 4},
+    'PNG': {'optimize': True},
+}
+
+
+def variant_name(name, width):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}_{width}w{ext}'
+
+
+# variant_name 加上的 _<寬度>w，以及檔名重複時 storage 加上的 _<7 個隨機字元>
+VARIANT_SUFFIX_RE = re.compile(r'_\d+w(_[a-zA-Z0-9]{7})?(?=\.[^./]*$|$)')
+
+
+def original_name(name):
+    """
+    縮小版本的檔名還原為原圖的檔名（原圖本身返回不變）
+    """
+    return VARIANT_SUFFIX_RE.sub('', name)
+
+
+def generate_variants(journal_image):
+    """
+    為每個比原圖窄的 JOURNAL_IMAGE_WIDTHS 產生一個版本，已存在的版本不會重新產生
+    """
+    variants = dict(journal_image.variants)
+    widths = [
+        width for width in settings.JOURNAL_IMAGE_WIDTHS
+        if width < journal_image.width and str(width) not in variants
+    ]
+    if not widths:
+        return variants
+
+    with journal_image.image.open('rb') as source, Image.open(source) as original:
+        image_format = original.format
+        # 依最大的版本縮小解碼（長寬都不小於該寬度，旋轉後仍然足夠），之後的版本都從這張圖繼續縮小
+        original.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(original)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        for width in sorted(widths, reverse=True):
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format, **SAVE_OPTIONS.get(image_format, {}))
+            variants[str(width)] = default_storage.save(
+                variant_name(journal_image.image.name, width), ContentFile(buffer.getvalue())
+            )
+
+    journal_image.variants = variants
+    journal_image.save(update_fields=['variants'])
+    return variants
+
+
+def delete_image_files(journal_images):
+    """
+    刪除原圖與所有縮小版本的檔案（資料列由呼叫端刪除）
+    """
+    for journal_image in journal_images:
+        for name in [journal_image.image.name, *journal_image.variants.values()]:
+            if name:
+                default_storage.delete(name)
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout_journal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workoutjournalentry',
+            index=models.Index(fields=['created_at'], name='workout_jou_created_af045f_idx'),
+        ),
+    ]
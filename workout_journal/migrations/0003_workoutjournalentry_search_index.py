@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# 與 workout_journal.search 相同的索引名稱與運算式；migration 不匯入應用程式的模組，
+# 之後修改 search.py 不會改變已發布 migration 的結果
+SEARCH_INDEX_NAME = 'workout_journal_search_idx'
+
+
+def add_search_index(apps, schema_editor):
+    # GIN 全文檢索索引只在 PostgreSQL 建立
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    model = apps.get_model('workout_journal', 'WorkoutJournalEntry')
+    schema_editor.add_index(model, GinIndex(SearchVector('title', 'content', config='simple'), name=SEARCH_INDEX_NAME))
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workout_journal', '0002_workoutjournalentry_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
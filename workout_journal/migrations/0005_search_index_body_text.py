@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# 與 workout_journal.search 相同的索引名稱與運算式，見 0003
+SEARCH_INDEX_NAME = 'workout_journal_search_idx'
+
+
+def reindex(*fields):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        model = apps.get_model('workout_journal', 'WorkoutJournalEntry')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX_NAME}')
+        schema_editor.add_index(model, GinIndex(SearchVector(*fields, config='simple'), name=SEARCH_INDEX_NAME))
+    return apply
+
+
+class Migration(migrations.Migration):
+    """
+    全文檢索索引改為使用純文字內容 (body_text)
+    """
+
+    dependencies = [
+        ('workout_journal', '0004_journal_text_and_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex('title', 'body_text'), reindex('title', 'content')),
+    ]
@@ -1,10 +1,53 @@
 from django.db import models
+from backend.routers import ReplicaQuerySet
+from .text import EXCERPT_LENGTH, count_words, html_to_text, make_excerpt
 
 class WorkoutJournalEntry(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()  # Using TinyMCE for rich text editing
+    # 以下由 content 在保存時計算，見 workout_journal/text.py
+    body_text = models.TextField(blank=True, default='', editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReplicaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 資料保留期限依 created_at 清理
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def update_text(self):
+        self.body_text = html_to_text(self.content)
+        self.word_count = count_words(self.body_text)
+        self.excerpt = make_excerpt(self.body_text)
+
+    def save(self, *args, **kwargs):
+        self.update_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'body_text', 'word_count', 'excerpt'}
+        super().save(*args, **kwargs)
+
+
+class JournalImage(models.Model):
+    """
+    日誌圖片：原圖與縮小版本 (variants: {寬度: 儲存路徑}) 在上傳時產生一次，見 workout_journal/media.py
+    """
+    entry = models.ForeignKey(WorkoutJournalEntry, related_name='images', on_delete=models.CASCADE)
+    image = models.ImageField(upload_to='journal/%Y/%m/', width_field='width', height_field='height')
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ReplicaQuerySet.as_manager()
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.image.name
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+viewset、資料保留清理與 query_plans (check_query_plans) 共用的 queryset
+"""
+from .models import WorkoutJournalEntry
+from .search import search_entries
+
+
+def journal_list_queryset(term=None):
+    """
+    列表只需要摘要；有 term 時搜尋純文字內容
+    """
+    queryset = WorkoutJournalEntry.objects.defer('content', 'body_text')
+    if term:
+        queryset = search_entries(queryset, term)
+    return queryset
+
+
+def journal_detail_queryset():
+    return WorkoutJournalEntry.objects.prefetch_related('images')
+
+
+def expired_entries(cutoff):
+    return WorkoutJournalEntry.objects.filter(created_at__lt=cutoff)
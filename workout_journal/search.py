@@ -0,0 +1,23 @@
+"""
+訓練日誌的全文檢索；索引與查詢必須使用相同的運算式，PostgreSQL 才會使用 GIN 索引
+"""
+from django.db import connections
+
+SEARCH_INDEX_NAME = 'workout_journal_search_idx'
+SEARCH_FIELDS = ('title', 'body_text')
+
+
+def journal_search_vector(*fields):
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(*(fields or SEARCH_FIELDS), config='simple')
+
+
+def search_entries(queryset, term):
+    """
+    PostgreSQL 以全文檢索搜尋標題與純文字內容，其他資料庫以 icontains 搜尋純文字內容
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        from django.db.models import Q
+        return queryset.filter(Q(title__icontains=term) | Q(body_text__icontains=term))
+    from django.contrib.postgres.search import SearchQuery
+    return queryset.annotate(search=journal_search_vector()).filter(search=SearchQuery(term, config='simple'))
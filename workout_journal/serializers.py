@@ -1,7 +1,50 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import WorkoutJournalEntry
+from .models import JournalImage, WorkoutJournalEntry
+
+
+class JournalImageSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(write_only=True)
+    url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JournalImage
+        fields = ['id', 'image', 'url', 'width', 'height', 'variants', 'created_at']
+        read_only_fields = ['width', 'height']
+
+    def absolute_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_url(self, obj):
+        return self.absolute_url(obj.image.name)
+
+    def get_variants(self, obj):
+        # {寬度: URL}，前端可直接組成 srcset
+        return {width: self.absolute_url(name) for width, name in obj.variants.items()}
+
+    def validate_image(self, value):
+        if value.size > settings.JOURNAL_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(f'圖片不可超過 {settings.JOURNAL_IMAGE_MAX_BYTES // (1024 * 1024)} MB')
+        return value
+
 
 class WorkoutJournalEntrySerializer(serializers.ModelSerializer):
+    images = JournalImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = WorkoutJournalEntry
+        # body_text 只供搜尋使用，與 content 重複，不返回
+        exclude = ['body_text']
+
+
+class WorkoutJournalEntryListSerializer(serializers.ModelSerializer):
+    """
+    列表只返回摘要，不包含 HTML 內容與圖片
+    """
     class Meta:
         model = WorkoutJournalEntry
-        fields = '__all__'
+        fields = ['id', 'title', 'excerpt', 'word_count', 'created_at', 'updated_at']
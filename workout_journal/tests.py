@@ -1,3 +1,161 @@
-from django.test import TestCase
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import NoReverseMatch, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from backend.media import MediaView, serve_media
+from jobs.models import Job
+from .models import JournalImage, WorkoutJournalEntry
+from .text import EXCERPT_LENGTH, count_words, html_to_text, make_excerpt
+
+
+class MediaTests(SimpleTestCase):
+    def test_media_route_not_mounted_without_debug(self):
+        with self.assertRaises(NoReverseMatch):
+            reverse('media', kwargs={'path': 'exports/plan.ics'})
+
+    def test_accel_redirect_is_quoted(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'journal'))
+            with open(os.path.join(root, 'journal', '跑步 1.jpg'), 'wb') as f:
+                f.write(b'jpeg')
+            with override_settings(MEDIA_ROOT=root, MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/'):
+                response = serve_media(RequestFactory().get('/media/journal/'), 'journal/跑步 1.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/journal/%E8%B7%91%E6%AD%A5%201.jpg')
+
+
+class MediaAccessTests(TestCase):
+    files = ['exports/plan.ics', 'journal/2026/10/run.jpg', 'journal/2026/10/run_320w.jpg', 'journal/2026/10/other.jpg']
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        for name in self.files:
+            os.makedirs(os.path.join(self.root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.root.name, name), 'wb') as f:
+                f.write(b'data')
+        settings_override = override_settings(MEDIA_ROOT=self.root.name, MEDIA_SENDFILE='x-accel-redirect')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username='owner')
+        self.other = User.objects.create_user(username='other')
+        Job.objects.create(name='exercise.export_calendar', user=self.owner, result={'url': '/media/exports/plan.ics'})
+        entry = WorkoutJournalEntry.objects.create(title='Run', content='<p>5k</p>')
+        JournalImage.objects.create(
+            entry=entry, image='journal/2026/10/run.jpg', width=1200, height=800, variants={'320': 'journal/2026/10/run_320w.jpg'}
+        )
+
+    def get(self, path, user=None):
+        request = APIRequestFactory().get(f'/media/{path}')
+        if user is not None:
+            force_authenticate(request, user=user)
+        return MediaView.as_view()(request, path=path)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.get('journal/2026/10/run.jpg').status_code, 401)
+
+    def test_export_only_for_job_owner(self):
+        response = self.get('exports/plan.ics', self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/exports/plan.ics')
+        self.assertEqual(self.get('exports/plan.ics', self.other).status_code, 404)
+
+    def test_journal_images_and_variants(self):
+        self.assertEqual(self.get('journal/2026/10/run.jpg', self.other).status_code, 200)
+        self.assertEqual(self.get('journal/2026/10/run_320w.jpg', self.other).status_code, 200)
+        # 檔案存在但不屬於任何日誌，或不屬於任何 app
+        self.assertEqual(self.get('journal/2026/10/other.jpg', self.other).status_code, 404)
+        self.assertEqual(self.get('../settings.py', self.other).status_code, 404)
+
+
+class JournalAdminSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        WorkoutJournalEntry.objects.create(title='Leg day', content='<p>squats</p>')
+        WorkoutJournalEntry.objects.create(title='Rest', content='<p>leg stretches</p>')
+
+    def titles(self, term):
+        response = self.client.get('/admin/workout_journal/workoutjournalentry/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return [entry.title for entry in response.context['cl'].result_list]
+
+    def test_other_databases_search_titles_only(self):
+        self.assertEqual(self.titles('leg'), ['Leg day'])
+        self.assertCountEqual(self.titles(''), ['Leg day', 'Rest'])
+
+    def test_postgres_uses_full_text_search(self):
+        from unittest import mock
+        from .admin import WorkoutJournalEntryAdmin
+
+        model_admin = WorkoutJournalEntryAdmin(WorkoutJournalEntry, None)
+        queryset = WorkoutJournalEntry.objects.all()
+        fake = {queryset.db: mock.Mock(vendor='postgresql')}
+        with mock.patch('workout_journal.admin.connections', fake), \
+                mock.patch('workout_journal.admin.search_entries', return_value='searched') as search:
+            self.assertEqual(model_admin.get_search_results(None, queryset, 'leg'), ('searched', False))
+        search.assert_called_once_with(queryset, 'leg')
+
+
+class JournalTextTests(SimpleTestCase):
+    def test_html_to_text(self):
+        self.assertEqual(html_to_text('<p>Leg&nbsp;day</p><p>5 &times; 5 &amp; rest</p>'), 'Leg day 5 × 5 & rest')
+        self.assertEqual(html_to_text('<p>a<br>b</p><ul><li>c</li><li>d</li></ul>'), 'a b c d')
+        self.assertEqual(html_to_text('<table><tr><th>Set</th><th>Reps</th></tr><tr><td>1</td><td>10</td></tr></table>'),
+                         'Set Reps 1 10')
+        self.assertEqual(html_to_text('<style>p { color: red; }</style><p>squats</p><SCRIPT type="text/javascript">'
+                                      'alert(1)</script >'), 'squats')
+        self.assertEqual(html_to_text(None), '')
+
+    def test_count_words(self):
+        self.assertEqual(count_words('Leg day 5x5'), 3)
+        # 中日韓文字每個字算一個字
+        self.assertEqual(count_words('今天練腿 squats 3 組'), 7)
+        self.assertEqual(count_words('スクワット 스쿼트'), 8)
+        self.assertEqual(count_words(''), 0)
+
+    def test_make_excerpt(self):
+        self.assertEqual(make_excerpt('short'), 'short')
+        excerpt = make_excerpt('練' * 300)
+        self.assertEqual(len(excerpt), EXCERPT_LENGTH)
+        self.assertTrue(excerpt.endswith('…'))
+
+
+class JournalEntryTextTests(TestCase):
+    def test_save_computes_text_fields(self):
+        entry = WorkoutJournalEntry.objects.create(title='Leg day', content='<p>今天&amp;明天</p><p>' + 'x ' * 300 + '</p>')
+        entry.refresh_from_db()
+        self.assertTrue(entry.body_text.startswith('今天&明天 x x'))
+        self.assertEqual(entry.word_count, 304)
+        self.assertEqual(len(entry.excerpt), EXCERPT_LENGTH)
+
+        entry.content = '<p>rest</p>'
+        entry.save(update_fields=['content'])
+        entry.refresh_from_db()
+        self.assertEqual((entry.body_text, entry.word_count, entry.excerpt), ('rest', 1, 'rest'))
+
+    def test_backfill_journal_text(self):
+        from io import StringIO
+
+        pending = [WorkoutJournalEntry.objects.create(title=f'Day {i}', content=f'<p>squats {i}</p>') for i in range(3)]
+        done = WorkoutJournalEntry.objects.create(title='Done', content='<p>bench</p>')
+        empty = WorkoutJournalEntry.objects.create(title='Empty', content='')
+        WorkoutJournalEntry.objects.filter(id__in=[entry.id for entry in pending]).update(
+            body_text='', word_count=0, excerpt='')
+        WorkoutJournalEntry.objects.filter(id=done.id).update(word_count=99)
+
+        out = StringIO()
+        call_command('backfill_journal_text', batch_size=2, stdout=out)
+        self.assertIn('done: 3 entries updated', out.getvalue())
+        for i, entry in enumerate(pending):
+            entry.refresh_from_db()
+            self.assertEqual((entry.body_text, entry.word_count, entry.excerpt), (f'squats {i}', 2, f'squats {i}'))
+        # 已計算過的日誌預設不重新計算，--all 時才會
+        self.assertEqual(WorkoutJournalEntry.objects.get(id=done.id).word_count, 99)
+        call_command('backfill_journal_text', all=True, stdout=StringIO())
+        self.assertEqual(WorkoutJournalEntry.objects.get(id=done.id).word_count, 1)
+        self.assertEqual(WorkoutJournalEntry.objects.get(id=empty.id).body_text, '')
@@ -0,0 +1,33 @@
+"""
+日誌內容 (TinyMCE HTML) 的純文字、字數與摘要，寫入時計算一次，列表與搜尋不需要再處理 HTML
+"""
+import html
+import re
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_LENGTH = 200
+
+BLOCK_TAG_RE = re.compile(r'<\s*(br|/p|/div|/li|/h[1-6]|/tr|/td|/th|/blockquote)\b[^>]*>', re.IGNORECASE)
+# strip_tags 只移除標籤，script / style 的內容要連同標籤一起移除
+HIDDEN_ELEMENT_RE = re.compile(r'<\s*(script|style)\b[^>]*>.*?<\s*/\s*\1\s*>', re.IGNORECASE | re.DOTALL)
+# 中日韓文字每個字算一個字，其他語言以連續的字母數字算一個字
+WORD_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W぀-ヿ㐀-䶿一-鿿가-힯]+')
+
+
+def html_to_text(content):
+    """
+    移除標籤（script / style 連同內容）並還原 HTML entity，區塊元素與表格儲存格之間保留一個空白
+    """
+    text = HIDDEN_ELEMENT_RE.sub(' ', content or '')
+    text = strip_tags(BLOCK_TAG_RE.sub(' ', text))
+    return ' '.join(html.unescape(text).split())
+
+
+def count_words(text):
+    return len(WORD_RE.findall(text))
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    return Truncator(text).chars(length)
@@ -1,10 +1,53 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
 from django.shortcuts import render
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .media import delete_image_files, generate_variants
 from .models import WorkoutJournalEntry
-from .serializers import WorkoutJournalEntrySerializer
+from .queries import journal_detail_queryset, journal_list_queryset
+from .serializers import JournalImageSerializer, WorkoutJournalEntryListSerializer, WorkoutJournalEntrySerializer
 
 class WorkoutJournalEntryViewSet(viewsets.ModelViewSet):
     queryset = WorkoutJournalEntry.objects.all()
     serializer_class = WorkoutJournalEntrySerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if self.action == 'list':
+            # ?q= 搜尋純文字內容
+            return journal_list_queryset(self.request.query_params.get('q'))
+        if self.action == 'images':
+            return super().get_queryset()
+        return journal_detail_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return WorkoutJournalEntryListSerializer
+        return super().get_serializer_class()
+
+    def perform_destroy(self, instance):
+        images = list(instance.images.all())
+        instance.delete()
+        transaction.on_commit(lambda: delete_image_files(images))
+
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser])
+    def images(self, request, pk=None):
+        """
+        上傳日誌圖片（multipart 欄位 image），檔案直接寫入暫存檔，並產生縮小版本
+        """
+        if int(request.META.get('CONTENT_LENGTH') or 0) > settings.JOURNAL_IMAGE_MAX_BYTES + 64 * 1024:
+            return Response({'error': '圖片檔案過大'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        # 不論檔案大小都以暫存檔接收，儲存時移動檔案而不是從記憶體複製
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+
+        entry = self.get_object()
+        serializer = JournalImageSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        journal_image = serializer.save(entry=entry)
+        generate_variants(journal_image)
+        return Response(JournalImageSerializer(journal_image, context={'request': request}).data, status=status.HTTP_201_CREATED)